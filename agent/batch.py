@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Knowledge Gate Batch Mode
+Неинтерактивное выполнение набора запросов из JSONL
+
+Формат входа (одна строка — один запрос):
+    {"query": "найти CML-Bench"}                 — свободный запрос (process_query)
+    {"op": "get", "id": "NODE-CONTEXT"}          — типизированная операция
+    {"op": "edges", "params": {"id": "NODE-MKCP", "direction": "outgoing"}}
+    найти CML-Bench                              — строка не-JSON: свободный запрос
+Необязательное поле "key" переносится в результат для сопоставления.
+Пустые строки и строки, начинающиеся с '#', пропускаются.
+
+Выход — JSONL в порядке входа (или по мере готовности с --unordered):
+    {"line": 1, "key": ..., "status": "success", "latency_ms": 1.8, "result": {...}}
+Сводка пропускной способности печатается в stderr.
+
+Запуск:
+    python run_agent.py --batch queries.jsonl --workers 8 > results.jsonl
+    cat queries.jsonl | python -m agent.batch --batch - --unordered
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+from database.results import dumps_text
+
+from .knowledge_gate import AgentContext, KnowledgeGateAgent, connection_pool_size
+
+DEFAULT_WORKERS = 4
+# Запросов в работе на один поток: ограничивает память при длинных входах
+WINDOW_PER_WORKER = 4
+
+
+@dataclass
+class BatchItem:
+    """Запрос из входного файла"""
+    line: int
+    key: Any = None
+    query: Optional[str] = None
+    operation: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+def parse_line(number: int, text: str) -> Optional[BatchItem]:
+    """Разбор строки входа; None — строку нужно пропустить"""
+    text = text.strip()
+    if not text or text.startswith("#"):
+        return None
+    if not text.startswith("{"):
+        return BatchItem(line=number, query=text)
+
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError as e:
+        return BatchItem(line=number, error=f"Некорректный JSON: {e}")
+    if not isinstance(payload, dict):
+        return BatchItem(line=number, error="Строка должна быть JSON-объектом")
+
+    key = payload.pop("key", None)
+    if "query" in payload:
+        return BatchItem(line=number, key=key, query=str(payload["query"]))
+    if "op" in payload:
+        operation = str(payload.pop("op"))
+        params = payload.pop("params", None) or {}
+        if not isinstance(params, dict):
+            return BatchItem(line=number, key=key, error="Поле 'params' должно быть JSON-объектом")
+        params.update(payload)
+        return BatchItem(line=number, key=key, operation=operation, params=params)
+    return BatchItem(line=number, key=key, error="Нет поля 'query' или 'op'")
+
+
+def read_items(stream: IO[str]) -> Iterator[BatchItem]:
+    for number, text in enumerate(stream, 1):
+        item = parse_line(number, text)
+        if item is not None:
+            yield item
+
+
+def execute_item(agent: KnowledgeGateAgent, item: BatchItem) -> Dict:
+    """Выполнение одного запроса с отдельным контекстом агента"""
+    record: Dict[str, Any] = {"line": item.line}
+    if item.key is not None:
+        record["key"] = item.key
+
+    started = time.perf_counter()
+    if item.error:
+        record.update({"status": "error", "error": item.error})
+    else:
+        try:
+            with agent.request_context(AgentContext(session_id=f"batch-{item.line}")):
+                if item.query is not None:
+                    result = agent.process_query(item.query)
+                else:
+                    result = agent.execute_operation(item.operation, item.params)
+            record.update({"status": result.get("status", "success"), "result": result})
+        except Exception as e:
+            record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    record["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return record
+
+
+def run_batch(
+    agent: KnowledgeGateAgent,
+    items: Iterable[BatchItem],
+    workers: int = DEFAULT_WORKERS,
+    ordered: bool = True,
+) -> Iterator[Dict]:
+    """
+    Параллельное выполнение запросов
+
+    В работе одновременно не больше workers * WINDOW_PER_WORKER запросов,
+    поэтому вход читается потоково. При ordered=True результат выдаётся
+    в порядке входа, иначе — по мере завершения.
+    """
+    window = max(workers, 1) * WINDOW_PER_WORKER
+    pending: Deque[Future] = deque()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kg-batch") as executor:
+        for item in items:
+            pending.append(executor.submit(execute_item, agent, item))
+            if len(pending) < window:
+                continue
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], elapsed: float, workers: int) -> Dict:
+    """Сводка пропускной способности и задержек"""
+    ordered = sorted(latencies)
+    total = len(ordered)
+    summary: Dict[str, Any] = {
+        "queries": total,
+        "statuses": statuses,
+        "workers": workers,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(total / elapsed, 1) if elapsed > 0 else None,
+    }
+    if ordered:
+        summary.update({
+            "latency_median_ms": round(statistics.median(ordered), 3),
+            "latency_p95_ms": ordered[min(total - 1, int(total * 0.95))],
+            "latency_max_ms": ordered[-1],
+        })
+    return summary
+
+
+def print_summary(summary: Dict, stream: IO[str] = sys.stderr):
+    print("=" * 60, file=stream)
+    print(f"📊 Запросов: {summary['queries']} за {summary['elapsed_s']} с "
+          f"({summary['throughput_qps']} запр/с, потоков: {summary['workers']})", file=stream)
+    for status, count in sorted(summary["statuses"].items()):
+        icon = "✅" if status == "success" else "❌"
+        print(f"   {icon} {status}: {count}", file=stream)
+    if summary["queries"]:
+        print(f"⏱️  Задержка: медиана {summary['latency_median_ms']} мс, "
+              f"p95 {summary['latency_p95_ms']} мс, макс {summary['latency_max_ms']} мс", file=stream)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетное выполнение запросов Knowledge Gate Agent")
+    parser.add_argument("--batch", required=True, metavar="FILE",
+                        help="JSONL с запросами ('-' — stdin)")
+    parser.add_argument("--output", metavar="FILE", help="Файл результатов (по умолчанию stdout)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Потоков (по умолчанию {DEFAULT_WORKERS}; пул БД — с запасом на шину и prefetch)")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Выводить результаты по мере готовности, а не в порядке входа")
+    parser.add_argument("--strict", action="store_true",
+                        help="Код выхода 1, если хотя бы один запрос завершился не со status=success")
+    args = parser.parse_args(argv)
+
+    from database.operations import DatabaseManager
+
+    agent = KnowledgeGateAgent(DatabaseManager(pool_size=connection_pool_size(args.workers)))
+    source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    started = time.perf_counter()
+    try:
+        for record in run_batch(agent, read_items(source), args.workers, ordered=not args.unordered):
+            output.write(dumps_text(record) + "\n")
+            latencies.append(record["latency_ms"])
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    finally:
+        elapsed = time.perf_counter() - started
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+        agent.db.close()
+
+    print_summary(summarize(latencies, statuses, elapsed, args.workers))
+    failed = sum(count for status, count in statuses.items() if status != "success")
+    return 1 if args.strict and failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
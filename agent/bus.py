@@ -0,0 +1,274 @@
+"""
+Agent Bus
+Внутрипроцессная шина запросов к downstream агентам
+
+Каждый зарегистрированный агент получает собственный пул потоков с
+ограниченной очередью: медленный агент занимает только свои потоки и не
+задерживает остальных. Запросы в очереди упорядочены по приоритету
+(меньше — раньше), при равном приоритете — по времени поступления.
+
+- Backpressure: при заполненной очереди агента submit сразу отклоняет
+  запрос (BusOverloaded), а не копит его в памяти.
+- Таймауты: у запроса есть срок; запрос, дождавшийся потока после срока,
+  не выполняется. Выполняющийся обработчик прервать нельзя — вызывающий
+  перестаёт его ждать и получает ошибку.
+- Fan-out/fan-in: fan_out отправляет набор подзапросов разным агентам и
+  собирает результаты в исходном порядке с общим сроком.
+
+Обработчик — callable(operation, params) → результат {"status", "operation", "data"}.
+Подзапросы из обработчика допустимы только к другим агентам: ожидание
+собственного пула из его же потока может исчерпать потоки пула.
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше — раньше)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_LIMIT = 64
+DEFAULT_TIMEOUT = 30.0
+
+Handler = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+
+class BusError(RuntimeError):
+    """Ошибка доставки запроса через шину"""
+
+
+class BusOverloaded(BusError):
+    """Очередь агента заполнена"""
+
+
+class BusTimeout(BusError):
+    """Срок запроса истёк"""
+
+
+@dataclass
+class BusRequest:
+    """Запрос к downstream агенту"""
+    agent: str
+    operation: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    priority: int = PRIORITY_NORMAL
+    timeout: Optional[float] = None
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    sequence: int
+    request: BusRequest = field(compare=False)
+    deadline: float = field(compare=False)
+    future: Future = field(compare=False)
+
+
+class AgentWorkers:
+    """Пул потоков одного агента с приоритетной ограниченной очередью"""
+
+    def __init__(self, agent_id: str, handler: Handler, workers: int = DEFAULT_WORKERS,
+                 queue_limit: int = DEFAULT_QUEUE_LIMIT):
+        self.agent_id = agent_id
+        self.handler = handler
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=queue_limit)
+        self._sequence = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def submit(self, request: BusRequest, deadline: float) -> Future:
+        self._ensure_threads()
+        future: Future = Future()
+        job = _Job(request.priority, next(self._sequence), request, deadline, future)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.rejected += 1
+            raise BusOverloaded(f"Очередь {self.agent_id} заполнена ({self.queue_limit})")
+        self.submitted += 1
+        return future
+
+    def _ensure_threads(self):
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for number in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"bus-{self.agent_id}-{number}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job.request is None:
+                    return
+                self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job: _Job):
+        if time.monotonic() > job.deadline:
+            self.expired += 1
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(BusTimeout(f"{self.agent_id}.{job.request.operation}: срок истёк в очереди"))
+            return
+        if not job.future.set_running_or_notify_cancel():
+            # Вызывающий перестал ждать (таймаут fan-out) — запрос не выполняется
+            self.expired += 1
+            return
+        try:
+            result = self.handler(job.request.operation, job.request.params)
+        except Exception as e:
+            self.failed += 1
+            job.future.set_exception(e)
+        else:
+            self.completed += 1
+            job.future.set_result(result)
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "queued": self.queued,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+    def shutdown(self):
+        for _ in self._threads:
+            # Сигнал остановки — после всех запросов любого приоритета
+            self._queue.put(_Job(PRIORITY_LOW + 1, next(self._sequence), None, 0.0, Future()))
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+class AgentBus:
+    """Шина запросов к downstream агентам"""
+
+    def __init__(self, default_timeout: float = DEFAULT_TIMEOUT):
+        self.default_timeout = default_timeout
+        self._agents: Dict[str, AgentWorkers] = {}
+
+    def register(self, agent_id: str, handler: Handler, workers: int = DEFAULT_WORKERS,
+                 queue_limit: int = DEFAULT_QUEUE_LIMIT):
+        """
+        Регистрация обработчика агента
+
+        Args:
+            agent_id: ID агента (analytical_agent, graph_agent, ...)
+            handler: callable(operation, params) → результат операции
+            workers: Потоков в пуле агента
+            queue_limit: Максимум ожидающих запросов (сверх — BusOverloaded)
+        """
+        if agent_id in self._agents:
+            raise ValueError(f"Агент {agent_id} уже зарегистрирован")
+        self._agents[agent_id] = AgentWorkers(agent_id, handler, workers, queue_limit)
+
+    def agents(self) -> List[str]:
+        return list(self._agents)
+
+    # ==========================================
+    # ОТПРАВКА
+    # ==========================================
+
+    def submit(self, request: BusRequest, deadline: Optional[float] = None) -> Future:
+        """
+        Поставить запрос в очередь агента (BusOverloaded при заполненной очереди)
+
+        Args:
+            request: Запрос
+            deadline: Общий срок (time.monotonic) — действует более ранний из него и таймаута запроса
+        """
+        workers = self._agents.get(request.agent)
+        if workers is None:
+            raise ValueError(f"Агент не зарегистрирован: {request.agent}")
+        timeout = request.timeout if request.timeout is not None else self.default_timeout
+        own_deadline = time.monotonic() + timeout
+        return workers.submit(request, own_deadline if deadline is None else min(deadline, own_deadline))
+
+    def call(self, request: BusRequest) -> Dict[str, Any]:
+        """Запрос с ожиданием результата; ошибки доставки и обработчика — результат со status=error"""
+        return self.fan_out([request], request.timeout)["data"]["results"][0]
+
+    def fan_out(self, requests: Iterable[BusRequest], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Параллельное выполнение подзапросов с общим сроком
+
+        Returns:
+            {"status": success | partial | error, "operation": "fan_out",
+             "data": {"results": [...]}} — результаты в порядке запросов
+        """
+        requests = list(requests)
+        timeout = timeout if timeout is not None else self.default_timeout
+        deadline = time.monotonic() + timeout
+        pending: List[Any] = []
+        for request in requests:
+            try:
+                pending.append(self.submit(request, deadline))
+            except (BusError, ValueError) as e:
+                pending.append(e)
+
+        results = []
+        for request, future in zip(requests, pending):
+            if isinstance(future, Exception):
+                results.append(self._error(request, future))
+                continue
+            try:
+                results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+            except FutureTimeout:
+                future.cancel()
+                results.append(self._error(request, BusTimeout(f"нет ответа за {timeout:.1f} с")))
+            except Exception as e:
+                results.append(self._error(request, e))
+
+        failed = sum(1 for result in results if result.get("status") == "error")
+        status = "success" if not failed else ("error" if failed == len(results) else "partial")
+        return {
+            "status": status,
+            "operation": "fan_out",
+            "data": {"results": results}
+        }
+
+    @staticmethod
+    def _error(request: BusRequest, error: Exception) -> Dict[str, Any]:
+        logger.warning(f"[bus] {request.agent}.{request.operation}: {error}")
+        return {
+            "status": "error",
+            "operation": request.operation,
+            "agent": request.agent,
+            "error": str(error) or type(error).__name__
+        }
+
+    def stats(self) -> Dict[str, Dict]:
+        return {agent_id: workers.stats() for agent_id, workers in self._agents.items()}
+
+    def shutdown(self):
+        for workers in self._agents.values():
+            workers.shutdown()
@@ -4,7 +4,6 @@ Knowledge Gate Agent CLI
 Интерактивный интерфейс для работы с агентом
 """
 import sys
-import json
 from pathlib import Path
 from datetime import datetime
 
@@ -17,6 +16,9 @@ from dotenv import load_dotenv
 load_dotenv(PROJECT_ROOT / ".env")
 
 from agent.knowledge_gate import KnowledgeGateAgent
+from agent.graph_index import STRENGTH_LEVELS
+from database.metrics import format_table, metrics
+from database.results import dumps_text
 
 
 class AgentCLI:
@@ -29,12 +31,19 @@ class AgentCLI:
         "stats": "Статистика",
         "list": "Список материалов (list nodes, list sources, list l1)",
         "get": "Получить материал (get NODE-CONTEXT)",
+        "section": "Секция файла узла (section NODE-MKCP executive_summary)",
         "search": "Поиск (search CML-Bench)",
         "trace": "Трассировка (trace SRC-DOC-001)",
         "keyword": "Поиск по ключевому слову (keyword ПСБ)",
         "edges": "Связи узла (edges NODE-CONTEXT)",
+        "filter": "Фильтр рёбер (filter NODE-MKCP operationalizes* CRITICAL,STRONG)",
+        "reach": "Достижимые узлы по фильтру (reach NODE-MKCP operationalizes* CRITICAL,STRONG)",
         "layer": "Узлы слоя (layer L1-Strategic)",
+        "path": "Критический путь между слоями (path L1 L3 [longest])",
+        "cube": "Связность слоёв (cube L1 L3 STRONG [by relationship])",
         "session": "Информация о сессии",
+        "reload": "Перезагрузить Gold Index и индексы без перезапуска",
+        "perf": "Латентность операций: ожидание БД / SQL / Python (perf, perf reset)",
         "exit": "Выход",
     }
 
@@ -45,6 +54,7 @@ class AgentCLI:
         print("Инициализация агента...")
 
         self.agent = KnowledgeGateAgent()
+        self.agent.start_index_watcher()
         agent_info = self.agent.get_agent_info()
 
         print(f"✅ Агент: {agent_info['name']} v{agent_info['version']}")
@@ -67,7 +77,9 @@ class AgentCLI:
                     print("\n👋 До свидания!")
                     break
 
-                self.process_command(user_input)
+                # Версия индексов не меняется посреди команды при горячей перезагрузке
+                with self.agent.pinned_indexes():
+                    self.process_command(user_input)
 
             except KeyboardInterrupt:
                 print("\n\n👋 Прервано пользователем")
@@ -94,10 +106,16 @@ class AgentCLI:
             self.show_stats()
         elif command == "session":
             self.show_session()
+        elif command == "reload":
+            self.handle_reload()
+        elif command == "perf":
+            self.handle_perf(args)
         elif command == "list":
             self.handle_list(args)
         elif command == "get":
             self.handle_get(args)
+        elif command == "section":
+            self.handle_section(args)
         elif command == "search":
             self.handle_search(args)
         elif command == "trace":
@@ -106,8 +124,14 @@ class AgentCLI:
             self.handle_keyword(args)
         elif command == "edges":
             self.handle_edges(args)
+        elif command in ("filter", "reach"):
+            self.handle_filter(args, transitive=(command == "reach"))
         elif command == "layer":
             self.handle_layer(args)
+        elif command == "path":
+            self.handle_path(args)
+        elif command == "cube":
+            self.handle_cube(args)
         else:
             # Передаём как свободный запрос
             result = self.agent.process_query(user_input)
@@ -184,9 +208,13 @@ class AgentCLI:
         print(f"   Начало: {ctx['started_at']}")
         print(f"   Операций: {ctx['operations_count']}")
         print(f"   Запросов: {ctx['queries_count']}")
-        print(f"   Материалов открыто: {len(ctx['materials_accessed'])}")
+        print(f"   Материалов открыто: {ctx['materials_accessed_count']}")
         if ctx['current_focus']:
             print(f"   Текущий фокус: {ctx['current_focus']}")
+        prefetch = ctx['prefetch']
+        if prefetch['hits'] or prefetch['misses']:
+            print(f"   Prefetch: {prefetch['hit_rate']:.0%} из кэша "
+                  f"({prefetch['hits']}/{prefetch['hits'] + prefetch['misses']}), пропущено {prefetch['skipped']}")
 
     def handle_list(self, args: str):
         """Обработка команды list"""
@@ -219,6 +247,28 @@ class AgentCLI:
         result = self.agent.get_material(material_id)
         self.print_material(result)
 
+    def handle_section(self, args: str):
+        """Обработка команды section"""
+        tokens = args.split()
+        if not tokens:
+            print("❓ Укажите узел и секцию (например: section NODE-MKCP executive_summary)")
+            return
+
+        node_id = tokens[0].upper()
+        if len(tokens) == 1:
+            document = self.agent.open_node_document(node_id)
+            if document is None:
+                print(f"❌ Файл узла {node_id} не найден")
+                return
+            print(f"\n📑 Секции {node_id}:")
+            for section in document:
+                print(f"   • {section} ({document.section_size(section) / 1024:.1f} KB)")
+            return
+
+        subsection = tokens[2] if len(tokens) > 2 else None
+        result = self.agent.get_node_section(node_id, tokens[1], subsection)
+        self.print_result(result)
+
     def handle_search(self, args: str):
         """Обработка команды search"""
         if not args:
@@ -260,6 +310,32 @@ class AgentCLI:
         result = self.agent.get_node_edges(node_id)
         self.print_edges(result)
 
+    def handle_filter(self, args: str, transitive: bool = False):
+        """Обработка команд filter / reach"""
+        if not args:
+            print("❓ Укажите узел и/или фильтры (например: filter NODE-MKCP operationalizes* CRITICAL,STRONG)")
+            return
+
+        node_id = None
+        relationships = []
+        strengths = []
+        for token in args.split():
+            values = [v for v in token.split(",") if v]
+            if token.upper().startswith("NODE-"):
+                node_id = token.upper()
+            elif all(v.upper() in STRENGTH_LEVELS for v in values):
+                strengths.extend(v.upper() for v in values)
+            else:
+                relationships.extend(values)
+
+        result = self.agent.filter_edges(
+            node_id=node_id,
+            relationships=relationships or None,
+            strengths=strengths or None,
+            transitive=transitive
+        )
+        self.print_filtered_edges(result)
+
     def handle_layer(self, args: str):
         """Обработка команды layer"""
         if not args:
@@ -276,6 +352,72 @@ class AgentCLI:
         result = self.agent.get_layer_nodes(layer)
         self.print_result(result)
 
+    def handle_path(self, args: str):
+        """Обработка команды path"""
+        layer_map = {"L1": "L1-Strategic", "L2": "L2-Operational", "L3": "L3-Technical"}
+        tokens = args.split()
+        mode = "longest" if "longest" in (t.lower() for t in tokens) else "shortest"
+        layers = [layer_map.get(t.upper()[:2], t) for t in tokens if t.upper()[:2] in layer_map]
+        source_layer = layers[0] if layers else "L1-Strategic"
+        target_layer = layers[1] if len(layers) > 1 else "L3-Technical"
+
+        result = self.agent.get_critical_path(source_layer, target_layer, mode=mode)
+        if result.get('status') != 'success':
+            self.print_result(result)
+            return
+
+        data = result['data']
+        print(f"\n🛤️ Критический путь {source_layer} → {target_layer} ({mode}):")
+        print(f"   {data.get('interpretation') or 'путь не найден'}")
+        for alt in data.get('alternatives', []):
+            print(f"   • {' → '.join(alt['path'])} (стоимость {alt['cost']})")
+
+    def handle_cube(self, args: str):
+        """Обработка команды cube"""
+        layer_map = {"L1": "L1-Strategic", "L2": "L2-Operational", "L3": "L3-Technical"}
+        tokens = args.split()
+        group_by = None
+        if "by" in tokens:
+            position = tokens.index("by")
+            group_by = tokens[position + 1] if position + 1 < len(tokens) else "relationship"
+            tokens = tokens[:position]
+
+        layers = [layer_map[t.upper()[:2]] for t in tokens if t.upper()[:2] in layer_map]
+        strengths = [t.upper() for t in tokens if t.upper() in STRENGTH_LEVELS]
+
+        result = self.agent.get_connectivity(
+            source_layer=layers[0] if layers else None,
+            target_layer=layers[1] if len(layers) > 1 else None,
+            strength=strengths[0] if strengths else None,
+            group_by=group_by
+        )
+        self.print_result(result)
+
+    def handle_reload(self):
+        """Принудительная перезагрузка индексов"""
+        result = self.agent.reload_indexes()
+        if result["status"] != "success":
+            self.print_result(result)
+            return
+        data = result["data"]
+        print(f"\n🔄 Индексы перезагружены: версия {data['version']} ({data['source']})")
+        print(f"   • Отслеживается файлов: {data['files_watched']}")
+
+    def handle_perf(self, args: str):
+        """Гистограммы латентности операций агента и запросов к БД"""
+        if args.strip() == "reset":
+            metrics.reset()
+            print("\n🧹 Метрики сброшены")
+            return
+
+        snapshot = metrics.snapshot()
+        if not snapshot:
+            print("\n📭 Операций ещё не было")
+            return
+        print("\n⏱  Латентность операций, мс (p50/p95/p99 — всего; БД, SQL, Python — среднее)")
+        for line in format_table(snapshot):
+            print(f"   {line}")
+
     # ==========================================
     # ФОРМАТИРОВАНИЕ ВЫВОДА
     # ==========================================
@@ -287,14 +429,14 @@ class AgentCLI:
         if status == 'success':
             print(f"\n✅ {result.get('operation', 'Операция')}")
             data = result.get('data', {})
-            print(json.dumps(data, ensure_ascii=False, indent=2, default=str))
+            print(dumps_text(data, indent=True))
         elif status == 'error':
             print(f"\n❌ Ошибка: {result.get('error', 'Неизвестная ошибка')}")
         elif status == 'routed':
             print(f"\n🔀 Маршрутизация к: {result.get('target_agent')}")
             print(f"   {result.get('message', '')}")
         else:
-            print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+            print(dumps_text(result, indent=True))
 
     def print_materials_list(self, result: dict):
         """Печать списка материалов"""
@@ -379,6 +521,26 @@ class AgentCLI:
             for e in incoming:
                 print(f"   ← {e.get('source_id', '')} ({e.get('edge_type', '')})")
 
+    def print_filtered_edges(self, result: dict):
+        """Печать отфильтрованных рёбер"""
+        if result.get('status') != 'success':
+            self.print_result(result)
+            return
+
+        data = result.get('data', {})
+        edges = data.get('edges', [])
+
+        print(f"\n🧮 Рёбер по фильтру: {data.get('count', len(edges))}")
+        print("=" * 50)
+        for e in edges:
+            print(f"   {e['from']} → {e['to']} ({e['relationship']}, {e['strength']})")
+
+        reached = data.get('reachable_nodes', {})
+        if reached:
+            print(f"\n📍 Достижимые узлы ({len(reached)}):")
+            for node, depth in sorted(reached.items(), key=lambda item: item[1]):
+                print(f"   • {node} (глубина {depth})")
+
 
 def main():
     """Точка входа CLI"""
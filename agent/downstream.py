@@ -0,0 +1,286 @@
+"""
+Downstream Agents
+Обработчики downstream агентов для шины agent.bus
+
+Агенты работают в процессе Knowledge Gate Agent и используют его данные:
+Gold Index, индекс рёбер, документы узлов и базу. Каждый запрос выполняется
+в собственном контексте агента (request_context) в потоке пула шины.
+"""
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .bus import AgentBus, BusRequest
+from .router import Route
+
+if TYPE_CHECKING:
+    from .knowledge_gate import KnowledgeGateAgent
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Потоков и длина очереди по агентам (медленная работа с файлами — отдельно от графа)
+AGENT_POOLS = {
+    "analytical_agent": (2, 32),
+    "graph_agent": (4, 64),
+    "source_agent": (1, 16),
+    "visualization_agent": (1, 16),
+}
+# Каждый поток шины держит соединение БД на время обработки запроса
+BUS_CONNECTIONS = sum(workers for workers, _ in AGENT_POOLS.values())
+
+
+class DownstreamAgent:
+    """Базовый обработчик: operation → метод с именованными параметрами"""
+
+    AGENT_ID = ""
+    PURPOSE = ""
+    OPERATIONS: Tuple[str, ...] = ()
+
+    def __init__(self, gate: "KnowledgeGateAgent", bus: AgentBus):
+        self.gate = gate
+        self.bus = bus
+
+    def __call__(self, operation: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"{self.AGENT_ID}: неизвестная операция {operation}")
+        with self.gate.request_context():
+            data = getattr(self, operation)(**params)
+        return {
+            "status": "success",
+            "operation": operation,
+            "agent": self.AGENT_ID,
+            "data": data
+        }
+
+    def capabilities(self) -> Dict:
+        return {"purpose": self.PURPOSE, "operations": list(self.OPERATIONS)}
+
+    def plan(self, route: Route) -> Optional[BusRequest]:
+        """Запрос к агенту по маршруту текстового запроса (None — нечего выполнять)"""
+        return None
+
+    @staticmethod
+    def _data(result: Dict) -> Any:
+        """Данные результата операции агента (ValueError с исходной ошибкой при неуспехе)"""
+        if result.get("status") != "success":
+            raise ValueError(result.get("error") or f"{result.get('operation', 'операция')}: {result.get('status')}")
+        data = result.get("data")
+        if isinstance(data, dict) and "error" in data:
+            raise ValueError(data["error"])
+        return data
+
+    def _degree(self, node_id: str) -> Dict[str, int]:
+        index = self.gate.edge_index
+        return {
+            "outgoing": bin(index.outgoing_mask(node_id)).count("1"),
+            "incoming": bin(index.incoming_mask(node_id)).count("1"),
+        }
+
+
+# ==========================================
+# АГЕНТЫ
+# ==========================================
+
+class AnalyticalAgent(DownstreamAgent):
+    AGENT_ID = "analytical_agent"
+    PURPOSE = "Глубокий анализ содержимого узлов"
+    OPERATIONS = ("analyze_node", "compare_nodes", "extract_insights")
+
+    def analyze_node(self, node_id: str) -> Dict:
+        summary = self.gate.get_node_section(node_id, "executive_summary")
+        document = self.gate.open_node_document(node_id)
+        return {
+            "node_id": node_id,
+            "layer": self._layer(node_id),
+            "degree": self._degree(node_id),
+            "sections": list(document) if document is not None else [],
+            "executive_summary": summary.get("data", {}).get("content"),
+        }
+
+    def compare_nodes(self, node_ids: List[str]) -> Dict:
+        # Связи узлов запрашиваются у graph_agent параллельно (fan-out в другой пул)
+        edges = self.bus.fan_out(
+            BusRequest("graph_agent", "get_edges", {"node_id": node_id}) for node_id in node_ids
+        )["data"]["results"]
+        neighbors = {}
+        for node_id, result in zip(node_ids, edges):
+            linked = result.get("data", {}).get("edges", []) if result.get("status") == "success" else []
+            neighbors[node_id] = {edge["to"] if edge["from"] == node_id else edge["from"] for edge in linked}
+        shared = set.intersection(*neighbors.values()) if neighbors else set()
+        return {
+            "nodes": {
+                node_id: {"layer": self._layer(node_id), "degree": self._degree(node_id),
+                          "neighbors": sorted(neighbors[node_id])}
+                for node_id in node_ids
+            },
+            "shared_neighbors": sorted(shared),
+        }
+
+    def extract_insights(self, node_id: str) -> Dict:
+        conclusions = self.gate.get_node_section(node_id, "strategic_conclusions")
+        narrative = self.gate.get_node_section(node_id, "narrative_summary")
+        return {
+            "node_id": node_id,
+            "strategic_conclusions": conclusions.get("data", {}).get("content"),
+            "narrative_summary": narrative.get("data", {}).get("content"),
+        }
+
+    def _layer(self, node_id: str) -> Optional[str]:
+        for layer, members in self.gate._gold_index.get("layer_members", {}).items():
+            if node_id in members:
+                return layer
+        return None
+
+    def plan(self, route: Route) -> Optional[BusRequest]:
+        nodes = [material_id for material_id in route.ids if material_id.startswith("NODE-")]
+        if len(nodes) > 1:
+            return BusRequest(self.AGENT_ID, "compare_nodes", {"node_ids": nodes})
+        if nodes:
+            return BusRequest(self.AGENT_ID, "analyze_node", {"node_id": nodes[0]})
+        return None
+
+
+class GraphAgent(DownstreamAgent):
+    AGENT_ID = "graph_agent"
+    PURPOSE = "Работа с графом связей"
+    OPERATIONS = ("get_edges", "find_path", "centrality_analysis")
+
+    def get_edges(self, node_id: str, direction: str = "both") -> Dict:
+        index = self.gate.edge_index
+        mask = 0
+        if direction in ("both", "outgoing"):
+            mask |= index.outgoing_mask(node_id)
+        if direction in ("both", "incoming"):
+            mask |= index.incoming_mask(node_id)
+        return {
+            "node_id": node_id,
+            "direction": direction,
+            "edges": [edge.to_dict() for edge in index.edges_for(mask)],
+        }
+
+    def find_path(self, source_layer: str = "L1-Strategic", target_layer: str = "L3-Technical",
+                  mode: str = "shortest", k: int = 3) -> Dict:
+        return self._data(self.gate.get_critical_path(source_layer, target_layer, mode=mode, k=k))
+
+    def centrality_analysis(self, limit: int = 10) -> Dict:
+        index = self.gate.edge_index
+        nodes = {edge.source for edge in index.edges} | {edge.target for edge in index.edges}
+        total = max(len(nodes) - 1, 1)
+        ranking = sorted(
+            ({"node_id": node_id, **self._degree(node_id)} for node_id in nodes),
+            key=lambda item: (-(item["incoming"] + item["outgoing"]), item["node_id"])
+        )
+        for item in ranking:
+            item["degree_centrality"] = round((item["incoming"] + item["outgoing"]) / total, 4)
+        return {"nodes_count": len(nodes), "edges_count": len(index.edges), "ranking": ranking[:limit]}
+
+    def plan(self, route: Route) -> Optional[BusRequest]:
+        node_id = route.first_id(("NODE",))
+        if node_id:
+            return BusRequest(self.AGENT_ID, "get_edges", {"node_id": node_id})
+        return BusRequest(self.AGENT_ID, "centrality_analysis")
+
+
+class SourceAgent(DownstreamAgent):
+    AGENT_ID = "source_agent"
+    PURPOSE = "Работа с первоисточниками"
+    OPERATIONS = ("extract_text", "parse_document", "get_metadata")
+
+    def extract_text(self, source_id: str, max_chars: int = 5000) -> Dict:
+        from database.sync import resolve_disk_path
+        from pipeline.extraction import extract_sources
+
+        path = self.gate._gold_index.get("id_to_path", {}).get(source_id)
+        if not path:
+            raise ValueError(f"Первоисточник {source_id} не найден в индексе")
+        # Имена файлов SOURCE_DOCUMENTS на диске расходятся с индексом (кодировка, суффиксы)
+        disk_path = resolve_disk_path(source_id, PROJECT_ROOT / path)
+        if disk_path is None:
+            raise ValueError(f"Файл первоисточника {source_id} не найден: {path}")
+        documents = extract_sources(paths=[disk_path], workers=1)["documents"]
+        if not documents:
+            raise ValueError(f"Формат {Path(path).suffix} не поддерживается")
+        document = documents[0]
+        return {
+            "source_id": source_id,
+            "format": document.get("format"),
+            "metadata": document.get("metadata", {}),
+            "text": document.get("text", "")[:max_chars],
+            "truncated": len(document.get("text", "")) > max_chars,
+        }
+
+    def parse_document(self, source_id: str) -> Dict:
+        return self._data(self.gate.get_source_chain(source_id))
+
+    def get_metadata(self, source_id: str) -> Dict:
+        return self._data(self.gate.get_material(source_id))
+
+    def plan(self, route: Route) -> Optional[BusRequest]:
+        source_id = route.first_id(("SRC",))
+        if source_id:
+            return BusRequest(self.AGENT_ID, "parse_document", {"source_id": source_id})
+        return None
+
+
+class VisualizationAgent(DownstreamAgent):
+    AGENT_ID = "visualization_agent"
+    PURPOSE = "Визуализация данных"
+    OPERATIONS = ("render_graph", "create_diagram", "export_chart")
+
+    def render_graph(self, node_id: Optional[str] = None, depth: int = 1) -> Dict:
+        """Граф (или окрестность узла) в формате Mermaid"""
+        index = self.gate.edge_index
+        if node_id:
+            reached = set(index.traverse(node_id, max_depth=depth)["nodes"])
+            reached |= set(index.traverse(node_id, direction="incoming", max_depth=depth)["nodes"])
+            reached.add(node_id)
+            edges = [edge for edge in index.edges if edge.source in reached and edge.target in reached]
+        else:
+            edges = list(index.edges)
+        lines = ["graph LR"]
+        lines += [f"    {_mermaid_id(e.source)} -->|{e.relationship}| {_mermaid_id(e.target)}" for e in edges]
+        return {"format": "mermaid", "edges_count": len(edges), "diagram": "\n".join(lines)}
+
+    def create_diagram(self) -> Dict:
+        """Связность слоёв в формате Mermaid"""
+        matrix = self.gate.connectivity.layer_matrix()
+        lines = ["graph TD"]
+        for source_layer, targets in sorted(matrix.items()):
+            for target_layer, count in sorted(targets.items()):
+                lines.append(f"    {_mermaid_id(source_layer)} -->|{count}| {_mermaid_id(target_layer)}")
+        return {"format": "mermaid", "diagram": "\n".join(lines)}
+
+    def export_chart(self, dimension: str = "strength") -> Dict:
+        """Ряд данных для диаграммы: рёбра по силе или типу связи"""
+        index = self.gate.edge_index
+        counts = index.strength_counts() if dimension == "strength" else index.relationship_types()
+        return {"dimension": dimension, "series": [{"label": k, "value": v} for k, v in sorted(counts.items())]}
+
+    def plan(self, route: Route) -> Optional[BusRequest]:
+        node_id = route.first_id(("NODE",))
+        if node_id:
+            return BusRequest(self.AGENT_ID, "render_graph", {"node_id": node_id})
+        return BusRequest(self.AGENT_ID, "create_diagram")
+
+
+def _mermaid_id(value: str) -> str:
+    return value.replace("-", "_")
+
+
+DOWNSTREAM_AGENTS: Tuple[Callable[..., DownstreamAgent], ...] = (
+    AnalyticalAgent, GraphAgent, SourceAgent, VisualizationAgent,
+)
+
+
+def create_bus(gate: "KnowledgeGateAgent", timeout: Optional[float] = None) -> Tuple[AgentBus, Dict[str, DownstreamAgent]]:
+    """Шина с зарегистрированными downstream агентами"""
+    bus = AgentBus() if timeout is None else AgentBus(default_timeout=timeout)
+    agents = {}
+    for agent_class in DOWNSTREAM_AGENTS:
+        agent = agent_class(gate, bus)
+        workers, queue_limit = AGENT_POOLS[agent.AGENT_ID]
+        bus.register(agent.AGENT_ID, agent, workers=workers, queue_limit=queue_limit)
+        agents[agent.AGENT_ID] = agent
+    return bus, agents
@@ -0,0 +1,152 @@
+"""
+Connectivity Cube
+Агрегированный куб связности слоёв Knowledge Graph
+
+Ячейка куба: (source_layer, target_layer, strength, relationship) →
+количество рёбер и сумма весов. Для каждого подмножества измерений
+поддерживается свёртка, поэтому любой срез с фиксированными значениями
+измерений (остальные — «все») отдаётся одним обращением к словарю.
+
+Тот же куб поддерживается в БД триггерами material_edges
+(edge_connectivity_cube); вес ребра в обоих — graph_paths.edge_weight.
+"""
+from itertools import product
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .graph_index import EdgeIndex, GraphEdge
+from .graph_paths import edge_weight
+
+DIMENSIONS = ("source_layer", "target_layer", "strength", "relationship")
+
+# Метка для узлов без слоя
+UNKNOWN_LAYER = "unknown"
+
+# Все маски свёрток: True — измерение зафиксировано в ключе
+_ROLLUPS = list(product((False, True), repeat=len(DIMENSIONS)))
+
+
+class ConnectivityCube:
+    """Куб (source_layer, target_layer, strength, relationship) → count, weight_sum"""
+
+    def __init__(self):
+        self._cells: Dict[Tuple[bool, ...], Dict[Tuple, List[float]]] = {r: {} for r in _ROLLUPS}
+        self._domains: Dict[str, Dict[str, int]] = {dim: {} for dim in DIMENSIONS}
+
+    @classmethod
+    def from_index(cls, index: EdgeIndex, node_layers: Dict[str, str]) -> "ConnectivityCube":
+        """Построение куба по индексу рёбер и карте узел → слой"""
+        cube = cls()
+        for edge in index.edges:
+            cube.add_edge(*cube.edge_key(edge, node_layers), weight=edge_weight(edge))
+        return cube
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping]) -> "ConnectivityCube":
+        """Построение куба по ячейкам edge_connectivity_cube (DatabaseManager.get_connectivity_cube)"""
+        cube = cls()
+        for row in rows:
+            key = (row["source_layer"], row["target_layer"], row["strength"], row["relationship"])
+            cube._apply(key, int(row["edges_count"]), float(row["weight_sum"]))
+        return cube
+
+    @staticmethod
+    def edge_key(edge: GraphEdge, node_layers: Dict[str, str]) -> Tuple[str, str, str, str]:
+        """Координаты ребра в кубе"""
+        return (
+            node_layers.get(edge.source, UNKNOWN_LAYER),
+            node_layers.get(edge.target, UNKNOWN_LAYER),
+            edge.strength,
+            edge.relationship
+        )
+
+    # ==========================================
+    # ИНКРЕМЕНТАЛЬНОЕ ОБНОВЛЕНИЕ
+    # ==========================================
+
+    def add_edge(self, source_layer: str, target_layer: str, strength: str,
+                 relationship: str, weight: Optional[float] = None):
+        """Учёт нового ребра во всех свёртках"""
+        self._apply((source_layer, target_layer, strength, relationship), 1, weight or 0.0)
+
+    def remove_edge(self, source_layer: str, target_layer: str, strength: str,
+                    relationship: str, weight: Optional[float] = None):
+        """Исключение удалённого ребра из всех свёрток"""
+        self._apply((source_layer, target_layer, strength, relationship), -1, -(weight or 0.0))
+
+    def _apply(self, key: Tuple[str, ...], count_delta: int, weight_delta: float):
+        for rollup in _ROLLUPS:
+            cell_key = tuple(v for v, fixed in zip(key, rollup) if fixed)
+            cells = self._cells[rollup]
+            cell = cells.setdefault(cell_key, [0, 0.0])
+            cell[0] += count_delta
+            cell[1] += weight_delta
+            if cell[0] <= 0:
+                del cells[cell_key]
+
+        for dim, value in zip(DIMENSIONS, key):
+            domain = self._domains[dim]
+            domain[value] = domain.get(value, 0) + count_delta
+            if domain[value] <= 0:
+                del domain[value]
+
+    # ==========================================
+    # ЗАПРОСЫ
+    # ==========================================
+
+    def query(self, source_layer: Optional[str] = None, target_layer: Optional[str] = None,
+              strength: Optional[str] = None, relationship: Optional[str] = None) -> Dict:
+        """Агрегат по срезу (None — все значения измерения), O(1)"""
+        key = (source_layer, target_layer, strength, relationship)
+        rollup = tuple(v is not None for v in key)
+        cell = self._cells[rollup].get(tuple(v for v in key if v is not None))
+        count, weight_sum = cell if cell else (0, 0.0)
+        return {"count": count, "weight_sum": round(weight_sum, 4)}
+
+    def slice(self, group_by: str, **fixed: Optional[str]) -> Dict[str, Dict]:
+        """
+        Срез с группировкой по одному измерению
+
+        Args:
+            group_by: Измерение группировки (relationship, strength, ...)
+            **fixed: Зафиксированные значения других измерений
+
+        Returns:
+            Значение измерения → {count, weight_sum}
+        """
+        if group_by not in DIMENSIONS:
+            raise ValueError(f"Неизвестное измерение: {group_by}")
+        unknown = set(fixed) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Неизвестные измерения: {', '.join(sorted(unknown))}")
+
+        result = {}
+        for value in self._domains[group_by]:
+            params = dict(fixed, **{group_by: value})
+            cell = self.query(**params)
+            if cell["count"]:
+                result[value] = cell
+        return result
+
+    def values(self, dimension: str) -> List[str]:
+        """Текущие значения измерения"""
+        return sorted(self._domains[dimension])
+
+    def layer_matrix(self) -> Dict[str, Dict[str, int]]:
+        """Матрица количества рёбер source_layer × target_layer"""
+        matrix: Dict[str, Dict[str, int]] = {}
+        for (source_layer, target_layer), (count, _) in self._cells[(True, True, False, False)].items():
+            matrix.setdefault(source_layer, {})[target_layer] = count
+        return matrix
+
+    def total(self) -> int:
+        return self.query()["count"]
+
+
+def node_layers_from_gold(gold_index: Dict) -> Dict[str, str]:
+    """Карта узел → слой (L1/L2/L3) из layer_members Gold Index"""
+    return {
+        node: layer
+        for layer, nodes in gold_index.get("layer_members", {}).items()
+        for node in nodes
+    }
+
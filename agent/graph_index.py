@@ -0,0 +1,294 @@
+"""
+Typed Edge Index
+Битовые индексы рёбер Knowledge Graph для фильтрованного обхода
+
+Каждое ребро получает порядковый номер, а множества рёбер хранятся как
+битовые маски (Python int). Фильтры по типу связи, силе и смежности узлов
+комбинируются пересечением масок вместо повторных проходов по списку рёбер.
+"""
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_GRAPH_PATH = PROJECT_ROOT / "data" / "graph" / "psb_knowledge_graph_integration_v14.json"
+
+# Уровни силы связи (от сильной к слабой)
+STRENGTH_LEVELS = ("CRITICAL", "STRONG", "MEDIUM", "MODERATE", "WEAK")
+
+
+@dataclass(frozen=True)
+class GraphEdge:
+    """Ребро Knowledge Graph"""
+    edge_id: str
+    source: str
+    target: str
+    relationship: str
+    strength: str
+    description: str = ""
+    weight: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.edge_id,
+            "from": self.source,
+            "to": self.target,
+            "relationship": self.relationship,
+            "strength": self.strength,
+            "weight": self.weight,
+            "description": self.description
+        }
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Итерация по номерам установленных битов маски"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def node_aliases_from_gold(graph: Dict, gold_index: Dict) -> Dict[str, str]:
+    """
+    Сопоставление ID узлов графа с ID из Gold Index по имени файла узла
+
+    Граф v14 и Gold Index расходятся в именовании (NODE-AGENDA / NODE-TIMELINE),
+    но указывают на один и тот же файл в data/nodes/.
+    """
+    gold_by_file = {
+        Path(path).name: material_id
+        for material_id, path in gold_index.get("id_to_path", {}).items()
+        if material_id.startswith("NODE-")
+    }
+    aliases = {}
+    for node in graph.get("graph_nodes", {}).get("nodes", []):
+        gold_id = gold_by_file.get(node.get("file", ""))
+        if gold_id and gold_id != node["id"]:
+            aliases[node["id"]] = gold_id
+    return aliases
+
+
+class EdgeIndex:
+    """
+    Индекс рёбер на битовых множествах
+
+    - by relationship: тип связи → маска рёбер
+    - by strength: сила связи → маска рёбер
+    - outgoing / incoming: узел → маска инцидентных рёбер
+    """
+
+    def __init__(self, edges: Iterable[GraphEdge], version: Optional[str] = None):
+        self.edges: List[GraphEdge] = list(edges)
+        self.version = version
+        self.all_mask = (1 << len(self.edges)) - 1
+        self.fingerprint = self._compute_fingerprint(self.edges)
+
+        self._by_relationship: Dict[str, int] = {}
+        self._by_strength: Dict[str, int] = {}
+        self._outgoing: Dict[str, int] = {}
+        self._incoming: Dict[str, int] = {}
+        self._by_id: Dict[str, int] = {}
+        self._pattern_cache: Dict[str, int] = {}
+
+        for position, edge in enumerate(self.edges):
+            bit = 1 << position
+            self._by_relationship[edge.relationship] = self._by_relationship.get(edge.relationship, 0) | bit
+            self._by_strength[edge.strength] = self._by_strength.get(edge.strength, 0) | bit
+            self._outgoing[edge.source] = self._outgoing.get(edge.source, 0) | bit
+            self._incoming[edge.target] = self._incoming.get(edge.target, 0) | bit
+            self._by_id[edge.edge_id] = position
+
+    @classmethod
+    def from_graph(cls, graph: Dict, aliases: Optional[Dict[str, str]] = None) -> "EdgeIndex":
+        """Построение индекса из JSON Knowledge Graph"""
+        aliases = aliases or {}
+        edges = []
+        for raw in graph.get("graph_edges", {}).get("all_edges", []):
+            edges.append(GraphEdge(
+                edge_id=raw["id"],
+                source=aliases.get(raw["from"], raw["from"]),
+                target=aliases.get(raw["to"], raw["to"]),
+                relationship=raw.get("relationship", ""),
+                strength=raw.get("strength", ""),
+                description=raw.get("description", ""),
+                weight=raw.get("weight")
+            ))
+        version = graph.get("meta", {}).get("version")
+        return cls(edges, version=version)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], version: Optional[str] = None) -> "EdgeIndex":
+        """
+        Построение индекса из строк material_edges (DatabaseManager.list_graph_edges)
+
+        Сила связи берётся из metadata->>'strength', вес — из material_edges.weight
+        (NULL остаётся None: стоимость ребра считается по метке силы).
+        """
+        edges = []
+        for row in rows:
+            metadata = row.get("metadata") or {}
+            weight = row.get("weight")
+            edges.append(GraphEdge(
+                edge_id=str(metadata.get("edge_id") or row["edge_id"]),
+                source=row["source_id"],
+                target=row["target_id"],
+                relationship=metadata.get("relationship") or row["edge_type"],
+                strength=metadata.get("strength", ""),
+                description=row.get("description") or "",
+                weight=float(weight) if weight is not None else None
+            ))
+        return cls(edges, version=version)
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None, gold_index: Optional[Dict] = None) -> "EdgeIndex":
+        """Загрузка индекса из файла графа"""
+        path = path or DEFAULT_GRAPH_PATH
+        with open(path, 'r', encoding='utf-8') as f:
+            graph = json.load(f)
+        aliases = node_aliases_from_gold(graph, gold_index) if gold_index else {}
+        index = cls.from_graph(graph, aliases=aliases)
+        logger.info(f"EdgeIndex: {len(index.edges)} рёбер, {len(index._by_relationship)} типов связей")
+        return index
+
+    @staticmethod
+    def _compute_fingerprint(edges: List[GraphEdge]) -> str:
+        """Отпечаток содержимого графа — меняется при любом изменении рёбер"""
+        digest = hashlib.sha256()
+        for edge in edges:
+            digest.update(
+                f"{edge.edge_id}|{edge.source}|{edge.target}|{edge.relationship}|"
+                f"{edge.strength}|{edge.weight}\n".encode("utf-8")
+            )
+        return digest.hexdigest()[:16]
+
+    # ==========================================
+    # МАСКИ
+    # ==========================================
+
+    def relationship_mask(self, patterns: Optional[Iterable[str]] = None) -> int:
+        """
+        Маска рёбер по типам связей
+
+        Args:
+            patterns: Имена или glob-шаблоны типов (operationalizes*), None — все рёбра
+        """
+        if patterns is None:
+            return self.all_mask
+        mask = 0
+        for pattern in patterns:
+            cached = self._pattern_cache.get(pattern)
+            if cached is None:
+                cached = 0
+                for relationship, rel_mask in self._by_relationship.items():
+                    if fnmatchcase(relationship, pattern):
+                        cached |= rel_mask
+                self._pattern_cache[pattern] = cached
+            mask |= cached
+        return mask
+
+    def strength_mask(self, strengths: Optional[Iterable[str]] = None) -> int:
+        """Маска рёбер по силе связи (None — все рёбра)"""
+        if strengths is None:
+            return self.all_mask
+        mask = 0
+        for strength in strengths:
+            mask |= self._by_strength.get(strength.upper(), 0)
+        return mask
+
+    def outgoing_mask(self, node_id: str) -> int:
+        return self._outgoing.get(node_id, 0)
+
+    def incoming_mask(self, node_id: str) -> int:
+        return self._incoming.get(node_id, 0)
+
+    def edges_for(self, mask: int) -> List[GraphEdge]:
+        """Рёбра, соответствующие маске"""
+        return [self.edges[position] for position in iter_bits(mask)]
+
+    def get_edge(self, edge_id: str) -> Optional[GraphEdge]:
+        position = self._by_id.get(edge_id)
+        return self.edges[position] if position is not None else None
+
+    # ==========================================
+    # ЗАПРОСЫ
+    # ==========================================
+
+    def select(
+        self,
+        relationships: Optional[Iterable[str]] = None,
+        strengths: Optional[Iterable[str]] = None,
+        source: Optional[str] = None,
+        target: Optional[str] = None
+    ) -> List[GraphEdge]:
+        """Выборка рёбер пересечением масок"""
+        mask = self.relationship_mask(relationships) & self.strength_mask(strengths)
+        if source:
+            mask &= self.outgoing_mask(source)
+        if target:
+            mask &= self.incoming_mask(target)
+        return self.edges_for(mask)
+
+    def traverse(
+        self,
+        start: str,
+        relationships: Optional[Iterable[str]] = None,
+        strengths: Optional[Iterable[str]] = None,
+        direction: str = "outgoing",
+        max_depth: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Обход графа от узла только по рёбрам, прошедшим фильтр
+
+        Args:
+            start: Начальный узел
+            relationships: Типы/шаблоны связей
+            strengths: Допустимые силы связи
+            direction: 'outgoing' или 'incoming'
+            max_depth: Ограничение глубины (None — полное замыкание)
+
+        Returns:
+            Достижимые узлы с глубиной и маска пройденных рёбер
+        """
+        if direction not in ("outgoing", "incoming"):
+            raise ValueError(f"Неизвестное направление обхода: {direction}")
+
+        adjacency = self._outgoing if direction == "outgoing" else self._incoming
+        filter_mask = self.relationship_mask(relationships) & self.strength_mask(strengths)
+
+        reached: Dict[str, int] = {start: 0}
+        edges_mask = 0
+        frontier = [start]
+        depth = 0
+
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            frontier_mask = 0
+            for node in frontier:
+                frontier_mask |= adjacency.get(node, 0)
+            step_mask = frontier_mask & filter_mask & ~edges_mask
+            edges_mask |= step_mask
+
+            frontier = []
+            for position in iter_bits(step_mask):
+                edge = self.edges[position]
+                neighbor = edge.target if direction == "outgoing" else edge.source
+                if neighbor not in reached:
+                    reached[neighbor] = depth
+                    frontier.append(neighbor)
+
+        reached.pop(start)
+        return {"nodes": reached, "edges_mask": edges_mask}
+
+    def relationship_types(self) -> Dict[str, int]:
+        """Типы связей с количеством рёбер"""
+        return {rel: bin(mask).count("1") for rel, mask in sorted(self._by_relationship.items())}
+
+    def strength_counts(self) -> Dict[str, int]:
+        """Распределение рёбер по силе связи"""
+        return {strength: bin(mask).count("1") for strength, mask in self._by_strength.items()}
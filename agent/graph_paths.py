@@ -0,0 +1,300 @@
+"""
+Weighted Graph Paths
+Вычисление критического пути между стратегическими слоями
+
+Стоимость ребра выводится из его веса (material_edges.weight), а при его
+отсутствии — из метки силы связи. Поддерживаются два режима:
+- shortest: самый «дешёвый» путь (сильные связи дешевле), k лучших по Йену
+- longest: самая весомая простая цепочка (сумма весов), ограниченный перебор
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database.metrics import metrics
+
+from .graph_index import EdgeIndex, GraphEdge
+
+logger = logging.getLogger(__name__)
+
+# Вес связи по метке силы (используется, если у ребра нет явного weight);
+# то же правило — connectivity_edge_weight в database/schema/003_connectivity_cube.sql
+STRENGTH_WEIGHTS = {
+    "CRITICAL": 1.0,
+    "STRONG": 0.8,
+    "MEDIUM": 0.5,
+    "MODERATE": 0.4,
+    "WEAK": 0.2,
+}
+DEFAULT_WEIGHT = 0.3
+
+PATH_MODES = ("shortest", "longest")
+
+
+def edge_weight(edge: GraphEdge) -> float:
+    """Вес ребра: явный weight или значение по метке силы"""
+    if edge.weight is not None and edge.weight > 0:
+        return edge.weight
+    return STRENGTH_WEIGHTS.get(edge.strength, DEFAULT_WEIGHT)
+
+
+def edge_cost(edge: GraphEdge) -> float:
+    """Стоимость прохода по ребру — обратна весу"""
+    return 1.0 / edge_weight(edge)
+
+
+class WeightedGraph:
+    """Взвешенный граф поверх EdgeIndex (параллельные рёбра схлопываются в лучшее)"""
+
+    def __init__(self, index: EdgeIndex):
+        self.fingerprint = index.fingerprint
+        self.adjacency: Dict[str, Dict[str, GraphEdge]] = {}
+        for edge in index.edges:
+            if edge.source == edge.target:
+                continue
+            neighbors = self.adjacency.setdefault(edge.source, {})
+            current = neighbors.get(edge.target)
+            if current is None or edge_weight(edge) > edge_weight(current):
+                neighbors[edge.target] = edge
+
+    def neighbors(self, node: str) -> Dict[str, GraphEdge]:
+        return self.adjacency.get(node, {})
+
+    def path_edges(self, path: List[str]) -> List[GraphEdge]:
+        return [self.adjacency[a][b] for a, b in zip(path, path[1:])]
+
+    def path_cost(self, path: List[str]) -> float:
+        return sum(edge_cost(e) for e in self.path_edges(path))
+
+    def path_weight(self, path: List[str]) -> float:
+        return sum(edge_weight(e) for e in self.path_edges(path))
+
+    # ==========================================
+    # SHORTEST (Dijkstra + Yen)
+    # ==========================================
+
+    def dijkstra(
+        self,
+        source: str,
+        target: str,
+        banned_nodes: frozenset = frozenset(),
+        banned_edges: frozenset = frozenset()
+    ) -> Optional[List[str]]:
+        """Кратчайший по стоимости путь source → target"""
+        distances = {source: 0.0}
+        previous: Dict[str, str] = {}
+        queue = [(0.0, source)]
+
+        while queue:
+            dist, node = heapq.heappop(queue)
+            if node == target:
+                path = [target]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            if dist > distances.get(node, float("inf")):
+                continue
+            for neighbor, edge in self.neighbors(node).items():
+                if neighbor in banned_nodes or (node, neighbor) in banned_edges:
+                    continue
+                candidate = dist + edge_cost(edge)
+                if candidate < distances.get(neighbor, float("inf")):
+                    distances[neighbor] = candidate
+                    previous[neighbor] = node
+                    heapq.heappush(queue, (candidate, neighbor))
+        return None
+
+    def k_shortest(self, source: str, target: str, k: int) -> List[List[str]]:
+        """k кратчайших простых путей (алгоритм Йена)"""
+        first = self.dijkstra(source, target)
+        if not first:
+            return []
+
+        paths = [first]
+        candidates: List[Tuple[float, List[str]]] = []
+        seen = {tuple(first)}
+
+        while len(paths) < k:
+            last = paths[-1]
+            for i in range(len(last) - 1):
+                spur_node = last[i]
+                root = last[:i + 1]
+                banned_edges = frozenset(
+                    (p[i], p[i + 1]) for p in paths if len(p) > i + 1 and p[:i + 1] == root
+                )
+                banned_nodes = frozenset(root[:-1])
+                spur = self.dijkstra(spur_node, target, banned_nodes, banned_edges)
+                if spur:
+                    candidate = root[:-1] + spur
+                    if tuple(candidate) not in seen:
+                        seen.add(tuple(candidate))
+                        heapq.heappush(candidates, (self.path_cost(candidate), candidate))
+            if not candidates:
+                break
+            paths.append(heapq.heappop(candidates)[1])
+
+        return paths
+
+    # ==========================================
+    # LONGEST (ограниченный перебор простых путей)
+    # ==========================================
+
+    def k_longest(self, source: str, target: str, k: int, max_depth: int) -> List[List[str]]:
+        """k самых весомых простых путей длиной не более max_depth рёбер"""
+        best: List[Tuple[float, List[str]]] = []
+        stack = [(source, [source], 0.0)]
+
+        while stack:
+            node, path, weight = stack.pop()
+            if node == target and len(path) > 1:
+                if len(best) < k:
+                    heapq.heappush(best, (weight, path))
+                elif weight > best[0][0]:
+                    heapq.heapreplace(best, (weight, path))
+                continue
+            if len(path) > max_depth:
+                continue
+            for neighbor, edge in self.neighbors(node).items():
+                if neighbor not in path:
+                    stack.append((neighbor, path + [neighbor], weight + edge_weight(edge)))
+
+        return [path for _, path in sorted(best, key=lambda item: -item[0])]
+
+
+def compute_critical_path(
+    index: EdgeIndex,
+    sources: Iterable[str],
+    targets: Iterable[str],
+    mode: str = "shortest",
+    k: int = 3,
+    max_depth: int = 6
+) -> Dict:
+    """
+    Критический путь и k лучших альтернатив между группами узлов
+
+    Args:
+        index: Индекс рёбер текущего графа
+        sources: Начальные узлы (например, слой L1-Strategic)
+        targets: Конечные узлы (например, слой L3-Technical)
+        mode: 'shortest' — минимальная стоимость, 'longest' — максимальный вес
+        k: Количество путей в результате
+        max_depth: Ограничение длины пути для режима longest
+    """
+    if mode not in PATH_MODES:
+        raise ValueError(f"Неизвестный режим пути: {mode}")
+
+    graph = WeightedGraph(index)
+    targets = list(targets)
+    ranked: List[Tuple[float, List[str]]] = []
+
+    for source in sources:
+        for target in targets:
+            if source == target:
+                continue
+            if mode == "shortest":
+                for path in graph.k_shortest(source, target, k):
+                    ranked.append((graph.path_cost(path), path))
+            else:
+                for path in graph.k_longest(source, target, k, max_depth):
+                    ranked.append((-graph.path_weight(path), path))
+
+    ranked.sort(key=lambda item: (item[0], len(item[1])))
+    paths = [
+        {
+            "path": path,
+            "cost": round(graph.path_cost(path), 4),
+            "weight": round(graph.path_weight(path), 4),
+            "edges": [
+                {"id": e.edge_id, "relationship": e.relationship, "strength": e.strength}
+                for e in graph.path_edges(path)
+            ]
+        }
+        for _, path in ranked[:k]
+    ]
+
+    best = paths[0] if paths else {"path": [], "cost": None, "weight": None, "edges": []}
+    return {
+        "description": "Вычисленный критический путь по текущему графу",
+        "mode": mode,
+        "path": best["path"],
+        "interpretation": " → ".join(best["path"]),
+        "cost": best["cost"],
+        "weight": best["weight"],
+        "alternatives": paths[1:],
+        "graph_version": index.fingerprint,
+        "computed_at": datetime.now().isoformat(),
+        "source": "computed"
+    }
+
+
+class CriticalPathCache:
+    """
+    Кэш критических путей по версии графа
+
+    Вычисление выполняется в фоновом потоке; get() никогда не блокирует
+    и возвращает последний готовый результат (возможно, для прошлой версии).
+    """
+
+    def __init__(self):
+        self._results: Dict[Tuple, Dict] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        index: EdgeIndex,
+        sources: List[str],
+        targets: List[str],
+        mode: str = "shortest",
+        k: int = 3
+    ) -> Optional[Dict]:
+        """Готовый результат для текущей версии или последний известный (с пометкой stale)"""
+        params = (tuple(sources), tuple(targets), mode, k)
+        key = (index.fingerprint,) + params
+
+        with self._lock:
+            result = self._results.get(key)
+            metrics.record_cache(result is not None)
+            if result is not None:
+                return result
+            if key not in self._pending:
+                self._pending.add(key)
+                threading.Thread(
+                    target=self._compute,
+                    args=(key, index, sources, targets, mode, k),
+                    daemon=True
+                ).start()
+            stale = [r for (fp, *rest), r in self._results.items() if tuple(rest) == params]
+
+        if stale:
+            return dict(stale[-1], stale=True)
+        return None
+
+    def get_blocking(self, index: EdgeIndex, sources: List[str], targets: List[str],
+                     mode: str = "shortest", k: int = 3) -> Dict:
+        """Синхронное вычисление с сохранением в кэш"""
+        key = (index.fingerprint, tuple(sources), tuple(targets), mode, k)
+        with self._lock:
+            result = self._results.get(key)
+        metrics.record_cache(result is not None)
+        if result is None:
+            result = compute_critical_path(index, sources, targets, mode=mode, k=k)
+            with self._lock:
+                self._results[key] = result
+        return result
+
+    def _compute(self, key: Tuple, index: EdgeIndex, sources, targets, mode: str, k: int):
+        try:
+            result = compute_critical_path(index, sources, targets, mode=mode, k=k)
+            with self._lock:
+                # Результаты устаревших версий графа больше не нужны
+                for old_key in [k_ for k_ in self._results if k_[1:] == key[1:]]:
+                    del self._results[old_key]
+                self._results[key] = result
+        except Exception as e:
+            logger.error(f"Ошибка вычисления критического пути: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
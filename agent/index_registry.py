@@ -0,0 +1,379 @@
+"""
+Index Registry
+Версионированные in-memory индексы знаний с горячей перезагрузкой
+
+Версия индексов (Gold Index, индекс рёбер, куб связности, документы
+узлов) неизменяема после публикации. Новая версия полностью строится
+в фоновом потоке и подменяет текущую одной операцией присваивания.
+Запросы закрепляют версию на время выполнения (счётчик ссылок), поэтому
+старая версия освобождается только после завершения последнего запроса.
+
+Индекс рёбер строится из material_edges, а куб связности — из
+edge_connectivity_cube, если БД доступна (edge_loader, cube_loader),
+иначе — из бинарного снимка или JSON-графа. Изменения отслеживаются
+опросом: mtime/размер файлов и отметка рёбер БД (edge_stamp).
+"""
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+from .graph_cube import ConnectivityCube, node_layers_from_gold
+from .graph_index import EdgeIndex
+from .node_document import NodeDocument
+from .snapshot import DEFAULT_GOLD_INDEX_PATH, DEFAULT_SNAPSHOT_PATH, KnowledgeSnapshot
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+NODES_DIR = PROJECT_ROOT / "data" / "nodes"
+
+# Интервал опроса файлов (секунды)
+DEFAULT_POLL_INTERVAL = 2.0
+
+# path → (size, mtime_ns)
+FileStamps = Dict[str, Tuple[int, int]]
+
+# Загрузка индекса рёбер из БД (None — БД недоступна)
+EdgeLoader = Callable[[], Optional[EdgeIndex]]
+# Загрузка куба связности из БД (None — БД недоступна или куб пуст)
+CubeLoader = Callable[[], Optional[ConnectivityCube]]
+# Отметка рёбер БД: (количество, время последней вставки); None — БД недоступна
+EdgeStamp = Callable[[], Optional[Tuple[int, int]]]
+
+# Ключ отметки рёбер БД среди отметок файлов
+EDGE_STAMP_KEY = "db:material_edges"
+
+
+def collect_stamps(gold_index: Mapping, edge_stamp: Optional[EdgeStamp] = None) -> FileStamps:
+    """Отметки файлов (и рёбер БД), от которых зависит версия индексов"""
+    paths = [DEFAULT_GOLD_INDEX_PATH, DEFAULT_SNAPSHOT_PATH]
+    graph_path = gold_index.get("id_to_path", {}).get("GRAPH-V14")
+    if graph_path:
+        paths.append(PROJECT_ROOT / graph_path)
+    paths.extend(sorted(NODES_DIR.glob("*.json")))
+
+    stamps = {}
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        stamps[str(path)] = (stat.st_size, stat.st_mtime_ns)
+
+    if edge_stamp is not None:
+        stamp = edge_stamp()
+        if stamp is not None:
+            stamps[EDGE_STAMP_KEY] = stamp
+    return stamps
+
+
+class IndexVersion:
+    """Неизменяемая версия индексов знаний"""
+
+    def __init__(self, number: int, gold_index: Mapping,
+                 snapshot: Optional[KnowledgeSnapshot] = None,
+                 stamps: Optional[FileStamps] = None,
+                 edge_loader: Optional[EdgeLoader] = None,
+                 cube_loader: Optional[CubeLoader] = None):
+        self.number = number
+        self.gold_index = gold_index
+        self.snapshot = snapshot
+        self.edge_loader = edge_loader
+        self.cube_loader = cube_loader
+        self.edge_source: Optional[str] = None
+        self.connectivity_source: Optional[str] = None
+        self.stamps = stamps if stamps is not None else collect_stamps(gold_index)
+        self.loaded_at = datetime.now()
+        self._edge_index: Optional[EdgeIndex] = None
+        self._connectivity: Optional[ConnectivityCube] = None
+        self._node_documents: Dict[str, NodeDocument] = {}
+        self._build_lock = threading.Lock()
+        self._refs = 0
+        self._retired = False
+        self._closed = False
+
+    @classmethod
+    def load(cls, number: int, strict: bool = False,
+             edge_loader: Optional[EdgeLoader] = None,
+             edge_stamp: Optional[EdgeStamp] = None,
+             cube_loader: Optional[CubeLoader] = None) -> "IndexVersion":
+        """
+        Загрузка: бинарный снимок, при его отсутствии — Gold JSON
+
+        Args:
+            number: Номер версии
+            strict: Пробрасывать ошибки чтения Gold Index (при перезагрузке
+                    лучше оставить прежнюю версию, чем опубликовать пустую)
+            edge_loader: Индекс рёбер из БД (приоритетнее снимка и JSON-графа)
+            edge_stamp: Отметка рёбер БД для отслеживания изменений
+            cube_loader: Куб связности из БД (приоритетнее построения по рёбрам)
+        """
+        stamps = collect_stamps({}, edge_stamp)
+        snapshot = KnowledgeSnapshot.open_if_fresh()
+        if snapshot is not None:
+            gold_index = snapshot.gold_index()
+            logger.info(f"Gold Index загружен из снимка: {snapshot.path}")
+        else:
+            gold_index = {}
+            try:
+                if DEFAULT_GOLD_INDEX_PATH.exists():
+                    with open(DEFAULT_GOLD_INDEX_PATH, "r", encoding="utf-8") as f:
+                        gold_index = json.load(f)
+                    logger.info(f"Gold Index загружен: {gold_index.get('quick_stats', {})}")
+                else:
+                    logger.warning("Gold Index не найден")
+            except Exception as e:
+                if strict:
+                    raise
+                logger.error(f"Ошибка загрузки Gold Index: {e}")
+        # Отметки сняты до чтения: изменение во время загрузки вызовет повторную загрузку
+        stamps.update({p: s for p, s in collect_stamps(gold_index).items() if p not in stamps})
+        return cls(number, gold_index, snapshot, stamps, edge_loader, cube_loader)
+
+    # ==========================================
+    # ИНДЕКСЫ ВЕРСИИ
+    # ==========================================
+
+    @property
+    def edge_index(self) -> EdgeIndex:
+        """Битовый индекс рёбер (строится при первом обращении)"""
+        if self._edge_index is None:
+            with self._build_lock:
+                if self._edge_index is None:
+                    self._edge_index = self._build_edge_index()
+        return self._edge_index
+
+    def _build_edge_index(self) -> EdgeIndex:
+        if self.edge_loader is not None:
+            index = self.edge_loader()
+            if index is not None:
+                self.edge_source = "database"
+                return index
+        if self.snapshot is not None:
+            self.edge_source = "snapshot"
+            return self.snapshot.edge_index()
+        self.edge_source = "json"
+        graph_path = self.gold_index.get("id_to_path", {}).get("GRAPH-V14")
+        path = PROJECT_ROOT / graph_path if graph_path else None
+        return EdgeIndex.load(path, gold_index=self.gold_index)
+
+    @property
+    def connectivity(self) -> ConnectivityCube:
+        """Куб связности слоёв (строится при первом обращении)"""
+        if self._connectivity is None:
+            edge_index = self.edge_index
+            with self._build_lock:
+                if self._connectivity is None:
+                    self._connectivity = self._build_connectivity(edge_index)
+        return self._connectivity
+
+    def _build_connectivity(self, edge_index: EdgeIndex) -> ConnectivityCube:
+        if self.cube_loader is not None:
+            cube = self.cube_loader()
+            if cube is not None:
+                self.connectivity_source = "database"
+                return cube
+        self.connectivity_source = "edges"
+        return ConnectivityCube.from_index(edge_index, node_layers_from_gold(self.gold_index))
+
+    def node_document(self, node_id: str) -> Optional[NodeDocument]:
+        """Ленивый документ узла по ID из Gold Index (None, если файла нет)"""
+        document = self._node_documents.get(node_id)
+        if document is None:
+            path = self.gold_index.get("id_to_path", {}).get(node_id)
+            if not path or not path.endswith(".json"):
+                return None
+            full_path = PROJECT_ROOT / path
+            if not full_path.exists():
+                return None
+            document = self._node_documents.setdefault(node_id, NodeDocument(full_path))
+        return document
+
+    def warm(self):
+        """
+        Построение всех ленивых индексов (перед публикацией версии)
+
+        Секции снимка декодируются целиком, чтобы версия не зависела
+        от mmap после вывода из оборота.
+        """
+        if self.snapshot is not None:
+            self.gold_index = dict(self.gold_index)
+        self.connectivity
+
+    # ==========================================
+    # СЧЁТЧИК ССЫЛОК
+    # ==========================================
+
+    def _acquire(self):
+        self._refs += 1
+
+    def _release(self) -> bool:
+        """True, если версия выведена из оборота и больше не используется"""
+        self._refs -= 1
+        return self._retired and self._refs == 0
+
+    def _retire(self) -> bool:
+        self._retired = True
+        return self._refs == 0
+
+    @property
+    def refs(self) -> int:
+        return self._refs
+
+    def close(self):
+        """Освобождение mmap снимка и документов узлов"""
+        if self._closed:
+            return
+        self._closed = True
+        for document in self._node_documents.values():
+            document.close()
+        self._node_documents.clear()
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+
+class IndexRegistry:
+    """Текущая версия индексов и атомарная подмена"""
+
+    def __init__(self, edge_loader: Optional[EdgeLoader] = None,
+                 edge_stamp: Optional[EdgeStamp] = None,
+                 cube_loader: Optional[CubeLoader] = None):
+        """
+        Args:
+            edge_loader: Индекс рёбер из БД для каждой новой версии
+            edge_stamp: Отметка рёбер БД (изменение рёбер вызывает перезагрузку)
+            cube_loader: Куб связности из БД для каждой новой версии
+        """
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._local = threading.local()
+        self._edge_loader = edge_loader
+        self._edge_stamp = edge_stamp
+        self._cube_loader = cube_loader
+        self._current = IndexVersion.load(
+            1, edge_loader=edge_loader, edge_stamp=edge_stamp, cube_loader=cube_loader
+        )
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> IndexVersion:
+        """Версия, закреплённая текущим потоком, либо последняя опубликованная"""
+        pinned = getattr(self._local, "version", None)
+        return pinned if pinned is not None else self._current
+
+    @contextmanager
+    def use(self) -> Iterator[IndexVersion]:
+        """Закрепление версии на время запроса (вложенные вызовы используют ту же версию)"""
+        pinned = getattr(self._local, "version", None)
+        if pinned is not None:
+            yield pinned
+            return
+
+        with self._lock:
+            version = self._current
+            version._acquire()
+        self._local.version = version
+        try:
+            yield version
+        finally:
+            self._local.version = None
+            with self._lock:
+                release = version._release()
+            if release:
+                version.close()
+
+    def swap(self, version: IndexVersion) -> IndexVersion:
+        """Публикация новой версии; старая закрывается после последнего запроса"""
+        with self._lock:
+            old, self._current = self._current, version
+            close_now = old._retire()
+        if close_now:
+            old.close()
+        return old
+
+    def reload(self) -> IndexVersion:
+        """Построение новой версии (вне блокировки запросов) и подмена"""
+        with self._reload_lock:
+            try:
+                version = IndexVersion.load(
+                    self._current.number + 1, strict=True,
+                    edge_loader=self._edge_loader, edge_stamp=self._edge_stamp,
+                    cube_loader=self._cube_loader
+                )
+                version.warm()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Ошибка перезагрузки индексов: {e}")
+                raise
+            self.swap(version)
+            self.reloads += 1
+            self.last_error = None
+            logger.info(f"Индексы перезагружены: версия {version.number}")
+            return version
+
+    def stamps(self, version: IndexVersion) -> FileStamps:
+        """Текущие отметки источников версии (файлы и рёбра БД)"""
+        return collect_stamps(version.gold_index, self._edge_stamp)
+
+    def is_stale(self) -> bool:
+        """Изменились ли файлы или рёбра БД с момента загрузки текущей версии"""
+        current = self._current
+        return self.stamps(current) != current.stamps
+
+    def status(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            "version": current.number,
+            "loaded_at": current.loaded_at.isoformat(),
+            "source": "snapshot" if current.snapshot is not None else "json",
+            "edges_source": current.edge_source,
+            "connectivity_source": current.connectivity_source,
+            "files_watched": len(current.stamps) - (EDGE_STAMP_KEY in current.stamps),
+            "edges_watched": EDGE_STAMP_KEY in current.stamps,
+            "reloads": self.reloads,
+            "last_error": self.last_error
+        }
+
+
+class IndexWatcher(threading.Thread):
+    """
+    Фоновый опрос файлов индексов и рёбер БД
+
+    Перезагрузка запускается, когда отметки изменились и остались
+    неизменными в течение одного интервала (файл дописан, загрузка рёбер
+    завершена).
+    """
+
+    def __init__(self, registry: IndexRegistry, interval: float = DEFAULT_POLL_INTERVAL):
+        super().__init__(name="index-watcher", daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        pending: Optional[FileStamps] = None
+        failed: Optional[FileStamps] = None
+        while not self._stop_event.wait(self.interval):
+            current = self.registry.current
+            stamps = self.registry.stamps(current)
+            if stamps == current.stamps or stamps == failed:
+                pending = None
+                continue
+            if stamps != pending:
+                pending = stamps
+                continue
+            try:
+                self.registry.reload()
+                failed = None
+            except Exception:
+                # Повторная попытка — после следующего изменения файлов
+                failed = stamps
+            pending = None
+
+    def stop(self):
+        self._stop_event.set()
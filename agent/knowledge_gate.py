@@ -9,19 +9,46 @@ Knowledge Gate Agent
 - Маршрутизация к downstream агентам
 - Логирование операций
 """
-import json
 import logging
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
 from enum import Enum
 import uuid
 
+from database.metrics import instrument_methods
 from database.operations import DatabaseManager, MaterialCategory, MaterialStatus
+from .bus import PRIORITY_HIGH, AgentBus
+from .downstream import BUS_CONNECTIONS, DOWNSTREAM_AGENTS, DownstreamAgent, create_bus
+from .graph_cube import ConnectivityCube
+from .graph_index import EdgeIndex
+from .graph_paths import PATH_MODES, CriticalPathCache
+from .index_registry import DEFAULT_POLL_INTERVAL, IndexRegistry, IndexWatcher
+from .node_document import NodeDocument
+from .prefetch import PREFETCH_BUNDLE_PARTS, PREFETCH_INFLIGHT, FocusPrefetcher
+from .router import ROUTING_PATTERNS, Route, default_router, routed_agents
+from .session import OperationCounter, RecentSet, RingBuffer, SessionSpill
 
 logger = logging.getLogger(__name__)
 
+# Фоновые потоки агента со своим соединением БД: выгрузка вытесненной истории
+BACKGROUND_CONNECTIONS = 1
+
+
+def connection_pool_size(concurrency: int, prefetch: int = PREFETCH_INFLIGHT) -> int:
+    """
+    Размер пула БД для concurrency одновременных запросов к агенту
+
+    Соединение пула держат не только потоки запросов, но и потоки шины
+    downstream агентов, фоновые загрузки prefetch и выгрузка истории.
+    ThreadedConnectionPool при нехватке не ждёт, а бросает PoolError,
+    поэтому пул рассчитывается на всех сразу.
+    """
+    return concurrency + BUS_CONNECTIONS + prefetch + BACKGROUND_CONNECTIONS
+
 
 class AgentState(Enum):
     """Состояния агента"""
@@ -36,10 +63,17 @@ class AgentContext:
     """Контекст текущей сессии агента"""
     session_id: str = field(default_factory=lambda: str(uuid.uuid4()))
     started_at: datetime = field(default_factory=datetime.now)
-    materials_accessed: List[str] = field(default_factory=list)
-    operations_performed: List[str] = field(default_factory=list)
+    materials_accessed: RecentSet = field(default_factory=RecentSet)
+    operations_performed: OperationCounter = field(default_factory=OperationCounter)
     current_focus: Optional[str] = None
-    query_history: List[Dict] = field(default_factory=list)
+    query_history: RingBuffer = field(default_factory=RingBuffer)
+
+    def attach_spill(self, spill: SessionSpill):
+        """Выгружать вытесненные записи истории и материалы в БД"""
+        self.query_history.on_evict = lambda record: spill.query(self.session_id, record)
+        self.materials_accessed.on_evict = lambda material_id: spill.material(
+            self.session_id, self.started_at, material_id
+        )
 
 
 class KnowledgeGateAgent:
@@ -58,46 +92,136 @@ class KnowledgeGateAgent:
     AGENT_NAME = "Knowledge Gate Agent"
     AGENT_VERSION = "1.0.0"
 
-    # Паттерны маршрутизации
-    ROUTING_PATTERNS = {
-        "analyze_": "analytical_agent",
-        "graph_": "graph_agent",
-        "edge_": "graph_agent",
-        "source_": "source_agent",
-        "raw_": "source_agent",
-        "visualize_": "visualization_agent",
-        "render_": "visualization_agent",
-        "diagram_": "visualization_agent",
-    }
+    # Паттерны маршрутизации (общая таблица agent.router)
+    ROUTING_PATTERNS = ROUTING_PATTERNS
+    # Срок выполнения маршрутизированного запроса downstream агентами (секунды)
+    ROUTE_TIMEOUT = 15.0
 
-    def __init__(self, db_manager: Optional[DatabaseManager] = None):
+    def __init__(self, db_manager: Optional[DatabaseManager] = None, prefetch: int = PREFETCH_INFLIGHT):
         """
         Инициализация агента
 
         Args:
-            db_manager: Менеджер базы данных (если не передан, создаётся новый)
+            db_manager: Менеджер базы данных (если не передан, создаётся при первом обращении)
+            prefetch: Одновременных фоновых загрузок для материала в фокусе (0 — отключить)
         """
-        self.db = db_manager or DatabaseManager()
-        self.state = AgentState.IDLE
-        self.context = AgentContext()
-        self._load_knowledge_index()
+        self._db = db_manager
+        self._local = threading.local()
+        self._state = AgentState.IDLE
+        self._spill = SessionSpill(lambda: self.db, self.AGENT_ID)
+        self._session_context = AgentContext()
+        self._session_context.attach_spill(self._spill)
+        self._critical_paths = CriticalPathCache()
+        self._prefetch = FocusPrefetcher(lambda: self.db, max_inflight=prefetch)
+        self._bus: Optional[AgentBus] = None
+        self._downstream: Dict[str, DownstreamAgent] = {}
+        self._bus_lock = threading.Lock()
+        self._indexes = IndexRegistry(
+            edge_loader=self._load_edge_index,
+            edge_stamp=self._edge_stamp,
+            cube_loader=self._load_connectivity
+        )
+        self._index_watcher: Optional[IndexWatcher] = None
 
         logger.info(f"[{self.AGENT_ID}] Агент инициализирован, сессия: {self.context.session_id}")
 
-    def _load_knowledge_index(self):
-        """Загрузка индекса знаний из Gold JSON"""
+    @property
+    def db(self) -> DatabaseManager:
+        """Менеджер БД; соединение открывается первой операцией, которой оно нужно"""
+        if self._db is None:
+            self._db = DatabaseManager()
+        return self._db
+
+    @property
+    def bus(self) -> AgentBus:
+        """Шина downstream агентов; пулы потоков создаются первым маршрутизированным запросом"""
+        if self._bus is None:
+            with self._bus_lock:
+                if self._bus is None:
+                    self._bus, self._downstream = create_bus(self)
+        return self._bus
+
+    # ==========================================
+    # КОНТЕКСТ ЗАПРОСА
+    # ==========================================
+
+    @property
+    def context(self) -> AgentContext:
+        """Контекст запроса текущего потока либо общий контекст сессии"""
+        context = getattr(self._local, "context", None)
+        return context if context is not None else self._session_context
+
+    @context.setter
+    def context(self, value: AgentContext):
+        value.attach_spill(self._spill)
+        self._session_context = value
+
+    @property
+    def state(self) -> AgentState:
+        context = getattr(self._local, "context", None)
+        return self._local.state if context is not None else self._state
+
+    @state.setter
+    def state(self, value: AgentState):
+        if getattr(self._local, "context", None) is not None:
+            self._local.state = value
+        else:
+            self._state = value
+
+    @contextmanager
+    def request_context(self, context: Optional[AgentContext] = None) -> Iterator[AgentContext]:
+        """
+        Отдельный контекст для запроса в текущем потоке
+
+        Параллельные вызывающие (HTTP-сервер, пакетный режим) не делят
+        историю запросов и состояние агента; на время запроса закрепляется
+        версия индексов, по завершении соединение потока возвращается в пул БД.
+        """
+        context = context or AgentContext()
+        context.attach_spill(self._spill)
+        self._local.context = context
+        self._local.state = AgentState.IDLE
         try:
-            gold_index_path = Path(__file__).parent.parent / "data" / "gold" / "gold_index.json"
-            if gold_index_path.exists():
-                with open(gold_index_path, 'r', encoding='utf-8') as f:
-                    self._gold_index = json.load(f)
-                logger.info(f"[{self.AGENT_ID}] Gold Index загружен: {self._gold_index.get('quick_stats', {})}")
-            else:
-                self._gold_index = {}
-                logger.warning(f"[{self.AGENT_ID}] Gold Index не найден")
+            with self.pinned_indexes():
+                yield context
+        finally:
+            self._local.context = None
+            if self._db is not None:
+                self._db.release()
+
+    @property
+    def _gold_index(self):
+        """Gold Index текущей (закреплённой запросом) версии индексов"""
+        return self._indexes.current.gold_index
+
+    def pinned_indexes(self):
+        """Закрепление версии индексов на время запроса: горячая перезагрузка не меняет её посреди обработки"""
+        return self._indexes.use()
+
+    def reload_indexes(self) -> Dict:
+        """Принудительная перезагрузка индексов с атомарной подменой"""
+        try:
+            version = self._indexes.reload()
         except Exception as e:
-            self._gold_index = {}
-            logger.error(f"[{self.AGENT_ID}] Ошибка загрузки Gold Index: {e}")
+            return self._error_response(f"Ошибка перезагрузки индексов: {e}")
+        self._prefetch.invalidate()
+        self._log_operation("reload_indexes", {"version": version.number}, "success")
+        return {
+            "status": "success",
+            "operation": "reload_indexes",
+            "data": self._indexes.status()
+        }
+
+    def start_index_watcher(self, interval: float = DEFAULT_POLL_INTERVAL):
+        """Запуск фонового отслеживания изменений Gold Index и файлов узлов"""
+        if self._index_watcher is None or not self._index_watcher.is_alive():
+            self._index_watcher = IndexWatcher(self._indexes, interval)
+            self._index_watcher.start()
+
+    def stop_index_watcher(self):
+        if self._index_watcher is not None:
+            self._index_watcher.stop()
+            self._index_watcher = None
 
     # ==========================================
     # ОСНОВНЫЕ ОПЕРАЦИИ
@@ -114,74 +238,103 @@ class KnowledgeGateAgent:
             Результат обработки с данными или маршрутизацией
         """
         self.state = AgentState.PROCESSING
-        self.context.query_history.append({
+        record = {
             "query": query,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        self.context.query_history.append(record)
+        started = time.perf_counter()
 
         try:
-            # Определяем тип запроса
-            query_lower = query.lower()
-
-            # Проверяем маршрутизацию к другим агентам
-            for pattern, agent in self.ROUTING_PATTERNS.items():
-                if pattern in query_lower:
-                    return self._route_to_agent(agent, query)
-
-            # Обрабатываем локально
-            if any(kw in query_lower for kw in ["найди", "поиск", "search", "find"]):
-                return self._handle_search(query)
-            elif any(kw in query_lower for kw in ["покажи", "получи", "get", "show"]):
-                return self._handle_get(query)
-            elif any(kw in query_lower for kw in ["список", "list", "все"]):
-                return self._handle_list(query)
-            elif any(kw in query_lower for kw in ["статистика", "stats", "overview"]):
-                return self._handle_stats()
-            elif any(kw in query_lower for kw in ["связи", "трассировка", "trace", "source"]):
-                return self._handle_traceability(query)
-            else:
-                # Умный поиск по умолчанию
-                return self._smart_search(query)
-
+            with self.pinned_indexes():
+                result = self._dispatch_query(query)
+            record["response_status"] = result.get("status")
+            return result
         except Exception as e:
             self.state = AgentState.ERROR
             logger.error(f"[{self.AGENT_ID}] Ошибка обработки: {e}")
+            record["response_status"] = "error"
             return self._error_response(str(e))
         finally:
+            record["duration_ms"] = int((time.perf_counter() - started) * 1000)
             self.state = AgentState.IDLE
 
-    def _route_to_agent(self, target_agent: str, query: str) -> Dict:
-        """Маршрутизация к downstream агенту"""
-        logger.info(f"[{self.AGENT_ID}] Маршрутизация к {target_agent}")
-        return {
-            "status": "routed",
+    def _dispatch_query(self, query: str) -> Dict[str, Any]:
+        """Выбор обработчика запроса"""
+        # Тип запроса и ID материалов — один проход скомпилированного маршрутизатора
+        route = default_router().classify(query)
+        kind, target = route.label("dispatch", (None, None))
+
+        # Маршрутизация к другим агентам
+        if kind == "route":
+            return self._route_to_agent(target, query, route)
+
+        # Обрабатываем локально
+        if target == "search":
+            return self._handle_search(query)
+        elif target == "get":
+            return self._handle_get(query, route)
+        elif target == "list":
+            return self._handle_list(route)
+        elif target == "stats":
+            return self._handle_stats()
+        elif target == "trace":
+            return self._handle_traceability(route)
+        else:
+            # Умный поиск по умолчанию
+            return self._smart_search(query)
+
+    def _route_to_agent(self, target_agent: str, query: str, route: Route) -> Dict:
+        """
+        Выполнение запроса downstream агентами через шину
+
+        Составной запрос (паттерны нескольких агентов) выполняется всеми
+        агентами параллельно; агенты, которым не хватает параметров
+        (например, ID узла), перечисляются в not_executed.
+        """
+        agents = [target_agent] + [a for a in routed_agents(query) if a != target_agent]
+        bus = self.bus
+        requests, not_executed = [], []
+        for agent_id in agents:
+            request = self._downstream[agent_id].plan(route)
+            if request is None:
+                not_executed.append(agent_id)
+                continue
+            request.priority = PRIORITY_HIGH
+            requests.append(request)
+
+        logger.info(f"[{self.AGENT_ID}] Маршрутизация к {', '.join(agents)}")
+        if not requests:
+            return {
+                "status": "routed",
+                "target_agent": target_agent,
+                "original_query": query,
+                "message": f"Запрос перенаправлен к {target_agent}: недостаточно параметров для выполнения",
+                "agent_capabilities": self._get_agent_capabilities(target_agent)
+            }
+
+        result = bus.fan_out(requests, timeout=self.ROUTE_TIMEOUT)
+        response = {
+            "status": result["status"],
+            "operation": "route_to_agent",
             "target_agent": target_agent,
-            "original_query": query,
-            "message": f"Запрос перенаправлен к {target_agent}",
-            "agent_capabilities": self._get_agent_capabilities(target_agent)
+            "data": {
+                "agents": [request.agent for request in requests],
+                "results": result["data"]["results"],
+                "not_executed": not_executed
+            }
         }
+        if result["status"] == "error":
+            response["error"] = "; ".join(r["error"] for r in result["data"]["results"])
+        self._log_operation("route_to_agent", {"agents": response["data"]["agents"]}, result["status"])
+        return response
 
     def _get_agent_capabilities(self, agent_id: str) -> Dict:
         """Получение возможностей downstream агента"""
-        capabilities = {
-            "analytical_agent": {
-                "purpose": "Глубокий анализ содержимого узлов",
-                "operations": ["analyze_node", "compare_nodes", "extract_insights"]
-            },
-            "graph_agent": {
-                "purpose": "Работа с графом связей",
-                "operations": ["get_edges", "find_path", "centrality_analysis"]
-            },
-            "source_agent": {
-                "purpose": "Работа с первоисточниками",
-                "operations": ["extract_text", "parse_document", "get_metadata"]
-            },
-            "visualization_agent": {
-                "purpose": "Визуализация данных",
-                "operations": ["render_graph", "create_diagram", "export_chart"]
-            }
-        }
-        return capabilities.get(agent_id, {})
+        for agent_class in DOWNSTREAM_AGENTS:
+            if agent_class.AGENT_ID == agent_id:
+                return {"purpose": agent_class.PURPOSE, "operations": list(agent_class.OPERATIONS)}
+        return {}
 
     # ==========================================
     # ОПЕРАЦИИ МАТЕРИАЛОВ
@@ -194,12 +347,14 @@ class KnowledgeGateAgent:
         Args:
             material_id: ID материала (NODE-*, SRC-*, etc.)
         """
-        self.context.materials_accessed.append(material_id)
+        self.context.materials_accessed.add(material_id)
         self.context.current_focus = material_id
 
-        material = self.db.get_material(material_id)
+        material = self._prefetch.material(material_id) or self.db.get_material(material_id)
         if material:
             self._log_operation("get_material", {"material_id": material_id}, "success")
+            # Следующая команда почти всегда edges/trace/сосед — загружаем заранее
+            self._prefetch.focus(material_id)
             return {
                 "status": "success",
                 "operation": "get_material",
@@ -268,6 +423,61 @@ class KnowledgeGateAgent:
             }
         }
 
+    def open_node_document(self, node_id: str) -> Optional[NodeDocument]:
+        """Ленивый документ узла по ID из Gold Index (None, если файла нет)"""
+        return self._indexes.current.node_document(node_id)
+
+    def get_node_section(self, node_id: str, section: str, subsection: Optional[str] = None) -> Dict:
+        """
+        Получение одной секции JSON-файла узла без полного парсинга
+
+        Args:
+            node_id: ID узла (NODE-*)
+            section: Секция верхнего уровня (executive_summary, meta, ...)
+            subsection: Ключ второго уровня внутри секции
+        """
+        document = self.open_node_document(node_id)
+        if document is None:
+            return {
+                "status": "error",
+                "operation": "get_node_section",
+                "error": f"Файл узла {node_id} не найден в индексе"
+            }
+        if section not in document:
+            return {
+                "status": "error",
+                "operation": "get_node_section",
+                "error": f"Секция '{section}' отсутствует в {node_id}",
+                "available_sections": list(document)
+            }
+
+        try:
+            if subsection:
+                value = document.get_subsection(section, subsection)
+            else:
+                value = document[section]
+        except KeyError:
+            return {
+                "status": "error",
+                "operation": "get_node_section",
+                "error": f"Ключ '{subsection}' отсутствует в секции '{section}'",
+                "available_keys": document.section_keys(section)
+            }
+
+        self.context.current_focus = node_id
+        self._log_operation("get_node_section", {"node_id": node_id, "section": section}, "success")
+
+        return {
+            "status": "success",
+            "operation": "get_node_section",
+            "data": {
+                "node_id": node_id,
+                "section": section,
+                "subsection": subsection,
+                "content": value
+            }
+        }
+
     # ==========================================
     # ТРАССИРОВКА
     # ==========================================
@@ -279,7 +489,7 @@ class KnowledgeGateAgent:
         Args:
             source_id: ID первоисточника (SRC-*)
         """
-        chain = self.db.get_source_chain(source_id)
+        chain = self._prefetch.source_chain(source_id) or self.db.get_source_chain(source_id)
         self._log_operation("get_source_chain", {"source_id": source_id}, "success")
 
         return {
@@ -295,7 +505,9 @@ class KnowledgeGateAgent:
         Args:
             node_id: ID узла (NODE-*)
         """
-        sources = self.db.get_node_sources(node_id)
+        sources = self._prefetch.sources(node_id)
+        if sources is None:
+            sources = self.db.get_node_sources(node_id)
         self._log_operation("get_node_sources", {"node_id": node_id}, "success")
 
         return {
@@ -315,7 +527,7 @@ class KnowledgeGateAgent:
             node_id: ID узла
             direction: 'incoming', 'outgoing', 'both'
         """
-        edges = self.db.get_node_edges(node_id, direction)
+        edges = self._prefetch.edges(node_id, direction) or self.db.get_node_edges(node_id, direction)
         self._log_operation("get_node_edges", {"node_id": node_id, "direction": direction}, "success")
 
         return {
@@ -328,6 +540,221 @@ class KnowledgeGateAgent:
             }
         }
 
+    def get_node_bundle(self, node_ids: List[str], include: Optional[List[str]] = None) -> Dict:
+        """
+        Полный контекст узлов одним запросом к БД
+
+        Args:
+            node_ids: ID узлов
+            include: Части (material, sources, outgoing, incoming, backlinks; по умолчанию все)
+        """
+        node_ids = list(dict.fromkeys(node_id.upper() for node_id in node_ids))
+        parts = list(include) if include else list(DatabaseManager.NODE_BUNDLE_PARTS)
+        # Связи, первоисточники и обратные ссылки узлов, загруженных prefetch, — из памяти;
+        # из БД для них читаются только остальные части (карточка материала)
+        cacheable = [part for part in parts if part in PREFETCH_BUNDLE_PARTS]
+        remaining = [part for part in parts if part not in PREFETCH_BUNDLE_PARTS]
+        cached = {}
+        if cacheable:
+            for node_id in node_ids:
+                bundle = self._prefetch.bundle(node_id, cacheable)
+                if bundle is not None:
+                    cached[node_id] = bundle
+        try:
+            loaded = self.db.get_node_bundle([n for n in node_ids if n not in cached], parts)
+            if cached and remaining:
+                for node_id, rest in self.db.get_node_bundle(list(cached), remaining).items():
+                    loaded[node_id] = {**cached[node_id], **rest}
+            elif cached:
+                loaded.update(cached)
+        except ValueError as e:
+            return self._error_response(str(e))
+        bundles = {
+            node_id: {part: loaded[node_id][part] for part in parts}
+            for node_id in node_ids if node_id in loaded
+        }
+        for node_id in bundles:
+            self.context.materials_accessed.add(node_id)
+        self._log_operation("get_node_bundle", {"node_ids": node_ids, "include": include}, "success")
+
+        return {
+            "status": "success",
+            "operation": "get_node_bundle",
+            "data": {
+                "nodes": bundles,
+                "missing": [node_id for node_id in node_ids if node_id not in bundles]
+            }
+        }
+
+    # ==========================================
+    # ФИЛЬТРОВАННЫЙ ОБХОД ГРАФА
+    # ==========================================
+
+    @property
+    def edge_index(self) -> EdgeIndex:
+        """Битовый индекс рёбер Knowledge Graph (строится при первом обращении)"""
+        return self._indexes.current.edge_index
+
+    def _load_edge_index(self) -> Optional[EdgeIndex]:
+        """
+        Индекс рёбер из material_edges для новой версии индексов
+
+        None — БД недоступна или рёбра в неё не загружены: версия строит
+        индекс из снимка или JSON-графа. Кэш критических путей ключуется
+        отпечатком индекса, поэтому смена рёбер в БД даёт новые ключи.
+        """
+        try:
+            rows = self.db.list_graph_edges()
+        except Exception as e:
+            logger.warning(f"[{self.AGENT_ID}] Рёбра из БД недоступны, индекс строится из файла графа: {e}")
+            return None
+        finally:
+            self._release_outside_request()
+        if not rows:
+            return None
+        index = EdgeIndex.from_rows(rows, version="database")
+        logger.info(f"[{self.AGENT_ID}] EdgeIndex из БД: {len(index.edges)} рёбер")
+        return index
+
+    def _edge_stamp(self) -> Optional[Tuple[int, int]]:
+        """Отметка рёбер БД для опроса изменений (None — БД недоступна)"""
+        try:
+            return self.db.get_graph_edges_stamp()
+        except Exception as e:
+            logger.debug(f"[{self.AGENT_ID}] Отметка рёбер БД недоступна: {e}")
+            return None
+        finally:
+            self._release_outside_request()
+
+    def _release_outside_request(self):
+        """Вне запроса (опрос и перезагрузка индексов) соединение сразу возвращается в пул"""
+        if self._db is not None and getattr(self._local, "context", None) is None:
+            self._db.release()
+
+    def filter_edges(
+        self,
+        node_id: Optional[str] = None,
+        relationships: Optional[List[str]] = None,
+        strengths: Optional[List[str]] = None,
+        direction: str = "outgoing",
+        transitive: bool = False,
+        max_depth: Optional[int] = None
+    ) -> Dict:
+        """
+        Фильтрация рёбер по типу связи и силе
+
+        Args:
+            node_id: Узел, от которого ведётся выборка/обход (None — весь граф)
+            relationships: Типы связей, допускаются glob-шаблоны (operationalizes*)
+            strengths: Силы связи (CRITICAL, STRONG, MEDIUM, MODERATE)
+            direction: 'outgoing' или 'incoming'
+            transitive: Обход всех достижимых узлов по отфильтрованным рёбрам
+            max_depth: Ограничение глубины транзитивного обхода
+        """
+        index = self.edge_index
+
+        if transitive and node_id:
+            traversal = index.traverse(
+                node_id,
+                relationships=relationships,
+                strengths=strengths,
+                direction=direction,
+                max_depth=max_depth
+            )
+            edges = index.edges_for(traversal["edges_mask"])
+            reached = traversal["nodes"]
+        else:
+            edges = index.select(
+                relationships=relationships,
+                strengths=strengths,
+                source=node_id if direction == "outgoing" else None,
+                target=node_id if direction == "incoming" else None
+            )
+            reached = {}
+
+        self._log_operation("filter_edges", {
+            "node_id": node_id,
+            "relationships": relationships,
+            "strengths": strengths,
+            "transitive": transitive
+        }, "success")
+
+        return {
+            "status": "success",
+            "operation": "filter_edges",
+            "data": {
+                "node_id": node_id,
+                "filters": {
+                    "relationships": relationships,
+                    "strengths": strengths,
+                    "direction": direction,
+                    "transitive": transitive
+                },
+                "reachable_nodes": reached,
+                "count": len(edges),
+                "edges": [edge.to_dict() for edge in edges]
+            }
+        }
+
+    @property
+    def connectivity(self) -> ConnectivityCube:
+        """Куб связности слоёв (строится при первом обращении)"""
+        return self._indexes.current.connectivity
+
+    def _load_connectivity(self) -> Optional[ConnectivityCube]:
+        """
+        Куб связности из edge_connectivity_cube для новой версии индексов
+
+        Куб в БД обновляется триггерами material_edges; изменение рёбер
+        меняет их отметку и вызывает перезагрузку версии. None — БД
+        недоступна или куб пуст: версия строит куб по индексу рёбер.
+        """
+        try:
+            rows = self.db.get_connectivity_cube()
+        except Exception as e:
+            logger.warning(f"[{self.AGENT_ID}] Куб связности из БД недоступен, строится по рёбрам: {e}")
+            return None
+        finally:
+            self._release_outside_request()
+        return ConnectivityCube.from_rows(rows) if rows else None
+
+    def get_connectivity(
+        self,
+        source_layer: Optional[str] = None,
+        target_layer: Optional[str] = None,
+        strength: Optional[str] = None,
+        relationship: Optional[str] = None,
+        group_by: Optional[str] = None
+    ) -> Dict:
+        """
+        Срез куба связности слоёв
+
+        Args:
+            source_layer: Слой источника (None — все)
+            target_layer: Слой цели (None — все)
+            strength: Сила связи (None — все)
+            relationship: Тип связи (None — все)
+            group_by: Измерение для группировки (relationship, strength, source_layer, target_layer)
+        """
+        fixed = {
+            "source_layer": source_layer,
+            "target_layer": target_layer,
+            "strength": strength.upper() if strength else None,
+            "relationship": relationship
+        }
+        cube = self.connectivity
+        data = {"filters": fixed, "total": cube.query(**fixed)}
+        if group_by:
+            data["group_by"] = group_by
+            data["groups"] = cube.slice(group_by, **{k: v for k, v in fixed.items() if v is not None})
+
+        self._log_operation("get_connectivity", dict(fixed, group_by=group_by), "success")
+        return {
+            "status": "success",
+            "operation": "get_connectivity",
+            "data": data
+        }
+
     # ==========================================
     # СТАТИСТИКА И ОБЗОР
     # ==========================================
@@ -347,11 +774,74 @@ class KnowledgeGateAgent:
                 "database": stats,
                 "graph": graph_overview,
                 "gold_index": gold_stats,
-                "critical_path": self._gold_index.get("critical_path", {}),
+                "critical_path": self._overview_critical_path(),
+                "layer_connectivity": self.connectivity.layer_matrix(),
                 "backlinks_ranking": self._gold_index.get("backlinks_ranking", [])[:5]
             }
         }
 
+    def get_critical_path(
+        self,
+        source_layer: str = "L1-Strategic",
+        target_layer: str = "L3-Technical",
+        mode: str = "shortest",
+        k: int = 3
+    ) -> Dict:
+        """
+        Вычисление критического пути между слоями по текущему графу
+
+        Args:
+            source_layer: Слой начальных узлов
+            target_layer: Слой конечных узлов
+            mode: 'shortest' (минимальная стоимость) или 'longest' (максимальный вес)
+            k: Количество путей (лучший + альтернативы)
+        """
+        if mode not in PATH_MODES:
+            return {
+                "status": "error",
+                "operation": "get_critical_path",
+                "error": f"Неизвестный режим пути: {mode} (допустимы: {', '.join(PATH_MODES)})"
+            }
+        layer_members = self._gold_index.get("layer_members", {})
+        sources = layer_members.get(source_layer, [])
+        targets = layer_members.get(target_layer, [])
+        if not sources or not targets:
+            return {
+                "status": "error",
+                "operation": "get_critical_path",
+                "error": f"Слой {source_layer if not sources else target_layer} не найден в Gold Index"
+            }
+
+        result = self._critical_paths.get_blocking(self.edge_index, sources, targets, mode=mode, k=k)
+        self._log_operation("get_critical_path", {
+            "source_layer": source_layer,
+            "target_layer": target_layer,
+            "mode": mode
+        }, "success")
+
+        return {
+            "status": "success",
+            "operation": "get_critical_path",
+            "data": dict(result, source_layer=source_layer, target_layer=target_layer)
+        }
+
+    def _overview_critical_path(self) -> Dict:
+        """Критический путь для обзора: из кэша, без ожидания пересчёта"""
+        layer_members = self._gold_index.get("layer_members", {})
+        sources = layer_members.get("L1-Strategic", [])
+        targets = layer_members.get("L3-Technical", [])
+        computed = None
+        if sources and targets:
+            try:
+                computed = self._critical_paths.get(self.edge_index, sources, targets)
+            except Exception as e:
+                logger.warning(f"[{self.AGENT_ID}] Критический путь недоступен: {e}")
+
+        if computed:
+            return computed
+        # Пока вычисление не готово — статический снимок из Gold Index
+        return dict(self._gold_index.get("critical_path", {}), source="gold_index")
+
     def get_statistics(self) -> Dict:
         """Статистика базы данных"""
         stats = self.db.get_statistics()
@@ -453,6 +943,61 @@ class KnowledgeGateAgent:
             }
         }
 
+    # ==========================================
+    # ТИПИЗИРОВАННЫЕ ОПЕРАЦИИ
+    # ==========================================
+
+    # Операция → обязательные параметры (для внешних вызывающих: HTTP, пакетный режим)
+    TYPED_OPERATIONS = {
+        "get": ("id",),
+        "search": ("q",),
+        "trace": ("id",),
+        "edges": ("id",),
+        "layer": ("layer",),
+        "overview": (),
+        "bundle": ("ids",),
+    }
+
+    LAYER_ALIASES = {"L1": "L1-Strategic", "L2": "L2-Operational", "L3": "L3-Technical"}
+
+    def execute_operation(self, operation: str, params: Dict[str, Any]) -> Dict:
+        """
+        Выполнение типизированной операции по имени
+
+        Args:
+            operation: get, search, trace, edges, layer, overview, bundle
+            params: Параметры операции (id, ids, include, q, category, direction, layer)
+
+        Raises:
+            ValueError: Неизвестная операция или не указан обязательный параметр
+        """
+        required = self.TYPED_OPERATIONS.get(operation)
+        if required is None:
+            raise ValueError(f"Неизвестная операция: {operation}")
+        missing = [name for name in required if not params.get(name)]
+        if missing:
+            raise ValueError(f"Операция {operation}: не указаны параметры {', '.join(missing)}")
+
+        if operation == "get":
+            return self.get_material(str(params["id"]).upper())
+        if operation == "search":
+            return self.search(str(params["q"]), category=params.get("category"))
+        if operation == "trace":
+            material_id = str(params["id"]).upper()
+            if material_id.startswith("SRC"):
+                return self.get_source_chain(material_id)
+            return self.get_node_sources(material_id)
+        if operation == "edges":
+            return self.get_node_edges(str(params["id"]).upper(), params.get("direction") or "both")
+        if operation == "layer":
+            layer = str(params["layer"]).strip()
+            if not layer.upper().startswith("L"):
+                layer = f"L{layer}"
+            return self.get_layer_nodes(self.LAYER_ALIASES.get(layer.upper(), layer))
+        if operation == "bundle":
+            return self.get_node_bundle(_as_list(params["ids"]), _as_list(params.get("include")) or None)
+        return self.get_overview()
+
     # ==========================================
     # ВНУТРЕННИЕ МЕТОДЫ
     # ==========================================
@@ -464,45 +1009,27 @@ class KnowledgeGateAgent:
         search_term = " ".join(words)
         return self.search(search_term)
 
-    def _handle_get(self, query: str) -> Dict:
+    def _handle_get(self, query: str, route: Route) -> Dict:
         """Обработка запроса на получение"""
         # Ищем ID материала в запросе
-        import re
-        pattern = r'(NODE|SRC|GRAPH|SCHEMA|GOLD)-[A-Z0-9-]+'
-        match = re.search(pattern, query.upper())
-        if match:
-            return self.get_material(match.group())
+        material_id = route.first_id()
+        if material_id:
+            return self.get_material(material_id)
         return self._smart_search(query)
 
-    def _handle_list(self, query: str) -> Dict:
+    def _handle_list(self, route: Route) -> Dict:
         """Обработка запроса на список"""
-        query_lower = query.lower()
-
-        if "node" in query_lower or "узл" in query_lower:
-            return self.list_materials(category="ANALYTICAL_NODES")
-        elif "source" in query_lower or "источник" in query_lower:
-            return self.list_materials(category="RAW_SOURCES")
-        elif "strategic" in query_lower or "l1" in query_lower:
-            return self.list_materials(layer="L1-Strategic")
-        elif "operational" in query_lower or "l2" in query_lower:
-            return self.list_materials(layer="L2-Operational")
-        elif "technical" in query_lower or "l3" in query_lower:
-            return self.list_materials(layer="L3-Technical")
-        else:
-            return self.list_materials()
+        return self.list_materials(**route.label("list_scope", {}))
 
     def _handle_stats(self) -> Dict:
         """Обработка запроса статистики"""
         return self.get_overview()
 
-    def _handle_traceability(self, query: str) -> Dict:
+    def _handle_traceability(self, route: Route) -> Dict:
         """Обработка запроса трассировки"""
-        import re
-        pattern = r'(NODE|SRC)-[A-Z0-9-]+'
-        match = re.search(pattern, query.upper())
+        material_id = route.first_id(("NODE", "SRC"))
 
-        if match:
-            material_id = match.group()
+        if material_id:
             if material_id.startswith("SRC"):
                 return self.get_source_chain(material_id)
             else:
@@ -525,7 +1052,7 @@ class KnowledgeGateAgent:
 
     def _log_operation(self, operation: str, params: Dict, status: str):
         """Логирование операции"""
-        self.context.operations_performed.append(operation)
+        self.context.operations_performed.record(operation)
         logger.info(f"[{self.AGENT_ID}] {operation}: {status}")
 
     def _error_response(self, error: str) -> Dict:
@@ -557,7 +1084,9 @@ class KnowledgeGateAgent:
                 "validation"
             ],
             "downstream_agents": list(set(self.ROUTING_PATTERNS.values())),
-            "gold_index_loaded": bool(self._gold_index)
+            "bus": self._bus.stats() if self._bus is not None else {},
+            "gold_index_loaded": bool(self._gold_index),
+            "db_connected": self._db is not None and self._db.is_connected
         }
 
     def get_session_context(self) -> Dict:
@@ -565,8 +1094,29 @@ class KnowledgeGateAgent:
         return {
             "session_id": self.context.session_id,
             "started_at": self.context.started_at.isoformat(),
-            "materials_accessed": self.context.materials_accessed,
-            "operations_count": len(self.context.operations_performed),
+            "materials_accessed": list(self.context.materials_accessed),
+            "materials_accessed_count": self.context.materials_accessed.total,
+            "operations_count": self.context.operations_performed.total,
             "current_focus": self.context.current_focus,
-            "queries_count": len(self.context.query_history)
+            "queries_count": self.context.query_history.total,
+            "prefetch": self._prefetch.stats()
         }
+
+
+def _as_list(value: Any) -> List[str]:
+    """Список из JSON-массива или строки через запятую (параметры HTTP и пакетного режима)"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    return [str(item) for item in value]
+
+
+# Каждая операция агента — span в database.metrics (вложенные запросы к БД учитываются)
+AGENT_OPERATIONS = (
+    "process_query", "execute_operation", "get_material", "list_materials", "search",
+    "get_node_section", "get_source_chain", "get_node_sources", "get_node_edges",
+    "get_node_bundle", "filter_edges", "get_connectivity", "get_overview", "get_critical_path",
+    "get_statistics", "quick_lookup", "search_by_keyword", "get_layer_nodes", "reload_indexes",
+)
+instrument_methods(KnowledgeGateAgent, "agent", AGENT_OPERATIONS)
@@ -0,0 +1,249 @@
+"""
+Lazy Node Document
+Ленивое чтение секций больших JSON-файлов узлов
+
+При первом обращении файл сканируется один раз и строится sidecar-индекс
+байтовых диапазонов секций верхнего и второго уровня. Далее файл
+открывается через mmap, и json-парсинг выполняется только для
+запрошенной секции.
+
+Документ общий для потоков сервера, шины и prefetch: открытие файла
+и загрузка индекса выполняются под блокировкой, а разобранные секции
+кэшируются и выдаются копиями.
+"""
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Версия формата sidecar-индекса
+INDEX_FORMAT_VERSION = 1
+
+# Каталог sidecar-индексов рядом с файлами узлов
+INDEX_DIR_NAME = ".sections"
+
+# Строки JSON целиком либо структурные символы
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\],:]', re.DOTALL)
+
+_WHITESPACE = b" \t\r\n"
+
+Range = Tuple[int, int]
+
+
+def _copy_json(value: Any) -> Any:
+    """Копия разобранного JSON (строки и числа неизменяемы и не копируются)"""
+    if isinstance(value, dict):
+        return {k: _copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_json(v) for v in value]
+    return value
+
+
+def scan_sections(buf) -> Dict[str, Dict[str, Any]]:
+    """
+    Поиск байтовых диапазонов секций JSON-объекта
+
+    Args:
+        buf: bytes или mmap с JSON-объектом верхнего уровня
+
+    Returns:
+        Ключ → {"range": [start, end], "children": {ключ: [start, end]}}
+        (children заполняется, только если значение секции — объект)
+    """
+    sections: Dict[str, Dict[str, Any]] = {}
+    stack: List[bytes] = []
+    expect_key = [False]
+    pending_key: Dict[int, str] = {}
+    open_value: Dict[int, Tuple[str, int]] = {}
+    current_top: Optional[str] = None
+
+    def close_value(depth: int, end: int):
+        entry = open_value.pop(depth, None)
+        if entry is None:
+            return
+        key, start = entry
+        while start < end and buf[start] in _WHITESPACE:
+            start += 1
+        while end > start and buf[end - 1] in _WHITESPACE:
+            end -= 1
+        if depth == 1:
+            sections[key]["range"] = [start, end]
+        elif depth == 2 and current_top is not None:
+            sections[current_top]["children"][key] = [start, end]
+
+    for match in _TOKEN_RE.finditer(buf):
+        token = match.group()
+        depth = len(stack)
+        first = token[:1]
+
+        if first == b'"':
+            if depth and stack[-1] == b"{" and expect_key[depth]:
+                pending_key[depth] = json.loads(token)
+                expect_key[depth] = False
+        elif token == b":":
+            key = pending_key.pop(depth, None)
+            if key is not None and depth in (1, 2):
+                open_value[depth] = (key, match.end())
+                if depth == 1:
+                    current_top = key
+                    sections[key] = {"range": None, "children": {}}
+        elif token in (b"{", b"["):
+            stack.append(token)
+            expect_key.append(token == b"{")
+        elif token in (b"}", b"]"):
+            close_value(depth, match.start())
+            stack.pop()
+            expect_key.pop()
+        elif token == b",":
+            close_value(depth, match.start())
+            if depth and stack[-1] == b"{":
+                expect_key[depth] = True
+
+    return sections
+
+
+class NodeDocument(Mapping):
+    """
+    Read-only mapping поверх JSON-файла узла
+
+    doc["executive_summary"] парсит только эту секцию;
+    doc.get_subsection("meta", "node_id") — только вложенный ключ.
+    Значения возвращаются копиями: изменения вызывающего не попадают в кэш.
+    """
+
+    def __init__(self, path: Path, index_dir: Optional[Path] = None):
+        self.path = Path(path)
+        self.index_dir = index_dir or self.path.parent / INDEX_DIR_NAME
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._sections: Optional[Dict[str, Dict[str, Any]]] = None
+        self._parsed: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.RLock()
+
+    # ==========================================
+    # ИНДЕКС
+    # ==========================================
+
+    @property
+    def index_path(self) -> Path:
+        return self.index_dir / f"{self.path.name}.sections.json"
+
+    def _buffer(self) -> mmap.mmap:
+        with self._lock:
+            if self._mmap is None:
+                self._file = open(self.path, "rb")
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        sections = self._sections
+        if sections is not None:
+            return sections
+        with self._lock:
+            if self._sections is None:
+                self._sections = self._read_index()
+            return self._sections
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        stat = self.path.stat()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if (cached.get("format") == INDEX_FORMAT_VERSION
+                    and cached.get("size") == stat.st_size
+                    and cached.get("mtime_ns") == stat.st_mtime_ns):
+                return cached["sections"]
+        except (OSError, ValueError):
+            pass
+
+        sections = scan_sections(self._buffer())
+        self._save_index(stat, sections)
+        return sections
+
+    def _save_index(self, stat: os.stat_result, sections: Dict[str, Dict[str, Any]]):
+        """Запись sidecar-индекса (ошибки записи не критичны)"""
+        try:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "format": INDEX_FORMAT_VERSION,
+                    "file": self.path.name,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sections": sections
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить индекс секций {self.index_path}: {e}")
+
+    # ==========================================
+    # MAPPING API
+    # ==========================================
+
+    def _parse(self, cache_key: Tuple[str, ...], byte_range: Range) -> Any:
+        """Разобранное значение диапазона (один разбор на ключ)"""
+        value = self._parsed.get(cache_key)
+        if value is None and cache_key not in self._parsed:
+            with self._lock:
+                if cache_key not in self._parsed:
+                    start, end = byte_range
+                    self._parsed[cache_key] = json.loads(self._buffer()[start:end])
+                value = self._parsed[cache_key]
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        return _copy_json(self._parse((key,), self._load_index()[key]["range"]))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load_index())
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._load_index()
+
+    def section_keys(self, key: str) -> List[str]:
+        """Ключи второго уровня секции (без парсинга значения)"""
+        return list(self._load_index()[key]["children"])
+
+    def get_subsection(self, key: str, child: str) -> Any:
+        """Значение вложенного ключа секции"""
+        cache_key = (key, child)
+        if cache_key not in self._parsed and (key,) in self._parsed:
+            return _copy_json(self._parsed[(key,)][child])
+        return _copy_json(self._parse(cache_key, self._load_index()[key]["children"][child]))
+
+    def section_size(self, key: str) -> int:
+        """Размер секции в байтах"""
+        start, end = self._load_index()[key]["range"]
+        return end - start
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -8,6 +8,8 @@ from enum import Enum
 from typing import Any, Dict, List, Optional
 import uuid
 
+from .router import default_router
+
 
 class OperationStatus(Enum):
     """Статус выполнения операции"""
@@ -23,6 +25,7 @@ class OperationType(Enum):
     # Material Management
     GET_MATERIAL = "get_material"
     LIST_MATERIALS = "list_materials"
+    GET_NODE_SECTION = "get_node_section"
     UPDATE_MATERIAL = "update_material"
     ARCHIVE_MATERIAL = "archive_material"
 
@@ -35,10 +38,13 @@ class OperationType(Enum):
     GET_SOURCE_CHAIN = "get_source_chain"
     GET_NODE_SOURCES = "get_node_sources"
     GET_NODE_EDGES = "get_node_edges"
+    FILTER_EDGES = "filter_edges"
 
     # Statistics
     GET_OVERVIEW = "get_overview"
     GET_STATISTICS = "get_statistics"
+    GET_CRITICAL_PATH = "get_critical_path"
+    GET_CONNECTIVITY = "get_connectivity"
 
     # Routing
     ROUTE_TO_AGENT = "route_to_agent"
@@ -141,6 +147,7 @@ OPERATION_MAP = {
     # Material operations
     "get": OperationType.GET_MATERIAL,
     "list": OperationType.LIST_MATERIALS,
+    "section": OperationType.GET_NODE_SECTION,
     "update": OperationType.UPDATE_MATERIAL,
     "archive": OperationType.ARCHIVE_MATERIAL,
 
@@ -154,10 +161,13 @@ OPERATION_MAP = {
     "trace": OperationType.GET_SOURCE_CHAIN,
     "sources": OperationType.GET_NODE_SOURCES,
     "edges": OperationType.GET_NODE_EDGES,
+    "filter": OperationType.FILTER_EDGES,
 
     # Stats
     "overview": OperationType.GET_OVERVIEW,
     "stats": OperationType.GET_STATISTICS,
+    "critical": OperationType.GET_CRITICAL_PATH,
+    "connectivity": OperationType.GET_CONNECTIVITY,
 
     # Validation
     "validate": OperationType.VALIDATE_INTEGRITY,
@@ -175,8 +185,4 @@ def parse_operation(query: str) -> Optional[OperationType]:
     Returns:
         Тип операции или None
     """
-    query_lower = query.lower()
-    for keyword, op_type in OPERATION_MAP.items():
-        if keyword in query_lower:
-            return op_type
-    return None
+    return default_router().classify(query).label("operation")
@@ -0,0 +1,227 @@
+"""
+Focus Prefetch
+Упреждающая загрузка данных материала, на котором сфокусирован агент
+
+После get_material следующая команда почти всегда edges, trace, bundle
+или переход к соседнему узлу. Prefetcher в фоне загружает для узла в
+фокусе связи (исходящие и входящие), первоисточники, обратные ссылки
+(таблица backlinks) и карточки ближайших соседей по весу связи, для
+первоисточника — цепочку трассировки. Последующие команды отвечают из памяти.
+
+Одновременно выполняется не больше max_inflight загрузок; фокус, для
+которого нет свободного слота, пропускается (счётчик skipped) — загрузки
+не копятся в очереди и не конкурируют с запросами пользователя за БД.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from database.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Одновременных загрузок, узлов в кэше, время жизни записи (секунды), соседей на узел
+PREFETCH_INFLIGHT = 2
+PREFETCH_CAPACITY = 64
+PREFETCH_TTL = 300.0
+PREFETCH_NEIGHBORS = 5
+
+# Части пакета контекста узла (DatabaseManager.get_node_bundle), которые загружаются для узла в фокусе
+PREFETCH_BUNDLE_PARTS = ("sources", "outgoing", "incoming", "backlinks")
+
+
+class FocusPrefetcher:
+    """Кэш данных узлов в фокусе с фоновым заполнением"""
+
+    def __init__(
+        self,
+        db_factory: Callable[[], Any],
+        max_inflight: int = PREFETCH_INFLIGHT,
+        capacity: int = PREFETCH_CAPACITY,
+        ttl: float = PREFETCH_TTL,
+        neighbors: int = PREFETCH_NEIGHBORS,
+    ):
+        """
+        Args:
+            db_factory: Возвращает DatabaseManager (вызывается в фоновом потоке)
+            max_inflight: Предел одновременных загрузок (0 — prefetch отключён)
+            capacity: Сколько материалов хранится (вытесняются давно использованные)
+            ttl: Время жизни записи (секунды)
+            neighbors: Сколько соседей узла загружать
+        """
+        self.db_factory = db_factory
+        self.max_inflight = max_inflight
+        self.capacity = capacity
+        self.ttl = ttl
+        self.neighbors = neighbors
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.skipped = 0
+        self.errors = 0
+        # material_id → (время загрузки, {вид данных → значение})
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending: set = set()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(max_inflight, 1))
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ==========================================
+    # ЗАПУСК ЗАГРУЗКИ
+    # ==========================================
+
+    def focus(self, material_id: str):
+        """Материал получил фокус: загрузить связанные данные, если их ещё нет"""
+        if self.max_inflight <= 0:
+            return
+        with self._lock:
+            if material_id in self._pending or self._fresh(material_id, "focused"):
+                return
+            if not self._slots.acquire(blocking=False):
+                self.skipped += 1
+                return
+            self._pending.add(material_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="prefetch")
+        self._executor.submit(self._load, material_id)
+
+    def _load(self, material_id: str):
+        db = None
+        try:
+            db = self.db_factory()
+            if material_id.startswith("SRC"):
+                self._store(material_id, focused=True, source_chain=db.get_source_chain(material_id))
+            else:
+                # Связи, первоисточники и обратные ссылки — один запрос
+                bundle = db.get_node_bundle([material_id], list(PREFETCH_BUNDLE_PARTS)).get(material_id)
+                if bundle is None:
+                    return
+                edges = {"incoming": bundle["incoming"], "outgoing": bundle["outgoing"]}
+                self._store(material_id, focused=True, edges=edges, sources=bundle["sources"],
+                            backlinks=bundle["backlinks"])
+                for neighbor in self._top_neighbors(edges):
+                    with self._lock:
+                        cached = self._fresh(neighbor, "material")
+                    if cached is None:
+                        self._store(neighbor, material=db.get_material(neighbor))
+            self.prefetched += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"[prefetch] {material_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(material_id)
+            self._slots.release()
+            if db is not None:
+                # В режиме пула соединение возвращается сразу после загрузки
+                db.release()
+
+    def _top_neighbors(self, edges: Dict) -> List[str]:
+        linked = [(edge.get("weight") or 0, edge["target_id"]) for edge in edges.get("outgoing", [])]
+        linked += [(edge.get("weight") or 0, edge["source_id"]) for edge in edges.get("incoming", [])]
+        result: List[str] = []
+        for _, neighbor in sorted(linked, key=lambda item: item[0], reverse=True):
+            if neighbor not in result:
+                result.append(neighbor)
+            if len(result) == self.neighbors:
+                break
+        return result
+
+    def _store(self, material_id: str, **values):
+        with self._lock:
+            loaded_at, data = self._entries.pop(material_id, (time.monotonic(), {}))
+            if time.monotonic() - loaded_at > self.ttl:
+                loaded_at, data = time.monotonic(), {}
+            data.update(values)
+            self._entries[material_id] = (loaded_at, data)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def _fresh(self, material_id: str, kind: str) -> Any:
+        entry = self._entries.get(material_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1].get(kind)
+
+    # ==========================================
+    # ЧТЕНИЕ ИЗ КЭША
+    # ==========================================
+
+    def _lookup(self, material_id: str, kind: str) -> Any:
+        with self._lock:
+            value = self._fresh(material_id, kind)
+            if value is not None:
+                self._entries.move_to_end(material_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.record_cache(value is not None)
+        return value
+
+    def material(self, material_id: str) -> Optional[Dict]:
+        """Карточка материала, загруженная как соседняя"""
+        return self._lookup(material_id, "material")
+
+    def edges(self, node_id: str, direction: str = "both") -> Optional[Dict]:
+        """Связи узла в формате DatabaseManager.get_node_edges"""
+        edges = self._lookup(node_id, "edges")
+        if edges is None:
+            return None
+        return {
+            "incoming": list(edges["incoming"]) if direction in ("both", "incoming") else [],
+            "outgoing": list(edges["outgoing"]) if direction in ("both", "outgoing") else [],
+        }
+
+    def sources(self, node_id: str) -> Optional[List[Dict]]:
+        """Первоисточники узла (DatabaseManager.get_node_sources)"""
+        sources = self._lookup(node_id, "sources")
+        return list(sources) if sources is not None else None
+
+    def backlinks(self, node_id: str) -> Optional[List[Dict]]:
+        """Обратные ссылки на узел (часть backlinks пакета контекста)"""
+        backlinks = self._lookup(node_id, "backlinks")
+        return list(backlinks) if backlinks is not None else None
+
+    def bundle(self, node_id: str, parts: List[str]) -> Optional[Dict]:
+        """Части пакета контекста узла (DatabaseManager.get_node_bundle); None — если не все в кэше"""
+        if any(part not in PREFETCH_BUNDLE_PARTS for part in parts):
+            return None
+        with self._lock:
+            entry = self._entries.get(node_id)
+            data = entry[1] if entry is not None and time.monotonic() - entry[0] <= self.ttl else {}
+            hit = bool(data.get("focused")) and "edges" in data
+            if hit:
+                self._entries.move_to_end(node_id)
+                self.hits += 1
+                result = {
+                    part: list(data["edges"][part] if part in ("outgoing", "incoming") else data[part])
+                    for part in parts
+                }
+            else:
+                self.misses += 1
+        metrics.record_cache(hit)
+        return result if hit else None
+
+    def source_chain(self, source_id: str) -> Optional[Dict]:
+        """Цепочка трассировки первоисточника (DatabaseManager.get_source_chain)"""
+        return self._lookup(source_id, "source_chain")
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "prefetched": self.prefetched,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "cached": len(self._entries),
+            "inflight": len(self._pending),
+        }
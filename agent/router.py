@@ -0,0 +1,175 @@
+"""
+Query Router
+Скомпилированный маршрутизатор запросов агента
+
+Все таблицы ключевых слов (маршрутизация к downstream-агентам, намерения
+KnowledgeGateAgent, области списка, OPERATION_MAP) сводятся в одно
+регулярное выражение-бор, которое проходит запрос один раз и заодно
+находит ID материалов. Семантика прежняя: ключевое слово срабатывает как
+подстрока в любом месте запроса, внутри таблицы побеждает запись с
+меньшим приоритетом (порядок в таблице).
+
+Совпадения ищутся в каждой позиции (опережающая проверка нулевой ширины),
+бор возвращает самое длинное слово, начинающееся в позиции, а более
+короткие слова-префиксы учтены заранее при компиляции.
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Паттерны маршрутизации к downstream-агентам (проверяются раньше намерений)
+ROUTING_PATTERNS = {
+    "analyze_": "analytical_agent",
+    "graph_": "graph_agent",
+    "edge_": "graph_agent",
+    "source_": "source_agent",
+    "raw_": "source_agent",
+    "visualize_": "visualization_agent",
+    "render_": "visualization_agent",
+    "diagram_": "visualization_agent",
+}
+
+# Намерения локальной обработки в порядке приоритета
+INTENT_KEYWORDS = {
+    "search": ("найди", "поиск", "search", "find"),
+    "get": ("покажи", "получи", "get", "show"),
+    "list": ("список", "list", "все"),
+    "stats": ("статистика", "stats", "overview"),
+    "trace": ("связи", "трассировка", "trace", "source"),
+}
+
+# Область запроса списка → параметры list_materials
+LIST_SCOPES = (
+    (("node", "узл"), {"category": "ANALYTICAL_NODES"}),
+    (("source", "источник"), {"category": "RAW_SOURCES"}),
+    (("strategic", "l1"), {"layer": "L1-Strategic"}),
+    (("operational", "l2"), {"layer": "L2-Operational"}),
+    (("technical", "l3"), {"layer": "L3-Technical"}),
+)
+
+# Префиксы ID материалов
+ID_PREFIXES = ("NODE", "SRC", "GRAPH", "SCHEMA", "GOLD")
+
+# (ключевое слово, метка) в порядке приоритета
+Table = Sequence[Tuple[str, Any]]
+
+
+@dataclass(frozen=True)
+class Route:
+    """Результат классификации запроса"""
+    labels: Dict[str, Any] = field(default_factory=dict)
+    ids: Tuple[str, ...] = ()
+
+    def label(self, table: str, default: Any = None) -> Any:
+        """Метка победившего ключевого слова таблицы"""
+        return self.labels.get(table, default)
+
+    def first_id(self, prefixes: Iterable[str] = ID_PREFIXES) -> Optional[str]:
+        """Первый ID в запросе с одним из префиксов"""
+        prefixes = tuple(f"{prefix}-" for prefix in prefixes)
+        for material_id in self.ids:
+            if material_id.startswith(prefixes):
+                return material_id
+        return None
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Регулярное выражение-бор; на каждом узле более длинные продолжения пробуются первыми"""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if "" in node:
+            branches.append("")
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return render(trie)
+
+
+class QueryRouter:
+    """Однопроходный классификатор запроса по нескольким таблицам ключевых слов"""
+
+    def __init__(self, tables: Mapping[str, Table], id_prefixes: Sequence[str] = ID_PREFIXES):
+        """
+        Args:
+            tables: Имя таблицы → [(ключевое слово, метка)] в порядке приоритета
+            id_prefixes: Префиксы ID материалов, извлекаемых из запроса
+        """
+        hits: Dict[str, Dict[str, Tuple[int, Any]]] = {}
+        for name, entries in tables.items():
+            for priority, (keyword, label) in enumerate(entries):
+                # Повтор слова в таблице не меняет результат: срабатывает первое вхождение
+                hits.setdefault(keyword.lower(), {}).setdefault(name, (priority, label))
+
+        id_markers = tuple(f"{prefix.lower()}-" for prefix in id_prefixes)
+        words = set(hits) | set(id_markers)
+
+        # Слово, найденное в позиции, означает и все слова-префиксы в той же позиции
+        self._matches: Dict[str, Tuple[Dict[str, Tuple[int, Any]], bool]] = {}
+        for word in words:
+            merged: Dict[str, Tuple[int, Any]] = {}
+            for end in range(1, len(word) + 1):
+                for name, hit in hits.get(word[:end], {}).items():
+                    if name not in merged or hit[0] < merged[name][0]:
+                        merged[name] = hit
+            self._matches[word] = (merged, word.startswith(id_markers))
+
+        self._pattern = re.compile(f"(?=({_trie_pattern(words)}))")
+        prefixes = "|".join(re.escape(prefix.lower()) for prefix in id_prefixes)
+        self._id_pattern = re.compile(f"(?:{prefixes})-[a-z0-9-]+")
+
+    def classify(self, query: str) -> Route:
+        """Метки всех таблиц и ID материалов за один проход по запросу"""
+        query = query.lower()
+        best: Dict[str, Tuple[int, Any]] = {}
+        ids = []
+        for match in self._pattern.finditer(query):
+            hits, is_id = self._matches[match.group(1)]
+            for name, hit in hits.items():
+                if name not in best or hit[0] < best[name][0]:
+                    best[name] = hit
+            if is_id:
+                id_match = self._id_pattern.match(query, match.start())
+                if id_match:
+                    ids.append(id_match.group().upper())
+        return Route({name: label for name, (_, label) in best.items()}, tuple(ids))
+
+
+def dispatch_table() -> Table:
+    """Маршрутизация к агентам, затем намерения KnowledgeGateAgent"""
+    table = [(pattern, ("route", agent)) for pattern, agent in ROUTING_PATTERNS.items()]
+    for intent, keywords in INTENT_KEYWORDS.items():
+        table.extend((keyword, ("intent", intent)) for keyword in keywords)
+    return table
+
+
+@lru_cache(maxsize=1)
+def default_router() -> QueryRouter:
+    """Общий маршрутизатор агента и agent.operations.parse_operation"""
+    from .operations import OPERATION_MAP
+
+    return QueryRouter({
+        "dispatch": dispatch_table(),
+        "list_scope": [(keyword, scope) for keywords, scope in LIST_SCOPES for keyword in keywords],
+        "operation": list(OPERATION_MAP.items()),
+    })
+
+
+def routed_agents(query: str) -> List[str]:
+    """Все downstream-агенты, паттерны которых есть в запросе (составной запрос), в порядке таблицы"""
+    query = query.lower()
+    agents: List[str] = []
+    for pattern, agent in ROUTING_PATTERNS.items():
+        if pattern in query and agent not in agents:
+            agents.append(agent)
+    return agents
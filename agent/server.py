@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Knowledge Gate HTTP Server
+Асинхронный HTTP/JSON-сервис поверх KnowledgeGateAgent
+
+Один процесс обслуживает множество клиентов: соединения принимает
+цикл asyncio, а вызовы агента (блокирующие обращения к БД и индексам)
+выполняются в пуле потоков. Каждый запрос получает собственный
+AgentContext, версию индексов и соединение из общего пула БД (пул
+рассчитан и на потоки шины downstream агентов и prefetch —
+connection_pool_size).
+
+Маршруты:
+    GET  /health             — состояние агента
+    GET  /metrics            — метрики в формате Prometheus
+    POST /query              — {"query": "..."} → process_query
+    GET  /ops/<operation>    — параметры в строке запроса
+    POST /ops/<operation>    — параметры в JSON-теле
+Операции: get, search, trace, edges, layer, overview.
+
+Запуск:
+    python -m agent.server --port 8080 --concurrency 8 --timeout 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from database.metrics import metrics
+from database.results import dumps
+
+from .knowledge_gate import AgentContext, KnowledgeGateAgent, connection_pool_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_CONCURRENCY = 8
+# Предельное время запроса (секунды), включая ожидание свободного слота
+DEFAULT_TIMEOUT = 10.0
+# Простой соединения keep-alive до закрытия (секунды)
+KEEPALIVE_TIMEOUT = 30.0
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADERS = 100
+
+
+class HttpError(Exception):
+    """Ошибка запроса с HTTP-статусом"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class HttpRequest:
+    """Разобранный HTTP-запрос"""
+    method: str
+    path: str
+    query: Dict[str, str]
+    version: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Dict[str, Any]:
+        """Тело запроса как JSON-объект (пустое тело — пустой объект)"""
+        if not self.body:
+            return {}
+        try:
+            payload = json.loads(self.body)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HttpError(400, f"Некорректный JSON: {e}")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "Тело запроса должно быть JSON-объектом")
+        return payload
+
+
+# ==========================================
+# HTTP/1.1
+# ==========================================
+
+async def read_request(reader: asyncio.StreamReader, max_body: int = MAX_BODY_BYTES) -> Optional[HttpRequest]:
+    """
+    Чтение одного запроса из соединения
+
+    Returns:
+        HttpRequest или None, если клиент закрыл соединение
+    """
+    try:
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if not line:
+        return None
+
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Некорректная строка запроса")
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(400, "Слишком много заголовков")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Некорректный Content-Length")
+    if length > max_body:
+        raise HttpError(413, f"Тело запроса больше {max_body} байт")
+    body = await reader.readexactly(length) if length > 0 else b""
+
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    return HttpRequest(method.upper(), url.path, query, version.upper(), headers, body)
+
+
+def encode_response(
+    status: int,
+    payload: Union[Dict, str],
+    headers: Dict[str, str],
+    keep_alive: bool
+) -> bytes:
+    """Сериализация ответа: словарь — JSON, строка — text/plain"""
+    if isinstance(payload, str):
+        body = payload.encode("utf-8")
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body = dumps(payload)
+        content_type = "application/json; charset=utf-8"
+    lines = [
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def error_payload(error: str, request_id: str) -> Dict:
+    return {"status": "error", "error": error, "request_id": request_id}
+
+
+# ==========================================
+# СЕРВЕР
+# ==========================================
+
+class KnowledgeGateServer:
+    """HTTP/JSON-сервер Knowledge Gate Agent"""
+
+    def __init__(
+        self,
+        agent: KnowledgeGateAgent,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_body: int = MAX_BODY_BYTES,
+    ):
+        """
+        Args:
+            agent: Агент (общий для всех запросов)
+            concurrency: Число одновременно выполняемых вызовов агента
+            timeout: Предельное время запроса в секундах
+            max_body: Максимальный размер тела запроса
+        """
+        self.agent = agent
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_body = max_body
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="kg-request")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._served = 0
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        """Запуск приёма соединений в текущем цикле событий"""
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_id = uuid.uuid4().hex[:12]
+                started = time.perf_counter()
+                try:
+                    request = await read_request(reader, self.max_body)
+                    if request is None:
+                        break
+                    status, payload = await self._dispatch(request, request_id)
+                    keep_alive = request.keep_alive
+                except HttpError as e:
+                    status, payload, keep_alive = e.status, error_payload(e.message, request_id), False
+                except (asyncio.IncompleteReadError, ValueError):
+                    # Обрыв соединения посреди тела или слишком длинная строка
+                    break
+
+                headers = {
+                    "X-Request-Id": request_id,
+                    "X-Duration-Ms": f"{(time.perf_counter() - started) * 1000:.1f}",
+                }
+                writer.write(encode_response(status, payload, headers, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: HttpRequest, request_id: str) -> Tuple[int, Union[Dict, str]]:
+        """Маршрутизация запроса; ошибки клиента — HttpError"""
+        parts = [part for part in request.path.split("/") if part]
+
+        if parts == ["health"]:
+            self._require_method(request, ("GET",))
+            return 200, self._health()
+
+        if parts == ["metrics"]:
+            self._require_method(request, ("GET",))
+            return 200, metrics.prometheus()
+
+        if parts == ["query"]:
+            self._require_method(request, ("POST",))
+            query = request.json().get("query")
+            if not isinstance(query, str) or not query.strip():
+                raise HttpError(400, "Не указан запрос: {\"query\": \"...\"}")
+            return 200, await self._call(lambda: self.agent.process_query(query), request_id)
+
+        if len(parts) == 2 and parts[0] == "ops":
+            self._require_method(request, ("GET", "POST"))
+            operation = parts[1]
+            if operation not in self.agent.TYPED_OPERATIONS:
+                raise HttpError(404, f"Неизвестная операция: {operation}")
+            params = dict(request.query)
+            if request.method == "POST":
+                params.update(request.json())
+            return 200, await self._call(lambda: self.agent.execute_operation(operation, params), request_id)
+
+        raise HttpError(404, f"Маршрут не найден: {request.path}")
+
+    @staticmethod
+    def _require_method(request: HttpRequest, allowed: Tuple[str, ...]):
+        if request.method not in allowed:
+            raise HttpError(405, f"Метод {request.method} не поддерживается")
+
+    def _health(self) -> Dict:
+        info = self.agent.get_agent_info()
+        info.update({
+            "in_flight": self._in_flight,
+            "served": self._served,
+            "concurrency": self.concurrency,
+            "timeout": self.timeout,
+        })
+        return {"status": "success", "operation": "health", "data": info}
+
+    async def _call(self, call: Callable[[], Dict], request_id: str) -> Dict:
+        """
+        Вызов агента в пуле потоков с ограничением параллелизма и таймаутом
+
+        Слот освобождается только после фактического завершения потока:
+        вызов, превысивший таймаут, продолжает держать своё соединение БД,
+        поэтому новые запросы не могут исчерпать пул.
+        """
+        deadline = time.monotonic() + self.timeout
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise HttpError(503, "Сервер перегружен: нет свободных слотов")
+
+        self._in_flight += 1
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._run_in_context, call, request_id
+        )
+        future.add_done_callback(self._release_slot)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise HttpError(504, f"Превышено время запроса ({self.timeout} с)")
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        except Exception as e:
+            logger.exception(f"[server] Запрос {request_id} завершился ошибкой")
+            raise HttpError(500, f"{type(e).__name__}: {e}")
+
+    def _run_in_context(self, call: Callable[[], Dict], request_id: str) -> Dict:
+        with self.agent.request_context(AgentContext(session_id=request_id)):
+            return call()
+
+    def _release_slot(self, future: asyncio.Future):
+        self._in_flight -= 1
+        self._served += 1
+        self._slots.release()
+        if not future.cancelled():
+            # Исключение уже передано клиенту либо запрос отброшен по таймауту
+            future.exception()
+
+
+# ==========================================
+# CLI
+# ==========================================
+
+async def serve(server: KnowledgeGateServer, host: str, port: int):
+    listener = await server.start(host, port)
+    address = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in listener.sockets)
+    print(f"🚀 Knowledge Gate Server: http://{address}")
+    print(f"⚙️  Параллелизм: {server.concurrency}, таймаут: {server.timeout} с")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="HTTP/JSON-сервер Knowledge Gate Agent")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Адрес (по умолчанию {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Порт (по умолчанию {DEFAULT_PORT})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Одновременных вызовов агента (пул соединений БД — с запасом на шину и prefetch)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Предельное время запроса, секунды")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    from database.operations import DatabaseManager
+
+    agent = KnowledgeGateAgent(DatabaseManager(pool_size=connection_pool_size(args.concurrency)))
+    agent.start_index_watcher()
+    server = KnowledgeGateServer(agent, concurrency=args.concurrency, timeout=args.timeout)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Сервер остановлен")
+    finally:
+        agent.stop_index_watcher()
+        server.close()
+        agent.db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
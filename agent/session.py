@@ -2,13 +2,211 @@
 Agent Session Management
 Управление сессиями агента
 """
+from collections import Counter, OrderedDict, deque
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+import logging
+import queue
+import threading
 import uuid
 import json
 from pathlib import Path
 
+from database.results import dumps
+
+if TYPE_CHECKING:
+    from .session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних записей контекст хранит в памяти; остальное выгружается в БД
+HISTORY_LIMIT = 200
+MATERIALS_LIMIT = 500
+
+# Очередь выгрузки: записей в одном пакете, интервал сброса (секунды), предел очереди
+SPILL_BATCH_SIZE = 200
+SPILL_FLUSH_INTERVAL = 2.0
+SPILL_QUEUE_LIMIT = 10000
+
+
+# ==========================================
+# ОГРАНИЧЕННЫЕ КОЛЛЕКЦИИ КОНТЕКСТА
+# ==========================================
+
+class RingBuffer:
+    """Последние maxlen записей; вытесненная запись передаётся в on_evict"""
+
+    def __init__(self, maxlen: int = HISTORY_LIMIT, items: Iterable = ()):
+        self._items: Deque = deque(maxlen=maxlen)
+        self.on_evict: Optional[Callable[[Any], None]] = None
+        self.total = 0
+        for item in items:
+            self.append(item)
+
+    def append(self, item: Any):
+        if len(self._items) == self._items.maxlen and self.on_evict is not None:
+            self.on_evict(self._items[0])
+        self._items.append(item)
+        self.total += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._items)
+
+    def __getitem__(self, index: int) -> Any:
+        return self._items[index]
+
+
+class RecentSet:
+    """Множество с порядком последнего обращения; старейшие элементы вытесняются"""
+
+    def __init__(self, maxlen: int = MATERIALS_LIMIT, items: Iterable[str] = ()):
+        self.maxlen = maxlen
+        self._items: "OrderedDict[str, None]" = OrderedDict()
+        self.on_evict: Optional[Callable[[str], None]] = None
+        self.total = 0
+        for item in items:
+            self.add(item)
+
+    def add(self, item: str):
+        if item in self._items:
+            self._items.move_to_end(item)
+            return
+        self._items[item] = None
+        self.total += 1
+        if len(self._items) > self.maxlen:
+            evicted, _ = self._items.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+
+class OperationCounter(Counter):
+    """Счётчики операций вместо полного списка"""
+
+    def record(self, operation: str):
+        self[operation] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.values())
+
+
+# ==========================================
+# ВЫГРУЗКА В БД
+# ==========================================
+
+class SessionSpill:
+    """
+    Фоновая выгрузка вытесненных записей контекста в agent_operations/agent_sessions
+
+    Запись ставится в ограниченную очередь и пишется пакетами в отдельном
+    потоке, поэтому вызывающий поток не ждёт БД. При переполнении очереди
+    или недоступной БД записи отбрасываются (счётчик dropped): объём памяти
+    процесса важнее полноты архива.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any], agent_id: str = "AGENT-KNOWLEDGE-GATE"):
+        """
+        Args:
+            db_factory: Возвращает DatabaseManager (вызывается в фоновом потоке)
+            agent_id: Агент, от имени которого пишутся записи
+        """
+        self.db_factory = db_factory
+        self.agent_id = agent_id
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=SPILL_QUEUE_LIMIT)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def query(self, session_id: str, record: Dict):
+        """Вытесненная запись истории запросов"""
+        self._put(("operation", {
+            "session_id": session_id,
+            "operation": "query",
+            "params": {"query": record.get("query")},
+            "status": record.get("response_status") or "unknown",
+            "started_at": record.get("timestamp"),
+            "duration_ms": record.get("duration_ms"),
+        }))
+
+    def material(self, session_id: str, started_at: datetime, material_id: str):
+        """Материал, вытесненный из множества открытых"""
+        self._put(("material", (session_id, started_at, material_id)))
+
+    def flush(self, timeout: float = 5.0):
+        """Дождаться записи всего, что уже в очереди"""
+        if self._thread is not None:
+            self._queue.put(("flush", None), timeout=timeout)
+            self._queue.join()
+
+    def _put(self, item):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-spill", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < SPILL_BATCH_SIZE and batch[-1][0] != "flush":
+                    batch.append(self._queue.get(timeout=SPILL_FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List):
+        operations = [payload for kind, payload in batch if kind == "operation"]
+        materials: Dict[str, Dict] = {}
+        for kind, payload in batch:
+            if kind == "material":
+                session_id, started_at, material_id = payload
+                entry = materials.setdefault(session_id, {"started_at": started_at, "materials": []})
+                entry["materials"].append(material_id)
+        if not operations and not materials:
+            return
+        db = None
+        try:
+            db = self.db_factory()
+            if operations:
+                db.log_operations_batch(self.agent_id, operations)
+            for session_id, entry in materials.items():
+                db.append_session_materials(self.agent_id, session_id, entry["started_at"], entry["materials"])
+            self.written += len(operations) + sum(len(e["materials"]) for e in materials.values())
+        except Exception as e:
+            self.dropped += len(operations) + sum(len(e["materials"]) for e in materials.values())
+            logger.warning(f"[session-spill] Выгрузка не удалась: {e}")
+        finally:
+            if db is not None:
+                # В режиме пула соединение не должно навсегда оставаться за фоновым потоком
+                db.release()
+
 
 @dataclass
 class QueryRecord:
@@ -26,6 +224,16 @@ class QueryRecord:
             "duration_ms": self.duration_ms
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QueryRecord":
+        """Восстановление записи (из ответа сохраняется только статус)"""
+        return cls(
+            query=data["query"],
+            response={"status": data.get("response_status")},
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            duration_ms=data.get("duration_ms")
+        )
+
 
 @dataclass
 class AgentSession:
@@ -36,12 +244,12 @@ class AgentSession:
     ended_at: Optional[datetime] = None
 
     # Контекст работы
-    materials_accessed: List[str] = field(default_factory=list)
-    operations_performed: List[str] = field(default_factory=list)
+    materials_accessed: RecentSet = field(default_factory=RecentSet)
+    operations_performed: OperationCounter = field(default_factory=OperationCounter)
     current_focus: Optional[str] = None
 
-    # История запросов
-    query_history: List[QueryRecord] = field(default_factory=list)
+    # История запросов (последние HISTORY_LIMIT)
+    query_history: RingBuffer = field(default_factory=RingBuffer)
 
     # Кэш для быстрого доступа
     cache: Dict[str, Any] = field(default_factory=dict)
@@ -60,13 +268,19 @@ class AgentSession:
 
     def access_material(self, material_id: str):
         """Отметка доступа к материалу"""
-        if material_id not in self.materials_accessed:
-            self.materials_accessed.append(material_id)
+        self.materials_accessed.add(material_id)
         self.current_focus = material_id
 
     def perform_operation(self, operation: str):
         """Отметка выполненной операции"""
-        self.operations_performed.append(operation)
+        self.operations_performed.record(operation)
+
+    def attach_spill(self, spill: SessionSpill):
+        """Выгружать вытесненные записи истории и материалы в БД"""
+        self.query_history.on_evict = lambda record: spill.query(self.session_id, record.to_dict())
+        self.materials_accessed.on_evict = lambda material_id: spill.material(
+            self.session_id, self.started_at, material_id
+        )
 
     def set_cache(self, key: str, value: Any, ttl_seconds: int = 300):
         """Установка значения в кэш"""
@@ -104,9 +318,9 @@ class AgentSession:
             "ended_at": self.ended_at.isoformat() if self.ended_at else None,
             "duration_seconds": self.get_duration(),
             "is_active": self.is_active,
-            "materials_accessed_count": len(self.materials_accessed),
-            "operations_count": len(self.operations_performed),
-            "queries_count": len(self.query_history),
+            "materials_accessed_count": self.materials_accessed.total,
+            "operations_count": self.operations_performed.total,
+            "queries_count": self.query_history.total,
             "current_focus": self.current_focus
         }
 
@@ -118,10 +332,13 @@ class AgentSession:
             "started_at": self.started_at.isoformat(),
             "ended_at": self.ended_at.isoformat() if self.ended_at else None,
             "is_active": self.is_active,
-            "materials_accessed": self.materials_accessed,
-            "operations_performed": self.operations_performed,
+            "materials_accessed": list(self.materials_accessed),
+            "operations_performed": dict(self.operations_performed),
             "current_focus": self.current_focus,
-            "query_history": [q.to_dict() for q in self.query_history]
+            "query_history": [q.to_dict() for q in self.query_history],
+            # Полные счётчики: в памяти хранятся только последние записи
+            "queries_count": self.query_history.total,
+            "materials_accessed_count": self.materials_accessed.total
         }
 
     def save(self, path: Optional[Path] = None):
@@ -130,24 +347,33 @@ class AgentSession:
             path = Path(f"sessions/session_{self.session_id}.json")
 
         path.parent.mkdir(parents=True, exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        with open(path, 'wb') as f:
+            f.write(dumps(self.to_dict(), indent=True))
 
     @classmethod
     def load(cls, path: Path) -> "AgentSession":
         """Загрузка сессии из файла"""
         with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+            return cls.from_dict(json.load(f))
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AgentSession":
+        """Восстановление сессии из to_dict() вместе с историей запросов"""
         session = cls(
             session_id=data["session_id"],
             agent_id=data["agent_id"],
             started_at=datetime.fromisoformat(data["started_at"]),
-            materials_accessed=data["materials_accessed"],
-            operations_performed=data["operations_performed"],
+            materials_accessed=RecentSet(items=data["materials_accessed"]),
+            # Старые файлы хранят список операций, новые — счётчики
+            operations_performed=OperationCounter(data["operations_performed"]),
             current_focus=data.get("current_focus"),
+            query_history=RingBuffer(items=(QueryRecord.from_dict(q) for q in data.get("query_history", []))),
             is_active=data["is_active"]
         )
+        session.query_history.total = max(session.query_history.total, data.get("queries_count", 0))
+        session.materials_accessed.total = max(
+            session.materials_accessed.total, data.get("materials_accessed_count", 0)
+        )
 
         if data.get("ended_at"):
             session.ended_at = datetime.fromisoformat(data["ended_at"])
@@ -158,48 +384,88 @@ class AgentSession:
 class SessionManager:
     """Менеджер сессий агента"""
 
-    def __init__(self, storage_path: Optional[Path] = None):
+    def __init__(
+        self,
+        storage_path: Optional[Path] = None,
+        spill: Optional[SessionSpill] = None,
+        store: Optional["SessionStore"] = None
+    ):
+        """
+        Args:
+            storage_path: Каталог хранилища сессий
+            spill: Выгрузка вытесненной истории в БД (None — вытесненное отбрасывается)
+            store: Хранилище сессий (по умолчанию SQLite в storage_path)
+        """
+        from .session_store import SessionStore
+
         self.storage_path = storage_path or Path("sessions")
+        self.spill = spill
+        self.store = store or SessionStore(self.storage_path / "sessions.sqlite3")
         self.active_sessions: Dict[str, AgentSession] = {}
 
     def create_session(self, agent_id: str = "AGENT-KNOWLEDGE-GATE") -> AgentSession:
         """Создание новой сессии"""
         session = AgentSession(agent_id=agent_id)
+        if self.spill is not None:
+            session.attach_spill(self.spill)
         self.active_sessions[session.session_id] = session
         return session
 
     def get_session(self, session_id: str) -> Optional[AgentSession]:
-        """Получение сессии по ID"""
-        return self.active_sessions.get(session_id)
+        """Получение сессии по ID (активной или из хранилища)"""
+        return self.active_sessions.get(session_id) or self.store.get(session_id)
 
     def end_session(self, session_id: str, save: bool = True) -> Optional[AgentSession]:
-        """Завершение сессии"""
+        """Завершение сессии (запись в хранилище асинхронная)"""
         session = self.active_sessions.pop(session_id, None)
         if session:
             session.end_session()
             if save:
-                session.save(self.storage_path / f"session_{session_id}.json")
+                self.store.save(session)
         return session
 
     def list_active_sessions(self) -> List[Dict]:
         """Список активных сессий"""
         return [s.get_summary() for s in self.active_sessions.values()]
 
+    def find_sessions(
+        self,
+        agent_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[AgentSession]:
+        """Сохранённые сессии по агенту и интервалу времени начала"""
+        return self.store.query(agent_id=agent_id, since=since, until=until, limit=limit)
+
     def cleanup_inactive(self, max_idle_seconds: int = 3600):
         """Очистка неактивных сессий"""
         now = datetime.now()
-        to_remove = []
+        expired = []
 
-        for session_id, session in self.active_sessions.items():
+        for session_id, session in list(self.active_sessions.items()):
             if session.query_history:
                 last_activity = session.query_history[-1].timestamp
             else:
                 last_activity = session.started_at
 
             if (now - last_activity).total_seconds() > max_idle_seconds:
-                to_remove.append(session_id)
-
-        for session_id in to_remove:
-            self.end_session(session_id, save=True)
-
-        return len(to_remove)
+                session.end_session()
+                expired.append(self.active_sessions.pop(session_id))
+
+        # Одна очередь записи вместо сохранения по одной сессии
+        self.store.save_many(expired)
+        return len(expired)
+
+    def close(self, save_active: bool = True):
+        """
+        Завершение работы: запись сессий и ожидание очередей записи
+
+        Args:
+            save_active: Сохранить и незавершённые сессии (как есть, активными)
+        """
+        if save_active and self.active_sessions:
+            self.store.save_many(list(self.active_sessions.values()))
+        if self.spill is not None:
+            self.spill.flush()
+        self.store.close()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Session Store
+Хранилище сессий агента во встроенном SQLite
+
+Одна таблица вместо отдельного JSON-файла на сессию: запись идёт пакетами
+из фонового потока (одна транзакция на пакет), сессия хранится целиком
+компактным JSON вместе с историей запросов, а agent_id и время начала
+вынесены в индексируемые колонки для выборок по агенту и интервалу.
+Журнал WAL позволяет читать во время записи; сжатие файла (контрольная
+точка WAL и инкрементальный VACUUM) выполняется тем же потоком в простое.
+
+Запуск (перенос файлов session_*.json и сводка):
+    python -m agent.session_store --import sessions/
+    python -m agent.session_store --agent AGENT-KNOWLEDGE-GATE --since 2026-01-01
+"""
+import argparse
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+from database.results import dumps_text
+
+from .session import AgentSession
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = Path("sessions") / "sessions.sqlite3"
+
+# Сессий в одной транзакции, ожидание добора пакета (секунды)
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_INTERVAL = 0.5
+# Сжатие файла не чаще раза в интервал (секунды) и только в простое
+COMPACT_INTERVAL = 300.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    agent_id   TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    ended_at   TEXT,
+    is_active  INTEGER NOT NULL,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_agent_started ON sessions(agent_id, started_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started_at);
+"""
+
+UPSERT = """
+INSERT INTO sessions (session_id, agent_id, started_at, ended_at, is_active, data)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(session_id) DO UPDATE SET
+    agent_id = excluded.agent_id,
+    started_at = excluded.started_at,
+    ended_at = excluded.ended_at,
+    is_active = excluded.is_active,
+    data = excluded.data
+"""
+
+Timestamp = Union[datetime, str]
+
+
+def _row(session: AgentSession) -> tuple:
+    """Снимок сессии для записи (делается в вызывающем потоке)"""
+    data = session.to_dict()
+    return (
+        data["session_id"],
+        data["agent_id"],
+        data["started_at"],
+        data["ended_at"],
+        int(data["is_active"]),
+        dumps_text(data),
+    )
+
+
+def _iso(value: Optional[Timestamp]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class SessionStore:
+    """Пакетное хранилище сессий в SQLite"""
+
+    def __init__(self, path: Path = DEFAULT_STORE_PATH, compact_interval: float = COMPACT_INTERVAL):
+        """
+        Args:
+            path: Файл базы SQLite
+            compact_interval: Минимальный интервал между сжатиями файла (секунды)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compact_interval = compact_interval
+        self.written = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+        # Поток записи — демон: очередь дописывается при выходе интерпретатора
+        atexit.register(self.flush)
+
+        with closing(self._connect()) as conn:
+            # auto_vacuum действует только на новой базе, до создания таблиц
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Соединение для чтения, своё у каждого потока"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ==========================================
+    # ЗАПИСЬ
+    # ==========================================
+
+    def save(self, session: AgentSession):
+        """Поставить сессию в очередь записи"""
+        self._ensure_writer()
+        self._queue.put(_row(session))
+
+    def save_many(self, sessions: Iterable[AgentSession]):
+        """Поставить в очередь несколько сессий (будут записаны общими транзакциями)"""
+        self._ensure_writer()
+        for session in sessions:
+            self._queue.put(_row(session))
+
+    def flush(self):
+        """Дождаться записи всех поставленных в очередь сессий"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._queue.join()
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="session-store", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_compact = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.compact_interval)
+            except queue.Empty:
+                # Простой: сжатие файла, пока нет записей
+                if time.monotonic() - last_compact >= self.compact_interval:
+                    self._compact(conn)
+                    last_compact = time.monotonic()
+                continue
+
+            batch = [item]
+            try:
+                while len(batch) < WRITE_BATCH_SIZE and batch[-1] is not None:
+                    batch.append(self._queue.get(timeout=WRITE_FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+
+            rows = [row for row in batch if row is not None]
+            try:
+                if rows:
+                    with conn:
+                        conn.executemany(UPSERT, rows)
+                    self.written += len(rows)
+            except sqlite3.Error as e:
+                logger.error(f"[session-store] Запись {len(rows)} сессий не удалась: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def compact(self):
+        """Сжатие файла базы (выполняется и автоматически в простое)"""
+        self.flush()
+        with closing(self._connect()) as conn:
+            self._compact(conn)
+
+    @staticmethod
+    def _compact(conn: sqlite3.Connection):
+        try:
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            logger.warning(f"[session-store] Сжатие не удалось: {e}")
+
+    def delete_before(self, ended_before: Timestamp) -> int:
+        """Удаление завершённых сессий, закончившихся раньше указанного времени"""
+        self.flush()
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE is_active = 0 AND ended_at < ?", (_iso(ended_before),)
+            )
+            return cursor.rowcount
+
+    # ==========================================
+    # ЧТЕНИЕ
+    # ==========================================
+
+    def get(self, session_id: str) -> Optional[AgentSession]:
+        """Сессия по ID (с историей запросов)"""
+        row = self._reader().execute(
+            "SELECT data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return AgentSession.from_dict(json.loads(row[0])) if row else None
+
+    def query(
+        self,
+        agent_id: Optional[str] = None,
+        since: Optional[Timestamp] = None,
+        until: Optional[Timestamp] = None,
+        active: Optional[bool] = None,
+        limit: Optional[int] = None,
+    ) -> List[AgentSession]:
+        """
+        Сессии по агенту и интервалу времени начала
+
+        Args:
+            agent_id: ID агента
+            since: Начало не раньше
+            until: Начало раньше
+            active: Только активные / только завершённые
+            limit: Максимум сессий (новые первыми)
+        """
+        sql, params = self._filter(agent_id, since, until, active)
+        sql = f"SELECT data FROM sessions{sql} ORDER BY started_at DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [AgentSession.from_dict(json.loads(data)) for (data,) in self._reader().execute(sql, params)]
+
+    def count(
+        self,
+        agent_id: Optional[str] = None,
+        since: Optional[Timestamp] = None,
+        until: Optional[Timestamp] = None,
+        active: Optional[bool] = None,
+    ) -> int:
+        sql, params = self._filter(agent_id, since, until, active)
+        return self._reader().execute(f"SELECT COUNT(*) FROM sessions{sql}", params).fetchone()[0]
+
+    @staticmethod
+    def _filter(agent_id, since, until, active):
+        clauses, params = [], []
+        if agent_id is not None:
+            clauses.append("agent_id = ?")
+            params.append(agent_id)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(_iso(since))
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(_iso(until))
+        if active is not None:
+            clauses.append("is_active = ?")
+            params.append(int(active))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    # ==========================================
+    # ПЕРЕНОС ФАЙЛОВ
+    # ==========================================
+
+    def import_files(self, directory: Path) -> int:
+        """Перенос файлов session_*.json (AgentSession.save) в хранилище"""
+        sessions = []
+        for path in sorted(Path(directory).glob("session_*.json")):
+            try:
+                sessions.append(AgentSession.load(path))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"[session-store] Пропущен {path.name}: {e}")
+        self.save_many(sessions)
+        self.flush()
+        return len(sessions)
+
+    def close(self):
+        """Дописать очередь и закрыть соединение чтения"""
+        self.flush()
+        atexit.unregister(self.flush)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Хранилище сессий Knowledge Gate Agent")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_PATH, help="Файл SQLite")
+    parser.add_argument("--import", dest="import_dir", type=Path, metavar="DIR",
+                        help="Перенести файлы session_*.json из каталога")
+    parser.add_argument("--agent", help="Фильтр по агенту")
+    parser.add_argument("--since", help="Начало не раньше (ISO)")
+    parser.add_argument("--until", help="Начало раньше (ISO)")
+    parser.add_argument("--limit", type=int, default=20, help="Сколько сессий показать")
+    parser.add_argument("--compact", action="store_true", help="Сжать файл базы")
+    args = parser.parse_args(argv)
+
+    store = SessionStore(args.store)
+    try:
+        if args.import_dir:
+            print(f"📥 Перенесено сессий: {store.import_files(args.import_dir)}")
+        if args.compact:
+            store.compact()
+            print("🗜️  Файл базы сжат")
+
+        total = store.count(args.agent, args.since, args.until)
+        print(f"📚 Сессий: {total}")
+        for session in store.query(args.agent, args.since, args.until, limit=args.limit):
+            summary = session.get_summary()
+            print(f"   • {summary['session_id'][:8]} {summary['agent_id']} {summary['started_at']} "
+                  f"запросов: {summary['queries_count']}")
+    finally:
+        # Очередь записи дописывается и при ошибке
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+"""
+Knowledge Snapshot
+Компактный бинарный снимок корпуса для быстрого старта агента
+
+Сборка объединяет Gold Index, рёбра графа, карты ID, членство в слоях и
+категориях и карты ключевых слов в один версионированный файл:
+- строки интернированы в общую таблицу и адресуются номером (uint32)
+- карты и рёбра хранятся как массивы uint32 / float64
+- файл открывается через mmap, поэтому страницы разделяются процессами
+
+Если снимок отсутствует или устарел (изменились исходные файлы),
+агент использует JSON.
+
+Сборка:
+    python -m agent.snapshot
+"""
+import argparse
+import json
+import logging
+import math
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .graph_index import DEFAULT_GRAPH_PATH, EdgeIndex, GraphEdge, node_aliases_from_gold
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_GOLD_INDEX_PATH = PROJECT_ROOT / "data" / "gold" / "gold_index.json"
+DEFAULT_SNAPSHOT_PATH = PROJECT_ROOT / "data" / "index" / "knowledge.snap"
+
+MAGIC = b"PDTWSNAP"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<8sII")
+_SECTION = struct.Struct("<16sQQ")
+_ALIGN = 8
+
+# Карты Gold Index, хранимые как таблицы строк
+SCALAR_MAPS = ("id_to_path",)
+LIST_MAPS = (
+    "category_members",
+    "layer_members",
+    "source_to_node_quick",
+    "node_to_source_quick",
+    "search_keywords",
+)
+_KIND_SCALAR = 0
+_KIND_LIST = 1
+
+# Столбцы таблицы рёбер (номера строк)
+EDGE_COLUMNS = ("edge_id", "source", "target", "relationship", "strength", "description")
+
+
+class SnapshotError(Exception):
+    """Снимок повреждён или несовместим"""
+
+
+# ==========================================
+# СБОРКА
+# ==========================================
+
+class _StringTable:
+    """Таблица интернированных строк"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+
+    def intern(self, value: str) -> int:
+        sid = self._ids.get(value)
+        if sid is None:
+            sid = len(self._strings)
+            self._ids[value] = sid
+            self._strings.append(value)
+        return sid
+
+    def encode(self) -> bytes:
+        blobs = [s.encode("utf-8") for s in self._strings]
+        offsets = array("I", [len(blobs)])
+        position = 0
+        offsets.append(position)
+        for blob in blobs:
+            position += len(blob)
+            offsets.append(position)
+        return offsets.tobytes() + b"".join(blobs)
+
+
+def _source_stamp(path: Path) -> Dict:
+    """Отметка исходного файла для проверки актуальности снимка"""
+    path = path.resolve()
+    stat = path.stat()
+    try:
+        stored = str(path.relative_to(PROJECT_ROOT.resolve()))
+    except ValueError:
+        stored = str(path)
+    return {
+        "path": stored,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
+
+def build_snapshot(
+    output_path: Optional[Path] = None,
+    gold_index_path: Optional[Path] = None,
+    graph_path: Optional[Path] = None
+) -> Path:
+    """
+    Сборка бинарного снимка
+
+    Args:
+        output_path: Файл снимка
+        gold_index_path: Путь к gold_index.json
+        graph_path: Путь к JSON Knowledge Graph (по умолчанию из Gold Index)
+    """
+    output_path = Path(output_path or DEFAULT_SNAPSHOT_PATH)
+    gold_index_path = Path(gold_index_path or DEFAULT_GOLD_INDEX_PATH)
+
+    with open(gold_index_path, "r", encoding="utf-8") as f:
+        gold_index = json.load(f)
+
+    if graph_path is None:
+        relative = gold_index.get("id_to_path", {}).get("GRAPH-V14")
+        graph_path = PROJECT_ROOT / relative if relative else DEFAULT_GRAPH_PATH
+    graph_path = Path(graph_path)
+    with open(graph_path, "r", encoding="utf-8") as f:
+        graph = json.load(f)
+
+    strings = _StringTable()
+
+    # Карты Gold Index
+    maps = array("I", [len(SCALAR_MAPS) + len(LIST_MAPS)])
+    for name in SCALAR_MAPS:
+        mapping = gold_index.get(name, {})
+        maps.extend([strings.intern(name), _KIND_SCALAR, len(mapping), len(mapping)])
+        maps.extend(strings.intern(k) for k in mapping)
+        maps.extend(strings.intern(v) for v in mapping.values())
+    for name in LIST_MAPS:
+        mapping = gold_index.get(name, {})
+        total = sum(len(v) for v in mapping.values())
+        maps.extend([strings.intern(name), _KIND_LIST, len(mapping), total])
+        maps.extend(strings.intern(k) for k in mapping)
+        position = 0
+        maps.append(position)
+        for values in mapping.values():
+            position += len(values)
+            maps.append(position)
+        for values in mapping.values():
+            maps.extend(strings.intern(v) for v in values)
+
+    # Рёбра графа (ID узлов согласованы с Gold Index)
+    index = EdgeIndex.from_graph(graph, aliases=node_aliases_from_gold(graph, gold_index))
+    edges = array("I", [len(index.edges)])
+    for column in EDGE_COLUMNS:
+        edges.extend(strings.intern(getattr(e, column)) for e in index.edges)
+    weights = array("d", (e.weight if e.weight is not None else math.nan for e in index.edges))
+
+    # Остальные поля Gold Index — как JSON
+    stored = set(SCALAR_MAPS) | set(LIST_MAPS)
+    gold_meta = {k: v for k, v in gold_index.items() if k not in stored}
+    info = {
+        "format_version": FORMAT_VERSION,
+        "built_at": datetime.now().isoformat(),
+        "graph_version": index.version,
+        "graph_fingerprint": index.fingerprint,
+        "gold_keys": list(gold_index.keys()),
+        "sources": [_source_stamp(gold_index_path), _source_stamp(graph_path)]
+    }
+
+    sections = [
+        ("info", json.dumps(info, ensure_ascii=False).encode("utf-8")),
+        ("strings", strings.encode()),
+        ("gold_maps", maps.tobytes()),
+        ("gold_meta", json.dumps(gold_meta, ensure_ascii=False).encode("utf-8")),
+        ("edges", edges.tobytes()),
+        ("edge_weights", weights.tobytes()),
+    ]
+
+    header_size = _HEADER.size + _SECTION.size * len(sections)
+    offset = _aligned(header_size)
+    table = []
+    for name, payload in sections:
+        table.append((name, offset, len(payload)))
+        offset = _aligned(offset + len(payload))
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        for name, section_offset, length in table:
+            f.write(_SECTION.pack(name.encode("ascii"), section_offset, length))
+        for (name, payload), (_, section_offset, _) in zip(sections, table):
+            f.write(b"\0" * (section_offset - f.tell()))
+            f.write(payload)
+    tmp_path.replace(output_path)
+
+    logger.info(f"Снимок собран: {output_path} ({output_path.stat().st_size} байт)")
+    return output_path
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+# ==========================================
+# ЧТЕНИЕ
+# ==========================================
+
+class KnowledgeSnapshot:
+    """Снимок, открытый через mmap"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            self._sections = self._read_section_table()
+        except Exception:
+            self._file.close()
+            raise
+
+        self.info: Dict = json.loads(bytes(self._section("info")))
+        strings = self._section("strings")
+        count = strings[:4].cast("I")[0]
+        self._string_offsets = strings[4:4 * (count + 2)].cast("I")
+        self._string_blob = strings[4 * (count + 2):]
+        self._string_cache: Dict[int, str] = {}
+        self._maps_layout: Optional[Dict[str, Tuple[int, int, int, int]]] = None
+
+    def _read_section_table(self) -> Dict[str, Tuple[int, int]]:
+        if len(self._view) < _HEADER.size:
+            raise SnapshotError("Файл снимка слишком мал")
+        magic, version, count = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise SnapshotError("Неверная сигнатура снимка")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"Неподдерживаемая версия снимка: {version}")
+        sections = {}
+        for i in range(count):
+            name, offset, length = _SECTION.unpack_from(self._view, _HEADER.size + i * _SECTION.size)
+            sections[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+        return sections
+
+    def _section(self, name: str) -> memoryview:
+        offset, length = self._sections[name]
+        return self._view[offset:offset + length]
+
+    @classmethod
+    def open_if_fresh(cls, path: Optional[Path] = None) -> Optional["KnowledgeSnapshot"]:
+        """Открытие снимка, если он существует и исходные файлы не менялись"""
+        path = Path(path or DEFAULT_SNAPSHOT_PATH)
+        if not path.exists():
+            return None
+        try:
+            snapshot = cls(path)
+        except (OSError, SnapshotError, ValueError, KeyError) as e:
+            logger.warning(f"Снимок {path} не читается: {e}")
+            return None
+        if not snapshot.is_fresh():
+            logger.info(f"Снимок {path} устарел — используется JSON")
+            snapshot.close()
+            return None
+        return snapshot
+
+    def is_fresh(self) -> bool:
+        """Проверка исходных файлов по размеру и mtime"""
+        for source in self.info.get("sources", []):
+            source_path = Path(source["path"])
+            if not source_path.is_absolute():
+                source_path = PROJECT_ROOT / source_path
+            try:
+                stat = source_path.stat()
+            except OSError:
+                return False
+            if stat.st_size != source["size"] or stat.st_mtime_ns != source["mtime_ns"]:
+                return False
+        return True
+
+    def string(self, sid: int) -> str:
+        value = self._string_cache.get(sid)
+        if value is None:
+            start, end = self._string_offsets[sid], self._string_offsets[sid + 1]
+            value = str(self._string_blob[start:end], "utf-8")
+            self._string_cache[sid] = value
+        return value
+
+    # ==========================================
+    # КАРТЫ GOLD INDEX
+    # ==========================================
+
+    def _maps(self) -> Dict[str, Tuple[int, int, int, int]]:
+        """Разметка таблиц карт: имя → (kind, позиция данных, n_keys, n_values)"""
+        if self._maps_layout is None:
+            words = self._section("gold_maps").cast("I")
+            layout = {}
+            position = 1
+            for _ in range(words[0]):
+                name_sid, kind, n_keys, n_values = words[position:position + 4]
+                layout[self.string(name_sid)] = (kind, position + 4, n_keys, n_values)
+                position += 4 + n_keys + n_values + (n_keys + 1 if kind == _KIND_LIST else 0)
+            self._maps_layout = layout
+            self._map_words = words
+        return self._maps_layout
+
+    def read_map(self, name: str) -> Dict[str, Any]:
+        """Декодирование карты Gold Index в dict"""
+        kind, start, n_keys, n_values = self._maps()[name]
+        words = self._map_words
+        keys = [self.string(sid) for sid in words[start:start + n_keys]]
+        if kind == _KIND_SCALAR:
+            values = words[start + n_keys:start + n_keys + n_values]
+            return {k: self.string(v) for k, v in zip(keys, values)}
+
+        offsets = words[start + n_keys:start + 2 * n_keys + 1]
+        values = words[start + 2 * n_keys + 1:start + 2 * n_keys + 1 + n_values]
+        return {
+            key: [self.string(sid) for sid in values[offsets[i]:offsets[i + 1]]]
+            for i, key in enumerate(keys)
+        }
+
+    def gold_index(self) -> "SnapshotGoldIndex":
+        return SnapshotGoldIndex(self)
+
+    # ==========================================
+    # РЁБРА
+    # ==========================================
+
+    def edge_index(self) -> EdgeIndex:
+        """Индекс рёбер без повторного парсинга JSON графа"""
+        words = self._section("edges").cast("I")
+        count = words[0]
+        columns = {
+            column: words[1 + i * count:1 + (i + 1) * count]
+            for i, column in enumerate(EDGE_COLUMNS)
+        }
+        weights = self._section("edge_weights").cast("d")
+        edges = [
+            GraphEdge(
+                edge_id=self.string(columns["edge_id"][i]),
+                source=self.string(columns["source"][i]),
+                target=self.string(columns["target"][i]),
+                relationship=self.string(columns["relationship"][i]),
+                strength=self.string(columns["strength"][i]),
+                description=self.string(columns["description"][i]),
+                weight=None if math.isnan(weights[i]) else weights[i]
+            )
+            for i in range(count)
+        ]
+        return EdgeIndex(edges, version=self.info.get("graph_version"))
+
+    def close(self):
+        if self._mmap is None:
+            return
+        # memoryview-срезы должны быть освобождены до закрытия mmap
+        self._string_offsets.release()
+        self._string_blob.release()
+        if self._maps_layout is not None:
+            self._map_words.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+
+
+class SnapshotGoldIndex(Mapping):
+    """Read-only представление Gold Index из снимка (секции декодируются по запросу)"""
+
+    def __init__(self, snapshot: KnowledgeSnapshot):
+        self._snapshot = snapshot
+        self._keys = snapshot.info.get("gold_keys", [])
+        self._decoded: Dict[str, Any] = {}
+        self._meta: Optional[Dict] = None
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._decoded:
+            return self._decoded[key]
+        if key in SCALAR_MAPS or key in LIST_MAPS:
+            value = self._snapshot.read_map(key)
+        else:
+            if self._meta is None:
+                self._meta = json.loads(bytes(self._snapshot._section("gold_meta")))
+            value = self._meta[key]
+        self._decoded[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def main():
+    """Сборка снимка из командной строки"""
+    parser = argparse.ArgumentParser(description="Сборка бинарного снимка Knowledge Gate")
+    parser.add_argument("--output", type=Path, default=DEFAULT_SNAPSHOT_PATH, help="Файл снимка")
+    parser.add_argument("--gold-index", type=Path, default=DEFAULT_GOLD_INDEX_PATH, help="gold_index.json")
+    parser.add_argument("--graph", type=Path, default=None, help="JSON Knowledge Graph")
+    args = parser.parse_args()
+
+    try:
+        path = build_snapshot(args.output, args.gold_index, args.graph)
+    except Exception as e:
+        print(f"❌ Ошибка сборки снимка: {e}")
+        sys.exit(1)
+
+    snapshot = KnowledgeSnapshot(path)
+    print(f"✅ Снимок собран: {path}")
+    print(f"   • Размер: {path.stat().st_size / 1024:.1f} KB")
+    print(f"   • Граф: {snapshot.info.get('graph_version')} ({snapshot.info.get('graph_fingerprint')})")
+    snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
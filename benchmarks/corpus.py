@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Synthetic Corpus Generator
+Синтетический корпус Portal_DTwins заданного масштаба
+
+ID соответствуют конвенции схемы: узлы NODE-SYN<буквы> (analytical_nodes
+допускает только буквы), первоисточники SRC-SYN-NNNNNN. Распределения
+снимаются с реального корпуса: доли слоёв — из gold_index.layer_members,
+сила и типы связей и переходы между слоями — из рёбер Knowledge Graph v14.
+Степени узлов распределены по закону Ципфа (немногие узлы-хабы, как
+NODE-CONTEXT в реальном графе).
+
+Корпус загружается в отдельную базу (по умолчанию portal_dtwins_bench)
+через COPY; триггер куба связности на время загрузки отключается, куб
+пересчитывается одним запросом.
+
+Использование:
+    python benchmarks/corpus.py --materials 100000 --edges 1000000
+    python benchmarks/corpus.py --materials 10000 --edges 50000 --database bench_small --reset
+"""
+import argparse
+import bisect
+import io
+import itertools
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from database.config import DatabaseConfig
+
+GOLD_INDEX_PATH = PROJECT_ROOT / "data" / "gold" / "gold_index.json"
+GRAPH_PATH = PROJECT_ROOT / "data" / "graph" / "psb_knowledge_graph_integration_v14.json"
+
+DEFAULT_DATABASE = "portal_dtwins_bench"
+LAYERS = ("L1-Strategic", "L2-Operational", "L3-Technical")
+
+# Тип ребра схемы (edge_type) по отношению онтологии
+EDGE_TYPE_RULES = (
+    ("derives", "derives_from"),
+    ("grounds", "derives_from"),
+    ("justifies", "derives_from"),
+    ("fund", "funds"),
+    ("financ", "funds"),
+    ("invest", "funds"),
+    ("resources", "funds"),
+    ("enabl", "enables"),
+    ("provides", "enables"),
+    ("implement", "implements"),
+    ("operationaliz", "implements"),
+    ("concretiz", "implements"),
+    ("realiz", "implements"),
+    ("formaliz", "implements"),
+    ("regulat", "regulates"),
+    ("legitim", "regulates"),
+    ("mandates", "regulates"),
+    ("complian", "regulates"),
+    ("aligns", "regulates"),
+    ("requir", "depends_on"),
+    ("leverag", "depends_on"),
+    ("extend", "part_of"),
+    ("structures", "part_of"),
+    ("maps", "part_of"),
+    ("valid", "references"),
+    ("defines", "references"),
+    ("establish", "references"),
+    ("contextualiz", "references"),
+    ("identif", "references"),
+    ("benchmark", "references"),
+    ("quantif", "references"),
+)
+
+# Словарь текстов для полнотекстового поиска
+VOCABULARY = (
+    "цифровой двойник платформа суверенитет экосистема финансирование акционер "
+    "регулирование инфраструктура технология промышленность банк стратегия "
+    "моделирование испытание сертификация инжиниринг программа центр компетенций "
+    "производство интеграция данные аналитика вычисления инновации партнёрство"
+).split()
+
+COPY_CHUNK_ROWS = 50000
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    """Параметры корпуса"""
+    materials: int = 100_000
+    edges: int = 1_000_000
+    # Доля узлов среди материалов (остальное — первоисточники)
+    node_share: float = 0.5
+    # Материалов с embedding (vector(1536) — дорогие строки)
+    embeddings: int = 2000
+    backlinks_per_edge: float = 0.25
+    seed: int = 42
+
+    @property
+    def nodes(self) -> int:
+        return max(2, int(self.materials * self.node_share))
+
+    @property
+    def sources(self) -> int:
+        return max(1, self.materials - self.nodes)
+
+
+@dataclass
+class CorpusProfile:
+    """Распределения, снятые с реального корпуса"""
+    layer_weights: Dict[str, float]
+    strength_weights: Dict[str, float]
+    relationship_weights: Dict[str, float]
+    # (слой источника, слой цели) → доля рёбер
+    layer_transitions: Dict[Tuple[str, str], float]
+
+
+def load_profile(gold_path: Path = GOLD_INDEX_PATH, graph_path: Path = GRAPH_PATH) -> CorpusProfile:
+    """Распределения реального корпуса (Gold Index + Knowledge Graph)"""
+    with open(gold_path, "r", encoding="utf-8") as f:
+        gold = json.load(f)
+    with open(graph_path, "r", encoding="utf-8") as f:
+        edges = json.load(f)["graph_edges"]["all_edges"]
+
+    node_layer = {
+        node: layer for layer, members in gold["layer_members"].items() for node in members
+    }
+    layers = Counter({layer: len(members) for layer, members in gold["layer_members"].items()})
+    strengths = Counter(edge.get("strength") or "MEDIUM" for edge in edges)
+    relationships = Counter(edge.get("relationship") or "references" for edge in edges)
+    transitions = Counter(
+        (node_layer[edge["from"]], node_layer[edge["to"]])
+        for edge in edges
+        if edge.get("from") in node_layer and edge.get("to") in node_layer
+    )
+    return CorpusProfile(
+        layer_weights=_normalize(layers),
+        strength_weights=_normalize(strengths),
+        relationship_weights=_normalize(relationships),
+        layer_transitions=_normalize(transitions),
+    )
+
+
+def _normalize(counter: Counter) -> Dict:
+    total = sum(counter.values()) or 1
+    return {key: count / total for key, count in counter.items()}
+
+
+def edge_type_for(relationship: str) -> str:
+    for fragment, edge_type in EDGE_TYPE_RULES:
+        if fragment in relationship:
+            return edge_type
+    return "influences"
+
+
+def node_id(index: int) -> str:
+    """NODE-SYN + индекс буквами (CHECK node_id ~ '^NODE-[A-Z]+$')"""
+    letters = []
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters.append(chr(ord("A") + remainder))
+    return "NODE-SYN" + "".join(reversed(letters))
+
+
+def source_id(index: int) -> str:
+    return f"SRC-SYN-{index + 1:06d}"
+
+
+class _WeightedPicker:
+    """Выбор по кумулятивным весам за O(log n)"""
+
+    def __init__(self, items: Sequence, weights: Sequence[float]):
+        self.items = list(items)
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1]
+
+    def pick(self, rng: random.Random):
+        return self.items[bisect.bisect_right(self.cumulative, rng.random() * self.total)]
+
+
+# ==========================================
+# ГЕНЕРАЦИЯ
+# ==========================================
+
+class SyntheticCorpus:
+    """Детерминированный генератор строк таблиц корпуса"""
+
+    def __init__(self, spec: CorpusSpec, profile: Optional[CorpusProfile] = None):
+        self.spec = spec
+        self.profile = profile or load_profile()
+        rng = random.Random(spec.seed)
+
+        layer_picker = _WeightedPicker(list(self.profile.layer_weights), list(self.profile.layer_weights.values()))
+        self.node_layers = [layer_picker.pick(rng) for _ in range(spec.nodes)]
+        self.node_uuids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(spec.nodes)]
+        self.source_uuids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(spec.sources)]
+
+        # Узлы каждого слоя с весами Ципфа: ранг в слое → вес 1/ранг
+        self.by_layer: Dict[str, _WeightedPicker] = {}
+        for layer in LAYERS:
+            members = [i for i, node_layer in enumerate(self.node_layers) if node_layer == layer]
+            if members:
+                self.by_layer[layer] = _WeightedPicker(members, [1 / rank for rank in range(1, len(members) + 1)])
+
+        transitions = {
+            pair: weight for pair, weight in self.profile.layer_transitions.items()
+            if pair[0] in self.by_layer and pair[1] in self.by_layer
+        }
+        self.transitions = _WeightedPicker(list(transitions), list(transitions.values()))
+        self.strengths = _WeightedPicker(list(self.profile.strength_weights), list(self.profile.strength_weights.values()))
+        self.relationships = _WeightedPicker(
+            list(self.profile.relationship_weights), list(self.profile.relationship_weights.values())
+        )
+        self.outgoing = [0] * spec.nodes
+        self.incoming = [0] * spec.nodes
+        self._edges: Optional[List[Tuple[int, int, str, str, str, float]]] = None
+
+    def edges(self) -> List[Tuple[int, int, str, str, str, float]]:
+        """(источник, цель, edge_type, relationship, strength, weight) без дубликатов"""
+        if self._edges is not None:
+            return self._edges
+        rng = random.Random(self.spec.seed + 1)
+        seen = set()
+        edges = []
+        attempts = 0
+        limit = self.spec.edges * 20
+        while len(edges) < self.spec.edges and attempts < limit:
+            attempts += 1
+            source_layer, target_layer = self.transitions.pick(rng)
+            source = self.by_layer[source_layer].pick(rng)
+            target = self.by_layer[target_layer].pick(rng)
+            if source == target:
+                continue
+            relationship = self.relationships.pick(rng)
+            edge_type = edge_type_for(relationship)
+            key = (source, target, edge_type)
+            if key in seen:
+                continue
+            seen.add(key)
+            strength = self.strengths.pick(rng)
+            edges.append((source, target, edge_type, relationship, strength, round(rng.uniform(0.3, 1.0), 4)))
+            self.outgoing[source] += 1
+            self.incoming[target] += 1
+        self._edges = edges
+        return edges
+
+    def material_rows(self) -> Iterator[tuple]:
+        self.edges()  # степени узлов
+        rng = random.Random(self.spec.seed + 2)
+        for i, material_uuid in enumerate(self.node_uuids):
+            material_id = node_id(i)
+            words = rng.sample(VOCABULARY, 3)
+            yield (
+                material_uuid, material_id, f"{material_id.lower()}_analysis.json",
+                f"Узел {' '.join(words)}", "ANALYTICAL_NODES", "production", self.node_layers[i],
+                f"data/nodes/{material_id.lower()}_analysis.json", rng.randint(20_000, 120_000),
+                json.dumps({"backlinks_count": self.incoming[i], "synthetic": True}),
+                "{" + ",".join(words) + "}",
+            )
+        for i, material_uuid in enumerate(self.source_uuids):
+            material_id = source_id(i)
+            words = rng.sample(VOCABULARY, 3)
+            yield (
+                material_uuid, material_id, f"{material_id}.docx",
+                f"Документ {' '.join(words)}", "RAW_SOURCES", "immutable", None,
+                f"SOURCE_DOCUMENTS/{material_id}.docx", rng.randint(50_000, 2_000_000),
+                json.dumps({"synthetic": True}), "{" + ",".join(words) + "}",
+            )
+
+    def node_rows(self) -> Iterator[tuple]:
+        self.edges()
+        sources = self._node_sources()
+        for i, material_uuid in enumerate(self.node_uuids):
+            yield (
+                material_uuid, node_id(i), self.node_layers[i], self.incoming[i], self.outgoing[i],
+                "{" + ",".join(source_id(s) for s in sources[i]) + "}",
+            )
+
+    def mapping_rows(self) -> Iterator[tuple]:
+        for i, node_sources in enumerate(self._node_sources()):
+            for rank, s in enumerate(node_sources):
+                yield (self.source_uuids[s], self.node_uuids[i], "primary" if rank == 0 else "secondary")
+
+    def _node_sources(self) -> List[List[int]]:
+        """1–3 первоисточника на узел (первоисточники переиспользуются по кругу)"""
+        rng = random.Random(self.spec.seed + 3)
+        result = []
+        for i in range(self.spec.nodes):
+            count = rng.randint(1, 3)
+            result.append(sorted({(i * 3 + k) % self.spec.sources for k in range(count)}))
+        return result
+
+    def edge_rows(self) -> Iterator[tuple]:
+        for source, target, edge_type, relationship, strength, weight in self.edges():
+            yield (
+                self.node_uuids[source], self.node_uuids[target], edge_type, weight,
+                json.dumps({"relationship": relationship, "strength": strength}),
+            )
+
+    def backlink_rows(self) -> Iterator[tuple]:
+        rng = random.Random(self.spec.seed + 4)
+        seen = set()
+        for source, target, *_ in self.edges():
+            if rng.random() >= self.spec.backlinks_per_edge or (target, source) in seen:
+                continue
+            seen.add((target, source))
+            yield (self.node_uuids[target], self.node_uuids[source], "concept")
+
+    def search_rows(self) -> Iterator[tuple]:
+        rng = random.Random(self.spec.seed + 5)
+        for material_uuid, layer in itertools.chain(
+            zip(self.node_uuids, self.node_layers), ((u, None) for u in self.source_uuids)
+        ):
+            category = "ANALYTICAL_NODES" if layer else "RAW_SOURCES"
+            yield (material_uuid, " ".join(rng.choices(VOCABULARY, k=40)), category, layer)
+
+    def embedding_rows(self) -> Iterator[tuple]:
+        rng = random.Random(self.spec.seed + 6)
+        for material_uuid in self.node_uuids[: self.spec.embeddings]:
+            vector = ",".join(f"{rng.gauss(0, 1):.4f}" for _ in range(1536))
+            yield (material_uuid, f"[{vector}]")
+
+
+# ==========================================
+# ЗАГРУЗКА
+# ==========================================
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    text = str(value)
+    if any(ch in text for ch in ',"\n{'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    """COPY строк порциями по COPY_CHUNK_ROWS"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total = 0
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, COPY_CHUNK_ROWS))
+        if not chunk:
+            return total
+        buffer = io.StringIO("\n".join(",".join(_csv_value(v) for v in row) for row in chunk) + "\n")
+        cur.copy_expert(sql, buffer)
+        total += len(chunk)
+
+
+def bench_config(database: str = DEFAULT_DATABASE) -> DatabaseConfig:
+    """Конфигурация подключения к базе бенчмарков (остальное — из окружения)"""
+    return replace(DatabaseConfig.from_env(), database=database)
+
+
+def recreate_database(config: DatabaseConfig, reset: bool):
+    """Создание базы бенчмарков (reset — пересоздать)"""
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+    conn = psycopg2.connect(host=config.host, port=config.port, database="postgres",
+                            user=config.user, password=config.password)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    with conn.cursor() as cur:
+        if reset:
+            cur.execute(f'DROP DATABASE IF EXISTS "{config.database}"')
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (config.database,))
+        if not cur.fetchone():
+            cur.execute(f'CREATE DATABASE "{config.database}"')
+    conn.close()
+
+
+def load_corpus(corpus: SyntheticCorpus, config: DatabaseConfig) -> Dict[str, float]:
+    """Схема + корпус одной транзакцией; возвращает время этапов (секунды)"""
+    import psycopg2
+
+    conn = psycopg2.connect(host=config.host, port=config.port, database=config.database,
+                            user=config.user, password=config.password)
+    timings: Dict[str, float] = {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('public.materials') IS NOT NULL")
+            if cur.fetchone()[0]:
+                raise RuntimeError(f"База {config.database} уже содержит схему (используйте --reset)")
+
+            started = time.perf_counter()
+            for schema_file in sorted((PROJECT_ROOT / "database" / "schema").glob("*.sql")):
+                cur.execute(schema_file.read_text())
+            timings["schema"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            corpus.edges()
+            timings["generate_edges"] = time.perf_counter() - started
+
+            steps = (
+                ("materials", ("id", "material_id", "filename", "title", "category", "status", "layer",
+                               "file_path", "file_size_bytes", "metadata", "tags"), corpus.material_rows()),
+                ("analytical_nodes", ("id", "node_id", "layer", "backlinks_count", "outgoing_edges_count",
+                                      "source_ids"), corpus.node_rows()),
+                ("source_node_mapping", ("source_id", "node_id", "mapping_type"), corpus.mapping_rows()),
+                ("material_edges", ("source_material_id", "target_material_id", "edge_type", "weight",
+                                    "metadata"), corpus.edge_rows()),
+                ("backlinks", ("target_node_id", "source_node_id", "reference_type"), corpus.backlink_rows()),
+                ("search_index", ("material_id", "content_text", "category", "layer"), corpus.search_rows()),
+            )
+            # Куб связности пересчитывается один раз после загрузки рёбер
+            cur.execute("ALTER TABLE material_edges DISABLE TRIGGER trigger_connectivity_cube")
+            for table, columns, rows in steps:
+                started = time.perf_counter()
+                count = copy_rows(cur, table, columns, rows)
+                timings[table] = time.perf_counter() - started
+                print(f"   • {table}: {count} строк за {timings[table]:.1f} с")
+            cur.execute("ALTER TABLE material_edges ENABLE TRIGGER trigger_connectivity_cube")
+
+            started = time.perf_counter()
+            cur.execute("SELECT rebuild_connectivity_cube()")
+            for material_uuid, vector in corpus.embedding_rows():
+                cur.execute("UPDATE materials SET embedding = %s::vector WHERE id = %s", (vector, str(material_uuid)))
+            cur.execute("ANALYZE")
+            timings["finalize"] = time.perf_counter() - started
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return timings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Генерация и загрузка синтетического корпуса")
+    parser.add_argument("--materials", type=int, default=CorpusSpec.materials, help="Материалов всего")
+    parser.add_argument("--edges", type=int, default=CorpusSpec.edges, help="Рёбер между узлами")
+    parser.add_argument("--embeddings", type=int, default=CorpusSpec.embeddings, help="Материалов с embedding")
+    parser.add_argument("--seed", type=int, default=CorpusSpec.seed)
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help=f"База (по умолчанию {DEFAULT_DATABASE})")
+    parser.add_argument("--reset", action="store_true", help="Пересоздать базу")
+    args = parser.parse_args(argv)
+
+    spec = CorpusSpec(materials=args.materials, edges=args.edges, embeddings=args.embeddings, seed=args.seed)
+    config = bench_config(args.database)
+    print(f"🧪 Корпус: {spec.nodes} узлов, {spec.sources} первоисточников, {spec.edges} рёбер → {config.database}")
+
+    recreate_database(config, args.reset)
+    timings = load_corpus(SyntheticCorpus(spec), config)
+    print(f"✅ Загружено за {sum(timings.values()):.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Query Plan Regression
+Проверка планов всех SQL-запросов DatabaseManager на синтетическом корпусе
+
+Каждая операция DatabaseManager выполняется на корпусе benchmarks/corpus.py
+через соединение, которое записывает выполненные запросы (с подставленными
+параметрами, как их отправляет psycopg2). Для каждого запроса выполняется
+EXPLAIN (ANALYZE, BUFFERS) в транзакции, которая затем откатывается, —
+запросы на запись не меняют корпус.
+
+Для каждого запроса сохраняются:
+- fingerprint — хэш структуры плана (типы узлов, таблицы, индексы);
+- seq_scans — таблицы, читаемые последовательным сканированием;
+- buffers — затронутые страницы (shared hit + read).
+
+Регрессия (код 1):
+- последовательное сканирование большой таблицы (--seq-scan-rows) в запросе,
+  которому оно не положено по смыслу (FULL_SCAN_OPERATIONS);
+- новое последовательное сканирование относительно базового JSON;
+- buffers сверх --buffer-budget или сверх базового замера с допуском.
+
+Использование:
+    python benchmarks/plans.py --save benchmarks/results/plans.json
+    python benchmarks/plans.py --baseline benchmarks/results/plans.json
+"""
+import argparse
+import functools
+import hashlib
+import json
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.corpus import DEFAULT_DATABASE, bench_config
+from benchmarks.scale import load_sample
+
+# Операции, которые читают таблицы целиком по назначению (агрегаты, выгрузки)
+FULL_SCAN_OPERATIONS = {"get_statistics", "get_integrity_keys", "list_graph_edges"}
+
+DEFAULT_BUFFER_BUDGET = 5000
+DEFAULT_SEQ_SCAN_ROWS = 10_000
+# Рост buffers меньше этого числа страниц не считается регрессией (шум мелких запросов)
+BUFFER_NOISE_FLOOR = 100
+SQL_PREVIEW_CHARS = 400
+
+
+def _operations(sample: Dict) -> List[Tuple[str, Callable]]:
+    """Каталог вызовов: (имя, функция(db)); имя до '[' — метод DatabaseManager"""
+    from database.operations import MaterialCategory
+
+    rng = random.Random(7)
+    node, hub, source = sample["nodes"][0], sample["hubs"][0], sample["sources"][0]
+    embedding = [rng.gauss(0, 1) for _ in range(1536)]
+    return [
+        ("get_material", lambda db: db.get_material(node)),
+        ("list_materials", lambda db: db.list_materials()),
+        ("list_materials[layer]", lambda db: db.list_materials(layer="L2-Operational")),
+        ("list_materials[category]", lambda db: db.list_materials(category=MaterialCategory.ANALYTICAL_NODES)),
+        ("search_materials", lambda db: db.search_materials("платформа")),
+        ("search_materials[category]", lambda db: db.search_materials("платформа", category=MaterialCategory.RAW_SOURCES)),
+        ("semantic_search", lambda db: db.semantic_search(embedding)),
+        ("get_source_chain", lambda db: db.get_source_chain(source)),
+        ("get_node_sources", lambda db: db.get_node_sources(node)),
+        ("get_node_edges", lambda db: db.get_node_edges(node)),
+        ("get_node_edges[hub]", lambda db: db.get_node_edges(hub)),
+        ("get_node_bundle", lambda db: db.get_node_bundle(sample["nodes"][:20])),
+        ("list_graph_edges", lambda db: db.list_graph_edges()),
+        ("get_graph_overview", lambda db: db.get_graph_overview()),
+        ("get_connectivity_cube", lambda db: db.get_connectivity_cube(source_layer="L1-Strategic")),
+        ("get_statistics", lambda db: db.get_statistics()),
+        ("get_integrity_keys", lambda db: db.get_integrity_keys()),
+        ("store_source_extractions", lambda db: db.store_source_extractions([
+            {"material_id": source, "format": "docx", "text": "платформа цифровой двойник", "metadata": {}}
+        ])),
+        ("record_material_version", lambda db: db.record_material_version(node, "9.9.9", "archive/x", "0" * 64)),
+        ("list_material_versions", lambda db: db.list_material_versions(node)),
+        ("get_material_version", lambda db: db.get_material_version(node, "1.0.0")),
+        ("log_operation", lambda db: db.log_operation("AGENT-BENCH", "get_material", {"id": node}, "success")),
+        ("log_operations_batch", lambda db: db.log_operations_batch("AGENT-BENCH", [
+            {"operation": "search", "params": {"q": "платформа"}, "status": "success", "session_id": "bench"}
+        ] * 10)),
+        ("append_session_materials", lambda db: db.append_session_materials(
+            "AGENT-BENCH", "bench", datetime.now(), sample["nodes"][:10]
+        )),
+    ]
+
+
+# ==========================================
+# ЗАПИСЬ ЗАПРОСОВ
+# ==========================================
+
+def _recording_connection_class():
+    """Соединение psycopg2, записывающее запросы курсоров; commit подавляется"""
+    from psycopg2.extensions import connection, cursor
+
+    class RecordingConnection(connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.recording = False
+            self.statements: List[str] = []
+
+        def cursor(self, *args, cursor_factory=None, **kwargs):
+            factory = _recording_cursor(cursor_factory or self.cursor_factory or cursor)
+            return super().cursor(*args, cursor_factory=factory, **kwargs)
+
+        def commit(self):
+            # Операции на запись откатываются после записи запросов
+            if not self.recording:
+                super().commit()
+
+    return RecordingConnection
+
+
+@functools.lru_cache(maxsize=None)
+def _recording_cursor(base: type) -> type:
+    class RecordingCursor(base):
+        def execute(self, query, vars=None):
+            if self.connection.recording:
+                statement = self.mogrify(query, vars)
+                self.connection.statements.append(
+                    statement.decode("utf-8") if isinstance(statement, bytes) else statement
+                )
+            return super().execute(query, vars)
+
+    return RecordingCursor
+
+
+def capture(db, call: Callable) -> List[str]:
+    """Запросы, выполненные операцией (изменения откатываются)"""
+    conn = db.connect()
+    conn.statements = []
+    conn.recording = True
+    try:
+        call(db)
+    finally:
+        conn.recording = False
+        conn.rollback()
+    return list(conn.statements)
+
+
+# ==========================================
+# АНАЛИЗ ПЛАНОВ
+# ==========================================
+
+def _walk(node: Dict) -> Iterator[Dict]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+def _shape(node: Dict) -> str:
+    """Структура плана без оценок стоимости и числа строк"""
+    label = node["Node Type"]
+    target = node.get("Index Name") or node.get("Relation Name")
+    if target:
+        label += f"[{target}]"
+    children = node.get("Plans")
+    if children:
+        label += "(" + ",".join(_shape(child) for child in children) + ")"
+    return label
+
+
+def summarize_plan(explain: List[Dict]) -> Dict:
+    root = explain[0]["Plan"]
+    shape = _shape(root)
+    hit = root.get("Shared Hit Blocks", 0)
+    read = root.get("Shared Read Blocks", 0)
+    return {
+        "fingerprint": hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12],
+        "shape": shape,
+        "seq_scans": sorted({n["Relation Name"] for n in _walk(root) if n["Node Type"] == "Seq Scan"}),
+        "buffers": hit + read,
+        "shared_read": read,
+        "rows": root.get("Actual Rows", 0),
+        "time_ms": round(explain[0].get("Execution Time", 0.0), 3),
+    }
+
+
+def explain(db, statement: str) -> Dict:
+    conn = db.connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement)
+            result = cur.fetchone()[0]
+    finally:
+        conn.rollback()
+    return summarize_plan(result if isinstance(result, list) else json.loads(result))
+
+
+def relation_sizes(db) -> Dict[str, int]:
+    """Оценка числа строк таблиц (pg_class.reltuples после ANALYZE)"""
+    conn = db.connect()
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, c.reltuples::bigint
+            FROM pg_class c JOIN pg_namespace n ON c.relnamespace = n.oid
+            WHERE n.nspname = 'public' AND c.relkind = 'r'
+        """)
+        sizes = dict(cur.fetchall())
+    conn.rollback()
+    return sizes
+
+
+def run_plans(database: str, seed: int) -> Dict:
+    import psycopg2
+    from pgvector.psycopg2 import register_vector
+    from database.operations import DB_OPERATIONS, DatabaseManager
+
+    db = DatabaseManager(bench_config(database))
+    db._connection = psycopg2.connect(**db._connect_params(), connection_factory=_recording_connection_class())
+    register_vector(db._connection)
+
+    sample = load_sample(db, seed)
+    sizes = relation_sizes(db)
+    statements: Dict[str, Dict] = {}
+    covered = set()
+    for name, call in _operations(sample):
+        operation = name.split("[")[0]
+        covered.add(operation)
+        for index, statement in enumerate(capture(db, call), 1):
+            plan = explain(db, statement)
+            plan["operation"] = operation
+            plan["sql"] = " ".join(statement.split())[:SQL_PREVIEW_CHARS]
+            statements[f"{name}#{index}"] = plan
+    db.close()
+
+    return {
+        "benchmark": "plans",
+        "timestamp": datetime.now().isoformat(),
+        "database": database,
+        "corpus": sample["corpus"],
+        "relation_sizes": sizes,
+        "uncovered_operations": sorted(set(DB_OPERATIONS) - covered),
+        "statements": statements,
+    }
+
+
+def check(result: Dict, baseline: Optional[Dict], buffer_budget: int,
+          seq_scan_rows: int, tolerance: float) -> List[str]:
+    """Список регрессий планов"""
+    regressions = []
+    sizes = result["relation_sizes"]
+    reference = (baseline or {}).get("statements", {})
+    for name, plan in result["statements"].items():
+        full_scan = plan["operation"] in FULL_SCAN_OPERATIONS
+        large = [] if full_scan else [rel for rel in plan["seq_scans"] if sizes.get(rel, 0) >= seq_scan_rows]
+        if large:
+            regressions.append(f"{name}: Seq Scan по {', '.join(large)}")
+        if not full_scan and plan["buffers"] > buffer_budget:
+            regressions.append(f"{name}: buffers {plan['buffers']} > бюджета {buffer_budget}")
+
+        previous = reference.get(name)
+        if not previous:
+            continue
+        new_scans = sorted(set(plan["seq_scans"]) - set(previous["seq_scans"]) - set(large))
+        if new_scans:
+            regressions.append(f"{name}: новый Seq Scan по {', '.join(new_scans)}")
+        if (plan["buffers"] - previous["buffers"] > BUFFER_NOISE_FLOOR
+                and plan["buffers"] > previous["buffers"] * (1 + tolerance)):
+            regressions.append(
+                f"{name}: buffers {plan['buffers']} > {previous['buffers']} (+{tolerance:.0%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Регрессия планов запросов DatabaseManager")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help=f"База с корпусом (по умолчанию {DEFAULT_DATABASE})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--buffer-budget", type=int, default=DEFAULT_BUFFER_BUDGET,
+                        help="Максимум страниц (shared hit + read) на запрос")
+    parser.add_argument("--seq-scan-rows", type=int, default=DEFAULT_SEQ_SCAN_ROWS,
+                        help="Seq Scan таблицы от этого числа строк — регрессия")
+    parser.add_argument("--baseline", type=Path, help="JSON с базовыми планами")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустимый рост buffers (доля)")
+    parser.add_argument("--save", type=Path, help="Сохранить планы в JSON")
+    args = parser.parse_args(argv)
+
+    result = run_plans(args.database, args.seed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"🧭 Запросов: {len(result['statements'])} "
+          f"(корпус: {result['corpus']['materials']} материалов, {result['corpus']['edges']} рёбер)")
+    for name, plan in result["statements"].items():
+        changed = ""
+        previous = (baseline or {}).get("statements", {}).get(name)
+        if previous and previous["fingerprint"] != plan["fingerprint"]:
+            changed = f"  план изменился (было {previous['fingerprint']})"
+        print(f"   • {name:32} {plan['fingerprint']}  buffers {plan['buffers']:>8}  "
+              f"{plan['time_ms']:>9} ms{changed}")
+    if result["uncovered_operations"]:
+        print(f"⚠️  Операции без замера: {', '.join(result['uncovered_operations'])}")
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 Планы сохранены: {args.save}")
+
+    regressions = check(result, baseline, args.buffer_budget, args.seq_scan_rows, args.tolerance)
+    if regressions:
+        print("❌ Регрессия планов:")
+        for line in regressions:
+            print(f"   • {line}")
+        sys.exit(1)
+    print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Router Benchmark
+Линейный перебор ключевых слов против скомпилированного QueryRouter
+
+Таблицы расширяются синтетическими ключевыми словами до заданных размеров;
+для каждого размера замеряется классификация одного набора запросов
+(рабочие таблицы агента + OPERATION_MAP) обоими способами. Результаты
+линейного перебора и маршрутизатора сверяются.
+
+Использование:
+    python benchmarks/router.py
+    python benchmarks/router.py --sizes 10 1000 20000 --queries 2000
+"""
+import argparse
+import random
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from agent.operations import OPERATION_MAP
+from agent.router import QueryRouter, dispatch_table
+
+SAMPLE_QUERIES = [
+    "найди CML-Bench",
+    "покажи NODE-CONTEXT",
+    "список узлов L1",
+    "статистика",
+    "trace SRC-DOC-001",
+    "analyze_ связи NODE-MKCP и NODE-SOVEREIGNTY",
+    "технологический суверенитет и цифровые двойники в промышленности",
+]
+
+
+def synthetic_tables(size: int, rng: random.Random) -> Dict[str, List[Tuple[str, Any]]]:
+    """Рабочие таблицы, дополненные случайными словами до size записей каждая"""
+    tables = {"dispatch": list(dispatch_table()), "operation": list(OPERATION_MAP.items())}
+    for name, entries in tables.items():
+        while len(entries) < size:
+            word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12)))
+            entries.append((word, f"{name}-{len(entries)}"))
+    return tables
+
+
+def linear_classify(tables: Dict[str, List[Tuple[str, Any]]], query: str) -> Dict[str, Any]:
+    """Прежний способ: по подстрочному проходу на каждую таблицу"""
+    query_lower = query.lower()
+    labels = {}
+    for name, entries in tables.items():
+        for keyword, label in entries:
+            if keyword in query_lower:
+                labels[name] = label
+                break
+    return labels
+
+
+def timed(func: Callable[[str], Any], queries: Sequence[str], repeat: int) -> float:
+    """Медиана времени на запрос, мкс"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            func(query)
+        samples.append((time.perf_counter() - start) / len(queries))
+    return statistics.median(samples) * 1e6
+
+
+def run_benchmark(sizes: Sequence[int], query_count: int, repeat: int, seed: int = 42) -> List[Dict]:
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        tables = synthetic_tables(size, rng)
+        keywords = [keyword for entries in tables.values() for keyword, _ in entries]
+        queries = [
+            rng.choice(SAMPLE_QUERIES) + " " + (rng.choice(keywords) if rng.random() < 0.5 else "")
+            for _ in range(query_count)
+        ]
+
+        start = time.perf_counter()
+        router = QueryRouter(tables)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        mismatches = sum(
+            1 for query in queries if router.classify(query).labels != linear_classify(tables, query)
+        )
+        linear_us = timed(lambda query: linear_classify(tables, query), queries, repeat)
+        compiled_us = timed(router.classify, queries, repeat)
+        results.append({
+            "table_size": size,
+            "compile_ms": round(compile_ms, 1),
+            "linear_us": round(linear_us, 2),
+            "compiled_us": round(compiled_us, 2),
+            "speedup": round(linear_us / compiled_us, 1) if compiled_us else None,
+            "mismatches": mismatches,
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Бенчмарк маршрутизатора запросов")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 3000, 30000],
+                        help="Размеры таблиц ключевых слов")
+    parser.add_argument("--queries", type=int, default=1000, help="Запросов на замер")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов замера")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.sizes, args.queries, args.repeat)
+
+    print(f"{'таблица':>8} {'компиляция':>11} {'линейно':>10} {'роутер':>10} {'ускорение':>10}")
+    for row in results:
+        print(f"{row['table_size']:>8} {row['compile_ms']:>8} ms {row['linear_us']:>7} µs "
+              f"{row['compiled_us']:>7} µs {row['speedup']:>9}x")
+
+    mismatches = sum(row["mismatches"] for row in results)
+    if mismatches:
+        print(f"❌ Расхождений с линейным перебором: {mismatches}")
+        sys.exit(1)
+    print("✅ Результаты совпадают с линейным перебором")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Scale Benchmark
+Латентность и пропускная способность операций на синтетическом корпусе
+
+Корпус готовится benchmarks/corpus.py. Каждая операция DatabaseManager и
+KnowledgeGateAgent выполняется --requests раз на каждом уровне
+параллелизма (пул соединений — connection_pool_size уровня); аргументы — случайная
+выборка ID и слов из загруженного корпуса с фиксированным seed. Для каждой
+пары (операция, уровень) фиксируются p50/p95/p99/max и запросы в секунду.
+
+Результаты сравниваются с базовым JSON; рост p95 сверх допуска на любом
+уровне завершает скрипт с кодом 1.
+
+Использование:
+    python benchmarks/scale.py --concurrency 1 4 16 --save benchmarks/results/scale.json
+    python benchmarks/scale.py --baseline benchmarks/results/scale.json --tolerance 0.3
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.corpus import DEFAULT_DATABASE, VOCABULARY, bench_config
+
+# Workload: (имя, функция(db, agent, sample, rng))
+Workload = Tuple[str, Callable]
+
+DB_WORKLOADS: List[Workload] = [
+    ("db.get_material", lambda db, agent, s, rng: db.get_material(rng.choice(s["nodes"]))),
+    ("db.list_materials", lambda db, agent, s, rng: db.list_materials(layer=rng.choice(s["layers"]), limit=100)),
+    ("db.search_materials", lambda db, agent, s, rng: db.search_materials(rng.choice(VOCABULARY))),
+    ("db.get_source_chain", lambda db, agent, s, rng: db.get_source_chain(rng.choice(s["sources"]))),
+    ("db.get_node_sources", lambda db, agent, s, rng: db.get_node_sources(rng.choice(s["nodes"]))),
+    ("db.get_node_edges", lambda db, agent, s, rng: db.get_node_edges(rng.choice(s["nodes"]))),
+    ("db.get_node_edges[hub]", lambda db, agent, s, rng: db.get_node_edges(rng.choice(s["hubs"]))),
+    ("db.get_node_bundle", lambda db, agent, s, rng: db.get_node_bundle(rng.sample(s["nodes"], 20))),
+    ("db.get_connectivity_cube", lambda db, agent, s, rng: db.get_connectivity_cube(source_layer=rng.choice(s["layers"]))),
+    ("db.get_graph_overview", lambda db, agent, s, rng: db.get_graph_overview()),
+    ("db.get_statistics", lambda db, agent, s, rng: db.get_statistics()),
+]
+
+AGENT_WORKLOADS: List[Workload] = [
+    ("agent.get", lambda db, agent, s, rng: agent.execute_operation("get", {"id": rng.choice(s["nodes"])})),
+    ("agent.search", lambda db, agent, s, rng: agent.execute_operation("search", {"q": rng.choice(VOCABULARY)})),
+    ("agent.trace", lambda db, agent, s, rng: agent.execute_operation("trace", {"id": rng.choice(s["sources"])})),
+    ("agent.edges", lambda db, agent, s, rng: agent.execute_operation("edges", {"id": rng.choice(s["nodes"])})),
+    ("agent.bundle", lambda db, agent, s, rng: agent.execute_operation("bundle", {"ids": rng.sample(s["nodes"], 20)})),
+    ("agent.layer", lambda db, agent, s, rng: agent.execute_operation("layer", {"layer": rng.choice(("L1", "L2", "L3"))})),
+    ("agent.overview", lambda db, agent, s, rng: agent.execute_operation("overview", {})),
+    ("agent.process_query", lambda db, agent, s, rng: agent.process_query(f"найди {rng.choice(VOCABULARY)}")),
+]
+
+SAMPLE_SIZE = 1000
+HUBS = 20
+
+
+def load_sample(db, seed: int) -> Dict:
+    """ID узлов, первоисточников и узлов-хабов из загруженного корпуса"""
+    conn = db.connect()
+    with conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s)", (((seed % 1000) / 1000.0),))
+        cur.execute(
+            "SELECT material_id FROM materials WHERE category = 'ANALYTICAL_NODES' ORDER BY random() LIMIT %s",
+            (SAMPLE_SIZE,),
+        )
+        nodes = [row[0] for row in cur.fetchall()]
+        cur.execute(
+            "SELECT material_id FROM materials WHERE category = 'RAW_SOURCES' ORDER BY random() LIMIT %s",
+            (SAMPLE_SIZE,),
+        )
+        sources = [row[0] for row in cur.fetchall()]
+        cur.execute(
+            "SELECT node_id FROM analytical_nodes ORDER BY backlinks_count DESC LIMIT %s", (HUBS,)
+        )
+        hubs = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT COUNT(*) FROM materials")
+        materials = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM material_edges")
+        edges = cur.fetchone()[0]
+    db.release()
+    if not nodes or not sources:
+        raise RuntimeError("Корпус не загружен: запустите benchmarks/corpus.py")
+    return {
+        "nodes": nodes,
+        "sources": sources,
+        "hubs": hubs or nodes[:HUBS],
+        "layers": ["L1-Strategic", "L2-Operational", "L3-Technical"],
+        "corpus": {"materials": materials, "edges": edges},
+    }
+
+
+def summarize(samples: List[float], errors: int, wall: float) -> Dict:
+    ordered = sorted(samples)
+
+    def quantile(q: float) -> float:
+        if not ordered:
+            return 0.0
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "p50_ms": quantile(0.50),
+        "p95_ms": quantile(0.95),
+        "p99_ms": quantile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        "rps": round(len(ordered) / wall, 1) if wall else 0.0,
+        "requests": len(ordered),
+        "errors": errors,
+    }
+
+
+def run_workload(workload: Workload, db, agent, sample: Dict, requests: int,
+                 concurrency: int, seed: int) -> Dict:
+    """Выполнение операции requests раз в concurrency потоках"""
+    name, call = workload
+    is_agent = name.startswith("agent.")
+
+    def one(index: int) -> Optional[float]:
+        rng = random.Random(seed * 1_000_003 + index)
+        started = time.perf_counter()
+        try:
+            if is_agent:
+                with agent.request_context():
+                    call(db, agent, sample, rng)
+            else:
+                try:
+                    call(db, agent, sample, rng)
+                finally:
+                    db.release()
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    samples = [elapsed for elapsed in results if elapsed is not None]
+    return summarize(samples, len(results) - len(samples), wall)
+
+
+def run_benchmark(database: str, levels: List[int], requests: int, seed: int,
+                  only: Optional[List[str]] = None) -> Dict:
+    from agent.knowledge_gate import KnowledgeGateAgent, connection_pool_size
+    from database.operations import DatabaseManager
+
+    config = bench_config(database)
+    workloads = [
+        workload for workload in DB_WORKLOADS + AGENT_WORKLOADS
+        if not only or any(workload[0].startswith(prefix) for prefix in only)
+    ]
+    operations: Dict[str, Dict[str, Dict]] = {name: {} for name, _ in workloads}
+    sample: Dict = {}
+
+    for concurrency in levels:
+        db = DatabaseManager(config, pool_size=connection_pool_size(concurrency))
+        agent = KnowledgeGateAgent(db)
+        if not sample:
+            sample = load_sample(db, seed)
+        print(f"🔁 Параллелизм {concurrency}")
+        for workload in workloads:
+            # Прогрев: соединения пула, кэши планов и страниц
+            run_workload(workload, db, agent, sample, min(requests, concurrency * 2), concurrency, seed - 1)
+            stats = run_workload(workload, db, agent, sample, requests, concurrency, seed)
+            operations[workload[0]][str(concurrency)] = stats
+            print(f"   • {workload[0]:28} p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  "
+                  f"{stats['rps']:>8} rps" + (f"  ошибок: {stats['errors']}" if stats["errors"] else ""))
+        db.close()
+
+    return {
+        "benchmark": "scale",
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database,
+        "corpus": sample["corpus"],
+        "requests": requests,
+        "concurrency": levels,
+        "operations": operations,
+    }
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Список регрессий p95 и новых ошибок относительно базового замера"""
+    regressions = []
+    if baseline.get("corpus") and baseline["corpus"] != result["corpus"]:
+        regressions.append(f"корпус отличается от базового: {result['corpus']} ≠ {baseline['corpus']}")
+    for name, levels in result["operations"].items():
+        for level, stats in levels.items():
+            reference = baseline.get("operations", {}).get(name, {}).get(level)
+            if not reference:
+                continue
+            if reference["p95_ms"] and stats["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{name} ×{level}: p95 {stats['p95_ms']} ms > {reference['p95_ms']} ms (+{tolerance:.0%})"
+                )
+            if stats["errors"] > reference.get("errors", 0):
+                regressions.append(f"{name} ×{level}: ошибок {stats['errors']} (было {reference.get('errors', 0)})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Нагрузочный замер операций на синтетическом корпусе")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help=f"База с корпусом (по умолчанию {DEFAULT_DATABASE})")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Уровни параллелизма")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на операцию и уровень")
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="Только операции с префиксом (db., agent.get)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", type=Path, help="JSON с базовым замером")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Допустимый рост p95 (доля)")
+    parser.add_argument("--save", type=Path, help="Сохранить результат в JSON")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.database, args.concurrency, args.requests, args.seed, args.only)
+    print(f"📊 Корпус: {result['corpus']['materials']} материалов, {result['corpus']['edges']} рёбер")
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результат сохранён: {args.save}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+
+    if regressions:
+        print("❌ Регрессия латентности:")
+        for line in regressions:
+            print(f"   • {line}")
+        sys.exit(1)
+    print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
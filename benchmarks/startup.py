@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Замер времени запуска Knowledge Gate Agent CLI
+
+Каждый замер выполняется в отдельном процессе:
+- import: время импорта agent.cli и загруженные тяжёлые модули
+- first_prompt: время от запуска run_agent.py до первого приглашения ввода
+- graph_command: время команды графа (path — индекс рёбер и критический
+  путь) от ввода до следующего приглашения; с --unreachable-db хост БД
+  заменяется недоступным адресом, и замер ограничен таймаутом подключения
+
+Результаты сравниваются с базовым JSON; превышение допуска по медиане
+завершает скрипт с кодом 1.
+
+Использование:
+    python benchmarks/startup.py --runs 10 --save benchmarks/results/startup.json
+    python benchmarks/startup.py --baseline benchmarks/results/startup.json
+    python benchmarks/startup.py --unreachable-db --runs 3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent
+RUN_AGENT = PROJECT_ROOT / "run_agent.py"
+
+PROMPT = "🤖 >".encode("utf-8")
+
+# Команда, которой достаточно индекса рёбер (БД — необязательный источник рёбер)
+GRAPH_COMMAND = b"path L1 L3\n"
+# Немаршрутизируемый адрес: подключение зависает до connect_timeout
+UNREACHABLE_DB_HOST = "10.255.255.1"
+
+# Модули, которые не должны загружаться при старте
+HEAVY_MODULES = ("psycopg2", "pgvector", "numpy")
+
+_IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import agent.cli
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules]
+}}))
+"""
+
+
+def measure_import() -> Dict:
+    """Время импорта agent.cli в чистом интерпретаторе"""
+    probe = _IMPORT_PROBE.format(root=str(PROJECT_ROOT), heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", probe],
+        capture_output=True, check=True, cwd=PROJECT_ROOT
+    ).stdout
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def _read_prompt(process: subprocess.Popen, start: float, timeout: float):
+    """Чтение вывода CLI до очередного приглашения ввода"""
+    output = b""
+    while PROMPT not in output:
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("CLI не вывел приглашение ввода")
+        chunk = process.stdout.read1(4096)
+        if not chunk:
+            raise RuntimeError("CLI завершился до приглашения ввода")
+        output += chunk
+
+
+def measure_cli(timeout: float = 60.0, unreachable_db: bool = False) -> Dict[str, float]:
+    """Время до первого приглашения ввода и время команды графа"""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    if unreachable_db:
+        env["DB_HOST"] = UNREACHABLE_DB_HOST
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(RUN_AGENT)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        cwd=PROJECT_ROOT, env=env
+    )
+    try:
+        _read_prompt(process, start, timeout)
+        first_prompt = time.perf_counter() - start
+
+        command_start = time.perf_counter()
+        process.stdin.write(GRAPH_COMMAND)
+        process.stdin.flush()
+        _read_prompt(process, command_start, timeout)
+        graph_command = time.perf_counter() - command_start
+
+        process.stdin.write(b"exit\n")
+        process.stdin.close()
+        process.wait(timeout=timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return {"first_prompt": first_prompt, "graph_command": graph_command}
+
+
+def summarize(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 2),
+        "min_ms": round(ordered[0] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "runs": len(ordered)
+    }
+
+
+def run_benchmark(runs: int, unreachable_db: bool = False) -> Dict:
+    import_samples, prompt_samples, graph_samples = [], [], []
+    heavy = set()
+    for _ in range(runs):
+        probe = measure_import()
+        import_samples.append(probe["seconds"])
+        heavy.update(probe["heavy_modules"])
+        cli = measure_cli(unreachable_db=unreachable_db)
+        prompt_samples.append(cli["first_prompt"])
+        graph_samples.append(cli["graph_command"])
+
+    return {
+        "benchmark": "startup",
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "import": summarize(import_samples),
+        "first_prompt": summarize(prompt_samples),
+        "graph_command": summarize(graph_samples),
+        "unreachable_db": unreachable_db,
+        "heavy_modules_at_import": sorted(heavy)
+    }
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Список регрессий относительно базового замера"""
+    regressions = []
+    for metric in ("import", "first_prompt", "graph_command"):
+        current = result[metric]["median_ms"]
+        reference = baseline.get(metric, {}).get("median_ms")
+        if reference and current > reference * (1 + tolerance):
+            regressions.append(
+                f"{metric}: {current} ms > {reference} ms (+{tolerance:.0%})"
+            )
+    if result["heavy_modules_at_import"]:
+        regressions.append(
+            f"тяжёлые модули при импорте: {', '.join(result['heavy_modules_at_import'])}"
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Замер времени запуска Knowledge Gate Agent")
+    parser.add_argument("--runs", type=int, default=5, help="Количество замеров")
+    parser.add_argument("--baseline", type=Path, help="JSON с базовым замером")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Допустимый рост медианы (доля)")
+    parser.add_argument("--save", type=Path, help="Сохранить результат в JSON")
+    parser.add_argument("--unreachable-db", action="store_true",
+                        help="Запускать CLI с недоступным хостом БД (замер отката на файл графа)")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.runs, args.unreachable_db)
+
+    print(f"⏱  Импорт agent.cli: {result['import']['median_ms']} ms (медиана, {args.runs} запусков)")
+    print(f"⏱  До приглашения ввода: {result['first_prompt']['median_ms']} ms")
+    print(f"⏱  Команда графа ({GRAPH_COMMAND.decode().strip()}): {result['graph_command']['median_ms']} ms"
+          + (" (БД недоступна)" if args.unreachable_db else ""))
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результат сохранён: {args.save}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+    elif result["heavy_modules_at_import"]:
+        regressions = compare(result, {}, args.tolerance)
+
+    if regressions:
+        print("❌ Регрессия времени запуска:")
+        for line in regressions:
+            print(f"   • {line}")
+        sys.exit(1)
+    print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
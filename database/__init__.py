@@ -6,10 +6,10 @@ PostgreSQL + pgvector for knowledge management
 from .config import DatabaseConfig, EmbeddingConfig, db_config, embedding_config
 from .operations import (
     DatabaseManager,
+    DatabaseUnavailableError,
     Material,
     MaterialCategory,
     MaterialStatus,
-    db_manager,
 )
 
 __all__ = [
@@ -18,6 +18,7 @@ __all__ = [
     "db_config",
     "embedding_config",
     "DatabaseManager",
+    "DatabaseUnavailableError",
     "Material",
     "MaterialCategory",
     "MaterialStatus",
@@ -25,3 +26,11 @@ __all__ = [
 ]
 
 __version__ = "1.0.0"
+
+
+def __getattr__(name: str):
+    # Глобальный db_manager создаётся при первом обращении, а не при импорте пакета
+    if name == "db_manager":
+        from . import operations
+        return operations.db_manager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
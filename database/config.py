@@ -22,6 +22,9 @@ class DatabaseConfig:
     min_connections: int = 1
     max_connections: int = 10
 
+    # Таймаут установки соединения (секунды): недоступный хост не блокирует команды
+    connect_timeout: int = 5
+
     @classmethod
     def from_env(cls) -> "DatabaseConfig":
         """Загрузка конфигурации из переменных окружения"""
@@ -32,6 +35,7 @@ class DatabaseConfig:
             user=os.getenv("DB_USER", "postgres"),
             password=os.getenv("DB_PASSWORD", ""),
             vector_dimensions=int(os.getenv("VECTOR_DIMENSIONS", "1536")),
+            connect_timeout=int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
         )
 
     @property
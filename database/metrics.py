@@ -0,0 +1,302 @@
+"""
+Metrics
+Встроенная инструментация операций агента и запросов к БД
+
+Каждый вызов операции оборачивается в span. Время span раскладывается на:
+- db_wait — ожидание соединения (connect / пул);
+- sql — выполнение запроса и выборка строк драйвером;
+- python — остальное время операции.
+Время БД вложенных вызовов учитывается во всех открытых span потока,
+поэтому операция агента видит суммарное время своих запросов.
+
+Латентность хранится в гистограммах с логарифмически-линейными корзинами
+(как HDR Histogram: 2^SUB_BUCKET_BITS корзин на каждую степень двойки,
+относительная погрешность ~6%) — память не зависит от числа вызовов.
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+# Корзин на степень двойки (точность квантилей ~1/2^bits)
+SUB_BUCKET_BITS = 4
+QUANTILES = (0.5, 0.95, 0.99)
+PHASES = ("total", "db_wait", "sql", "python")
+
+
+class LatencyHistogram:
+    """Гистограмма латентности в микросекундах"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @staticmethod
+    def bucket(value_us: int) -> int:
+        if value_us < (1 << SUB_BUCKET_BITS):
+            return value_us
+        exponent = value_us.bit_length() - 1 - SUB_BUCKET_BITS
+        return ((exponent + 1) << SUB_BUCKET_BITS) + ((value_us >> exponent) & ((1 << SUB_BUCKET_BITS) - 1))
+
+    @staticmethod
+    def bucket_upper(index: int) -> int:
+        """Верхняя граница корзины (мкс)"""
+        if index < (1 << SUB_BUCKET_BITS):
+            return index
+        exponent = (index >> SUB_BUCKET_BITS) - 1
+        mantissa = (index & ((1 << SUB_BUCKET_BITS) - 1)) | (1 << SUB_BUCKET_BITS)
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, value_us: int):
+        index = self.bucket(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def quantile(self, q: float) -> int:
+        """Значение квантиля (верхняя граница корзины, не больше максимума)"""
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.999999))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_upper(index), self.max_us)
+        return self.max_us
+
+
+class OperationStats:
+    """Гистограммы фаз и счётчики одной операции"""
+
+    def __init__(self):
+        self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+        for phase, histogram in self.histograms.items():
+            result[phase] = {
+                "mean_ms": round(histogram.sum_us / histogram.count / 1000, 3) if histogram.count else 0.0,
+                "max_ms": round(histogram.max_us / 1000, 3),
+                **{f"p{int(q * 100)}_ms": round(histogram.quantile(q) / 1000, 3) for q in QUANTILES},
+            }
+        return result
+
+
+class _Span:
+    __slots__ = ("name", "sql_span", "db_wait", "sql", "rows", "cache_hits", "cache_misses")
+
+    def __init__(self, name: str, sql_span: bool = False):
+        self.name = name
+        self.sql_span = sql_span
+        self.db_wait = 0.0
+        self.sql = 0.0
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self.enabled = True
+        self._operations: Dict[str, OperationStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started_at = time.time()
+
+    def _stack(self) -> List[_Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    # ==========================================
+    # SPAN
+    # ==========================================
+
+    @contextmanager
+    def span(self, name: str, sql: bool = False) -> Iterator[_Span]:
+        """
+        Span операции
+
+        Args:
+            name: Имя операции (agent.get_material, db.search_materials)
+            sql: Span запроса к БД — его время без ожидания соединения считается временем SQL
+        """
+        if not self.enabled:
+            yield _Span(name)
+            return
+        stack = self._stack()
+        span = _Span(name, sql)
+        stack.append(span)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield span
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if sql:
+                span.sql = max(elapsed - span.db_wait, 0.0)
+                # Время запроса входит во все объемлющие span (ожидание соединения
+                # уже учтено в них через add_db_wait); вложенный запрос учтёт внешний
+                if not any(parent.sql_span for parent in stack):
+                    for parent in stack:
+                        parent.sql += span.sql
+                        parent.rows += span.rows
+            self._record(span, elapsed, failed)
+
+    def add_db_wait(self, seconds: float):
+        """Ожидание соединения: учитывается во всех открытых span потока"""
+        for span in getattr(self._local, "stack", ()):
+            span.db_wait += seconds
+
+    def record_cache(self, hit: bool):
+        """Попадание/промах кэша в текущей операции"""
+        for span in getattr(self._local, "stack", ()):
+            if hit:
+                span.cache_hits += 1
+            else:
+                span.cache_misses += 1
+
+    def _record(self, span: _Span, elapsed: float, failed: bool):
+        total_us = int(elapsed * 1e6)
+        wait_us = int(span.db_wait * 1e6)
+        sql_us = int(span.sql * 1e6)
+        with self._lock:
+            stats = self._operations.get(span.name)
+            if stats is None:
+                stats = self._operations[span.name] = OperationStats()
+            stats.calls += 1
+            stats.errors += failed
+            stats.rows += span.rows
+            stats.cache_hits += span.cache_hits
+            stats.cache_misses += span.cache_misses
+            stats.histograms["total"].record(total_us)
+            stats.histograms["db_wait"].record(wait_us)
+            stats.histograms["sql"].record(sql_us)
+            stats.histograms["python"].record(max(total_us - wait_us - sql_us, 0))
+
+    # ==========================================
+    # ОТЧЁТЫ
+    # ==========================================
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Сводка по операциям: счётчики и квантили фаз в миллисекундах"""
+        with self._lock:
+            return {name: stats.snapshot() for name, stats in sorted(self._operations.items())}
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self.started_at = time.time()
+
+    def prometheus(self, prefix: str = "portal") -> str:
+        """Метрики в текстовом формате Prometheus"""
+        with self._lock:
+            operations = sorted(self._operations.items())
+            lines = [
+                f"# HELP {prefix}_operation_latency_seconds Латентность операций по фазам",
+                f"# TYPE {prefix}_operation_latency_seconds summary",
+            ]
+            for name, stats in operations:
+                for phase, histogram in stats.histograms.items():
+                    labels = f'operation="{name}",phase="{phase}"'
+                    for q in QUANTILES:
+                        lines.append(
+                            f'{prefix}_operation_latency_seconds{{{labels},quantile="{q}"}} '
+                            f"{histogram.quantile(q) / 1e6:.6f}"
+                        )
+                    lines.append(f"{prefix}_operation_latency_seconds_sum{{{labels}}} {histogram.sum_us / 1e6:.6f}")
+                    lines.append(f"{prefix}_operation_latency_seconds_count{{{labels}}} {histogram.count}")
+
+            counters = (
+                ("calls", "Вызовы операций"),
+                ("errors", "Операции, завершившиеся исключением"),
+                ("rows", "Строки, возвращённые БД"),
+                ("cache_hits", "Попадания в кэш"),
+                ("cache_misses", "Промахи кэша"),
+            )
+            for counter, description in counters:
+                metric = f"{prefix}_operation_{counter}_total"
+                lines.append(f"# HELP {metric} {description}")
+                lines.append(f"# TYPE {metric} counter")
+                for name, stats in operations:
+                    lines.append(f'{metric}{{operation="{name}"}} {getattr(stats, counter)}')
+        return "\n".join(lines) + "\n"
+
+
+# Реестр процесса
+metrics = MetricsRegistry()
+
+
+def _count_rows(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+
+def instrument_methods(cls: type, prefix: str, names: Iterable[str], sql: bool = False) -> type:
+    """
+    Обернуть методы класса в span
+
+    Args:
+        cls: Класс
+        prefix: Префикс имён операций (agent, db)
+        names: Имена методов
+        sql: Методы выполняют запросы к БД (возвращённые строки считаются)
+    """
+    for name in names:
+        method = getattr(cls, name)
+        setattr(cls, name, _instrumented(method, f"{prefix}.{name}", sql))
+    return cls
+
+
+def _instrumented(method: Callable, operation: str, sql: bool) -> Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with metrics.span(operation, sql=sql) as span:
+            result = method(*args, **kwargs)
+            if sql:
+                span.rows += _count_rows(result)
+            return result
+    return wrapper
+
+
+def format_table(snapshot: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Строки таблицы для CLI"""
+    header = (f"{'операция':34} {'вызовы':>7} {'p50':>8} {'p95':>8} {'p99':>8} "
+              f"{'ожид.БД':>8} {'SQL':>8} {'Python':>8} {'строки':>8} {'кэш':>9}")
+    lines = [header, "-" * len(header)]
+    for name, stats in snapshot.items():
+        total = stats["total"]
+        lines.append(
+            f"{name[:34]:34} {stats['calls']:>7} {total['p50_ms']:>8} {total['p95_ms']:>8} "
+            f"{total['p99_ms']:>8} {stats['db_wait']['mean_ms']:>8} {stats['sql']['mean_ms']:>8} "
+            f"{stats['python']['mean_ms']:>8} {stats['rows']:>8} "
+            f"{stats['cache_hits']:>4}/{stats['cache_misses']:<4}"
+        )
+    return lines
@@ -4,20 +4,37 @@ Knowledge Gate Agent database interface
 """
 import json
 import logging
+import threading
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
-import psycopg2
-from psycopg2.extras import RealDictCursor, execute_values
-from pgvector.psycopg2 import register_vector
-
 from .config import db_config, DatabaseConfig
+from .metrics import instrument_methods, metrics
+from .results import dumps_text, fetch_row, fetch_rows
+
+if TYPE_CHECKING:
+    import psycopg2
 
 logger = logging.getLogger(__name__)
 
+# После неудачного подключения новые попытки не делаются в течение интервала (секунды)
+UNAVAILABLE_RETRY_INTERVAL = 30.0
+
+
+class DatabaseUnavailableError(ConnectionError):
+    """БД недоступна: последняя попытка подключения не удалась"""
+
+
+def _extras():
+    """psycopg2.extras импортируется при первом обращении к БД, а не при импорте модуля"""
+    from psycopg2 import extras
+    return extras
+
 
 class MaterialCategory(Enum):
     """Категории материалов"""
@@ -60,26 +77,116 @@ class Material:
 class DatabaseManager:
     """Менеджер базы данных Portal_DTwins"""
 
-    def __init__(self, config: Optional[DatabaseConfig] = None):
+    def __init__(self, config: Optional[DatabaseConfig] = None, pool_size: Optional[int] = None):
+        """
+        Args:
+            config: Параметры подключения
+            pool_size: Размер пула соединений для многопоточного режима
+                       (каждый поток получает своё соединение; None — одно общее)
+        """
         self.config = config or db_config
+        self.pool_size = pool_size
         self._connection = None
-
-    def connect(self) -> psycopg2.extensions.connection:
-        """Установка соединения с базой данных"""
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._registered: set = set()
+        self._local = threading.local()
+        self._unavailable_until = 0.0
+        self._unavailable_error: Optional[str] = None
+
+    def _connect_params(self) -> Dict[str, Any]:
+        return {
+            "host": self.config.host,
+            "port": self.config.port,
+            "database": self.config.database,
+            "user": self.config.user,
+            "password": self.config.password,
+            "connect_timeout": self.config.connect_timeout,
+        }
+
+    def _check_available(self):
+        """Отказ без сетевой попытки, пока не истёк интервал после неудачного подключения"""
+        if time.monotonic() < self._unavailable_until:
+            raise DatabaseUnavailableError(f"БД недоступна: {self._unavailable_error}")
+
+    def _mark_unavailable(self, error: Exception):
+        self._unavailable_error = str(error).strip()
+        self._unavailable_until = time.monotonic() + UNAVAILABLE_RETRY_INTERVAL
+        logger.warning(f"БД недоступна, повторная попытка через {UNAVAILABLE_RETRY_INTERVAL:.0f} с: {self._unavailable_error}")
+
+    def connect(self) -> "psycopg2.extensions.connection":
+        """Установка соединения с базой данных (при первом вызове)"""
+        started = time.perf_counter()
+        try:
+            return self._open_connection()
+        finally:
+            metrics.add_db_wait(time.perf_counter() - started)
+
+    def _open_connection(self) -> "psycopg2.extensions.connection":
+        if self.pool_size:
+            return self._pooled_connection()
         if self._connection is None or self._connection.closed:
-            self._connection = psycopg2.connect(
-                host=self.config.host,
-                port=self.config.port,
-                database=self.config.database,
-                user=self.config.user,
-                password=self.config.password,
-            )
+            self._check_available()
+            import psycopg2
+            from pgvector.psycopg2 import register_vector
+
+            try:
+                self._connection = psycopg2.connect(**self._connect_params())
+            except psycopg2.OperationalError as e:
+                self._mark_unavailable(e)
+                raise
             # Регистрируем pgvector типы
             register_vector(self._connection)
         return self._connection
 
+    def _pooled_connection(self) -> "psycopg2.extensions.connection":
+        """Соединение текущего потока из пула (берётся до release())"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and not connection.closed:
+            return connection
+
+        self._check_available()
+        from psycopg2 import OperationalError
+        from pgvector.psycopg2 import register_vector
+
+        try:
+            if self._pool is None:
+                with self._pool_lock:
+                    if self._pool is None:
+                        from psycopg2.pool import ThreadedConnectionPool
+                        self._pool = ThreadedConnectionPool(1, self.pool_size, **self._connect_params())
+            connection = self._pool.getconn()
+        except OperationalError as e:
+            self._mark_unavailable(e)
+            raise
+        if id(connection) not in self._registered:
+            register_vector(connection)
+            self._registered.add(id(connection))
+        self._local.connection = connection
+        return connection
+
+    def release(self):
+        """Возврат соединения текущего потока в пул (без пула — ничего не делает)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._pool is None:
+            return
+        self._local.connection = None
+        if not connection.closed:
+            # Незавершённая транзакция чтения не должна переходить к следующему потоку
+            connection.rollback()
+        self._pool.putconn(connection, close=bool(connection.closed))
+
+    @property
+    def is_connected(self) -> bool:
+        """Открыто ли соединение (без попытки подключения)"""
+        if self._pool is not None:
+            return not self._pool.closed
+        return self._connection is not None and not self._connection.closed
+
     def close(self):
-        """Закрытие соединения"""
+        """Закрытие соединения (и пула)"""
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
         if self._connection and not self._connection.closed:
             self._connection.close()
 
@@ -97,15 +204,14 @@ class DatabaseManager:
     def get_material(self, material_id: str) -> Optional[Dict]:
         """Получение материала по ID"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute("""
                 SELECT m.*, an.backlinks_count, an.outgoing_edges_count, an.source_ids
                 FROM materials m
                 LEFT JOIN analytical_nodes an ON m.id = an.id
                 WHERE m.material_id = %s
             """, (material_id,))
-            result = cur.fetchone()
-            return dict(result) if result else None
+            return fetch_row(cur)
 
     def list_materials(
         self,
@@ -117,7 +223,7 @@ class DatabaseManager:
     ) -> List[Dict]:
         """Список материалов с фильтрацией"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             conditions = []
             params = []
 
@@ -142,7 +248,7 @@ class DatabaseManager:
                 LIMIT %s OFFSET %s
             """, params + [limit, offset])
 
-            return [dict(row) for row in cur.fetchall()]
+            return fetch_rows(cur)
 
     def search_materials(
         self,
@@ -152,7 +258,7 @@ class DatabaseManager:
     ) -> List[Dict]:
         """Полнотекстовый поиск материалов"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             params = [query, query]
             category_filter = ""
             if category:
@@ -170,7 +276,7 @@ class DatabaseManager:
                 LIMIT %s
             """, params + [limit])
 
-            return [dict(row) for row in cur.fetchall()]
+            return fetch_rows(cur)
 
     def semantic_search(
         self,
@@ -180,7 +286,7 @@ class DatabaseManager:
     ) -> List[Dict]:
         """Семантический поиск по embedding"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             params = [embedding]
             category_filter = ""
             if category:
@@ -197,7 +303,7 @@ class DatabaseManager:
                 LIMIT %s
             """, params + [embedding, limit])
 
-            return [dict(row) for row in cur.fetchall()]
+            return fetch_rows(cur)
 
     # ==========================================
     # TRACEABILITY OPERATIONS
@@ -206,13 +312,13 @@ class DatabaseManager:
     def get_source_chain(self, source_id: str) -> Dict:
         """Получение цепочки: Source -> Nodes -> Edges"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             # Информация об источнике
             cur.execute("""
                 SELECT material_id, filename, title, file_size_bytes
                 FROM materials WHERE material_id = %s
             """, (source_id,))
-            source = cur.fetchone()
+            source = fetch_row(cur)
 
             if not source:
                 return {"error": f"Source {source_id} not found"}
@@ -227,10 +333,10 @@ class DatabaseManager:
                 LEFT JOIN analytical_nodes an ON m.id = an.id
                 WHERE s.material_id = %s
             """, (source_id,))
-            nodes = [dict(row) for row in cur.fetchall()]
+            nodes = fetch_rows(cur)
 
             return {
-                "source": dict(source),
+                "source": source,
                 "derived_nodes": nodes,
                 "nodes_count": len(nodes),
                 "total_backlinks": sum(n.get("backlinks_count", 0) for n in nodes)
@@ -239,7 +345,7 @@ class DatabaseManager:
     def get_node_sources(self, node_id: str) -> List[Dict]:
         """Получение источников для узла"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute("""
                 SELECT s.material_id, s.filename, s.title, snm.mapping_type, snm.confidence
                 FROM source_node_mapping snm
@@ -247,7 +353,7 @@ class DatabaseManager:
                 JOIN materials s ON snm.source_id = s.id
                 WHERE n.material_id = %s
             """, (node_id,))
-            return [dict(row) for row in cur.fetchall()]
+            return fetch_rows(cur)
 
     # ==========================================
     # GRAPH OPERATIONS
@@ -256,7 +362,7 @@ class DatabaseManager:
     def get_node_edges(self, node_id: str, direction: str = "both") -> Dict:
         """Получение связей узла"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             result = {"incoming": [], "outgoing": []}
 
             if direction in ("both", "outgoing"):
@@ -268,7 +374,7 @@ class DatabaseManager:
                     JOIN materials t ON me.target_material_id = t.id
                     WHERE s.material_id = %s
                 """, (node_id,))
-                result["outgoing"] = [dict(row) for row in cur.fetchall()]
+                result["outgoing"] = fetch_rows(cur)
 
             if direction in ("both", "incoming"):
                 cur.execute("""
@@ -279,14 +385,124 @@ class DatabaseManager:
                     JOIN materials t ON me.target_material_id = t.id
                     WHERE t.material_id = %s
                 """, (node_id,))
-                result["incoming"] = [dict(row) for row in cur.fetchall()]
+                result["incoming"] = fetch_rows(cur)
 
             return result
 
+    # Части пакета контекста узла → подзапрос (json_agg по узлу m)
+    NODE_BUNDLE_PARTS = {
+        "material": """
+            to_jsonb(m) - 'embedding' || jsonb_build_object(
+                'backlinks_count', an.backlinks_count,
+                'outgoing_edges_count', an.outgoing_edges_count,
+                'source_ids', an.source_ids)
+        """,
+        "sources": """
+            (SELECT COALESCE(json_agg(json_build_object(
+                        'material_id', s.material_id, 'filename', s.filename, 'title', s.title,
+                        'mapping_type', snm.mapping_type, 'confidence', snm.confidence)
+                    ORDER BY s.material_id), '[]'::json)
+             FROM source_node_mapping snm
+             JOIN materials s ON snm.source_id = s.id
+             WHERE snm.node_id = m.id)
+        """,
+        "outgoing": """
+            (SELECT COALESCE(json_agg(json_build_object(
+                        'target_id', t.material_id, 'target_title', t.title,
+                        'edge_type', me.edge_type, 'weight', me.weight)
+                    ORDER BY me.weight DESC NULLS LAST, t.material_id), '[]'::json)
+             FROM material_edges me
+             JOIN materials t ON me.target_material_id = t.id
+             WHERE me.source_material_id = m.id)
+        """,
+        "incoming": """
+            (SELECT COALESCE(json_agg(json_build_object(
+                        'source_id', s.material_id, 'source_title', s.title,
+                        'edge_type', me.edge_type, 'weight', me.weight)
+                    ORDER BY me.weight DESC NULLS LAST, s.material_id), '[]'::json)
+             FROM material_edges me
+             JOIN materials s ON me.source_material_id = s.id
+             WHERE me.target_material_id = m.id)
+        """,
+        "backlinks": """
+            (SELECT COALESCE(json_agg(json_build_object(
+                        'source_id', s.material_id, 'source_title', s.title,
+                        'reference_type', b.reference_type, 'reference_context', b.reference_context)
+                    ORDER BY s.material_id), '[]'::json)
+             FROM backlinks b
+             JOIN materials s ON b.source_node_id = s.id
+             WHERE b.target_node_id = m.id)
+        """,
+    }
+
+    def get_node_bundle(
+        self,
+        node_ids: List[str],
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Dict]:
+        """
+        Контекст нескольких узлов одним запросом
+
+        Материал, первоисточники, исходящие и входящие связи и обратные
+        ссылки собираются подзапросами json_agg: один round trip на любой
+        набор узлов вместо пяти запросов на узел. Значения приходят в
+        JSON-типах (даты — строки ISO, числа — float).
+
+        Args:
+            node_ids: ID узлов
+            include: Части пакета (по умолчанию все): material, sources, outgoing, incoming, backlinks
+
+        Returns:
+            ID узла → {часть → данные}; узлов, которых нет в базе, в результате нет
+        """
+        parts = list(include) if include else list(self.NODE_BUNDLE_PARTS)
+        unknown = [part for part in parts if part not in self.NODE_BUNDLE_PARTS]
+        if unknown:
+            raise ValueError(f"Неизвестные части пакета: {', '.join(unknown)}")
+        if not node_ids:
+            return {}
+
+        columns = ",\n".join(f"{self.NODE_BUNDLE_PARTS[part]} AS {part}" for part in parts)
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT m.material_id, {columns}
+                FROM materials m
+                LEFT JOIN analytical_nodes an ON m.id = an.id
+                WHERE m.material_id = ANY(%s)
+            """, (list(node_ids),))
+            return {row[0]: dict(zip(parts, row[1:])) for row in cur.fetchall()}
+
+    def list_graph_edges(self) -> List[Dict]:
+        """Все рёбра графа с весами (для построения EdgeIndex)"""
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT me.id::text as edge_id, s.material_id as source_id, t.material_id as target_id,
+                       me.edge_type, me.weight, me.description, me.metadata
+                FROM material_edges me
+                JOIN materials s ON me.source_material_id = s.id
+                JOIN materials t ON me.target_material_id = t.id
+                ORDER BY me.created_at, me.id
+            """)
+            return fetch_rows(cur)
+
+    def get_graph_edges_stamp(self) -> Tuple[int, int]:
+        """Отметка изменения рёбер: количество и время последней вставки (мкс)"""
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*),
+                       COALESCE((EXTRACT(EPOCH FROM MAX(created_at)) * 1000000)::bigint, 0)
+                FROM material_edges
+            """)
+            count, last_created = cur.fetchone()
+            return int(count), int(last_created)
+
     def get_graph_overview(self) -> Dict:
         """Обзор Knowledge Graph"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             # Общая статистика
             cur.execute("""
                 SELECT
@@ -296,7 +512,7 @@ class DatabaseManager:
                         FILTER (WHERE category = 'ANALYTICAL_NODES') as total_backlinks
                 FROM materials
             """)
-            stats = dict(cur.fetchone())
+            stats = fetch_row(cur)
 
             # По слоям
             cur.execute("""
@@ -305,7 +521,7 @@ class DatabaseManager:
                 WHERE category = 'ANALYTICAL_NODES' AND layer IS NOT NULL
                 GROUP BY layer
             """)
-            by_layer = {row["layer"]: row["count"] for row in cur.fetchall()}
+            by_layer = dict(cur.fetchall())
 
             return {
                 "nodes_count": stats["nodes_count"],
@@ -314,6 +530,45 @@ class DatabaseManager:
                 "by_layer": by_layer
             }
 
+    def get_connectivity_cube(
+        self,
+        source_layer: Optional[str] = None,
+        target_layer: Optional[str] = None,
+        strength: Optional[str] = None,
+        relationship: Optional[str] = None
+    ) -> List[Dict]:
+        """Ячейки куба связности слоёв (edge_connectivity_cube) по срезу"""
+        conn = self.connect()
+        with conn.cursor() as cur:
+            conditions = []
+            params = []
+            for column, value in (
+                ("source_layer", source_layer),
+                ("target_layer", target_layer),
+                ("strength", strength),
+                ("relationship", relationship),
+            ):
+                if value is not None:
+                    conditions.append(f"{column} = %s")
+                    params.append(value)
+
+            where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+            try:
+                cur.execute(f"""
+                    SELECT source_layer, target_layer, strength, relationship,
+                           edges_count, weight_sum
+                    FROM edge_connectivity_cube
+                    WHERE {where_clause}
+                    ORDER BY edges_count DESC
+                """, params)
+            except Exception:
+                # Без миграции 003 таблицы нет: соединение не должно остаться в прерванной транзакции
+                conn.rollback()
+                raise
+
+            return fetch_rows(cur)
+
     # ==========================================
     # STATISTICS
     # ==========================================
@@ -321,16 +576,16 @@ class DatabaseManager:
     def get_statistics(self) -> Dict:
         """Общая статистика базы"""
         conn = self.connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute("""
                 SELECT * FROM v_category_stats
             """)
-            by_category = {row["category"]: dict(row) for row in cur.fetchall()}
+            by_category = {row["category"]: row for row in fetch_rows(cur)}
 
             cur.execute("""
                 SELECT COUNT(*) as total FROM materials
             """)
-            total = cur.fetchone()["total"]
+            total = cur.fetchone()[0]
 
             return {
                 "total_materials": total,
@@ -338,6 +593,171 @@ class DatabaseManager:
                 "timestamp": datetime.now().isoformat()
             }
 
+    def get_integrity_keys(self) -> Dict[str, List[Tuple]]:
+        """
+        Наборы ключей для проверки целостности (один запрос на таблицу)
+
+        Returns:
+            materials: (material_id, file_hash, status)
+            source_node_mapping: (source_id, node_id)
+            edges: (source_id, target_id)
+            backlinks: (target_id, source_id)
+        """
+        queries = {
+            "materials": """
+                SELECT material_id, file_hash, status::text FROM materials
+            """,
+            "source_node_mapping": """
+                SELECT s.material_id, n.material_id
+                FROM source_node_mapping snm
+                JOIN materials s ON snm.source_id = s.id
+                JOIN materials n ON snm.node_id = n.id
+            """,
+            "edges": """
+                SELECT s.material_id, t.material_id
+                FROM material_edges me
+                JOIN materials s ON me.source_material_id = s.id
+                JOIN materials t ON me.target_material_id = t.id
+            """,
+            "backlinks": """
+                SELECT t.material_id, s.material_id
+                FROM backlinks b
+                JOIN materials t ON b.target_node_id = t.id
+                JOIN materials s ON b.source_node_id = s.id
+            """,
+        }
+        conn = self.connect()
+        keys = {}
+        with conn.cursor() as cur:
+            for name, query in queries.items():
+                cur.execute(query)
+                keys[name] = cur.fetchall()
+        return keys
+
+    # ==========================================
+    # SOURCE EXTRACTION
+    # ==========================================
+
+    def store_source_extractions(self, documents: List[Dict]) -> int:
+        """
+        Запись извлечённого текста первоисточников одной транзакцией
+
+        Args:
+            documents: Записи pipeline.extraction (material_id, format, text, metadata, ...)
+
+        Returns:
+            Количество записанных документов
+        """
+        conn = self.connect()
+        written = 0
+        try:
+            with conn.cursor() as cur:
+                for doc in documents:
+                    metadata = doc.get("metadata", {})
+                    cur.execute("""
+                        INSERT INTO source_documents
+                        (id, document_number, author, organization, page_count,
+                         original_format, extracted_text, extraction_date)
+                        SELECT m.id, %s, %s, %s, %s, %s, %s, NOW()
+                        FROM materials m
+                        WHERE m.material_id = %s
+                        ON CONFLICT (id) DO UPDATE SET
+                            document_number = COALESCE(EXCLUDED.document_number, source_documents.document_number),
+                            author = COALESCE(EXCLUDED.author, source_documents.author),
+                            organization = COALESCE(EXCLUDED.organization, source_documents.organization),
+                            page_count = COALESCE(EXCLUDED.page_count, source_documents.page_count),
+                            original_format = EXCLUDED.original_format,
+                            extracted_text = EXCLUDED.extracted_text,
+                            extraction_date = EXCLUDED.extraction_date
+                    """, (
+                        doc.get("document_number"),
+                        metadata.get("author"),
+                        metadata.get("organization"),
+                        metadata.get("pages"),
+                        doc["format"],
+                        doc["text"],
+                        doc["material_id"]
+                    ))
+                    if cur.rowcount == 0:
+                        continue
+
+                    cur.execute("""
+                        DELETE FROM search_index
+                        WHERE material_id = (SELECT id FROM materials WHERE material_id = %s)
+                    """, (doc["material_id"],))
+                    cur.execute("""
+                        INSERT INTO search_index (material_id, content_text, category, layer, tags)
+                        SELECT m.id, %s, m.category, m.layer, m.tags
+                        FROM materials m
+                        WHERE m.material_id = %s
+                    """, (doc["text"], doc["material_id"]))
+                    written += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return written
+
+    # ==========================================
+    # MATERIAL VERSIONS
+    # ==========================================
+
+    def record_material_version(
+        self,
+        material_id: str,
+        version: str,
+        snapshot_path: str,
+        snapshot_hash: str,
+        changes_description: Optional[str] = None,
+        created_by: str = "system"
+    ) -> Optional[str]:
+        """Запись версии материала (повторная запись той же версии обновляет снимок)"""
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO material_versions
+                (material_id, version, snapshot_path, snapshot_hash, changes_description, created_by)
+                SELECT m.id, %s, %s, %s, %s, %s
+                FROM materials m
+                WHERE m.material_id = %s
+                ON CONFLICT (material_id, version) DO UPDATE SET
+                    snapshot_path = EXCLUDED.snapshot_path,
+                    snapshot_hash = EXCLUDED.snapshot_hash,
+                    changes_description = EXCLUDED.changes_description,
+                    version_date = NOW()
+                RETURNING id
+            """, (version, snapshot_path, snapshot_hash, changes_description, created_by, material_id))
+            row = cur.fetchone()
+            conn.commit()
+            return str(row[0]) if row else None
+
+    def list_material_versions(self, material_id: str) -> List[Dict]:
+        """История версий материала (новые первыми)"""
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT mv.version, mv.version_date, mv.snapshot_path, mv.snapshot_hash,
+                       mv.changes_description, mv.created_by
+                FROM material_versions mv
+                JOIN materials m ON mv.material_id = m.id
+                WHERE m.material_id = %s
+                ORDER BY mv.version_date DESC
+            """, (material_id,))
+            return fetch_rows(cur)
+
+    def get_material_version(self, material_id: str, version: str) -> Optional[Dict]:
+        """Одна версия материала"""
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT mv.version, mv.version_date, mv.snapshot_path, mv.snapshot_hash,
+                       mv.changes_description, mv.created_by
+                FROM material_versions mv
+                JOIN materials m ON mv.material_id = m.id
+                WHERE m.material_id = %s AND mv.version = %s
+            """, (material_id, version))
+            return fetch_row(cur)
+
     # ==========================================
     # AGENT OPERATIONS LOG
     # ==========================================
@@ -366,9 +786,9 @@ class DatabaseManager:
             """, (
                 agent_id,
                 operation,
-                json.dumps(params),
+                dumps_text(params),
                 status,
-                json.dumps(result) if result else None,
+                dumps_text(result) if result else None,
                 error,
                 affected_materials,
                 session_id
@@ -376,6 +796,105 @@ class DatabaseManager:
             conn.commit()
             return cur.fetchone()[0]
 
+    def log_operations_batch(self, agent_id: str, operations: List[Dict]) -> int:
+        """
+        Пакетная запись операций (выгрузка истории сессий)
 
-# Глобальный экземпляр менеджера
-db_manager = DatabaseManager()
+        Args:
+            agent_id: ID агента
+            operations: Словари operation, params, status, started_at, duration_ms, session_id
+        """
+        rows = [
+            (
+                agent_id,
+                op["operation"],
+                json.dumps(op.get("params") or {}, ensure_ascii=False),
+                op.get("status") or "unknown",
+                op.get("started_at"),
+                op.get("duration_ms"),
+                _session_uuid(op.get("session_id")),
+                json.dumps({"session_id": op.get("session_id")}),
+            )
+            for op in operations
+        ]
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                _extras().execute_values(cur, """
+                    INSERT INTO agent_operations
+                    (agent_id, operation, params, status, started_at, duration_ms,
+                     session_id, request_context)
+                    VALUES %s
+                """, rows, template="(%s, %s, %s, %s, COALESCE(%s::timestamptz, NOW()), %s, %s, %s)")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    def append_session_materials(
+        self,
+        agent_id: str,
+        session_id: str,
+        started_at: datetime,
+        material_ids: List[str]
+    ):
+        """Дописать вытесненные из памяти материалы в agent_sessions.session_context"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO agent_sessions (id, agent_id, started_at, session_context)
+                    VALUES (%s, %s, %s, jsonb_build_object(
+                        'session_id', %s::text, 'spilled_materials', %s::jsonb))
+                    ON CONFLICT (id) DO UPDATE SET session_context = jsonb_set(
+                        COALESCE(agent_sessions.session_context, '{}'::jsonb),
+                        '{spilled_materials}',
+                        COALESCE(agent_sessions.session_context->'spilled_materials', '[]'::jsonb)
+                            || EXCLUDED.session_context->'spilled_materials'
+                    )
+                """, (
+                    _session_uuid(session_id),
+                    agent_id,
+                    started_at,
+                    session_id,
+                    json.dumps(material_ids, ensure_ascii=False),
+                ))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# Каждый запрос к БД — span в database.metrics (ожидание соединения, SQL, строки)
+DB_OPERATIONS = (
+    "get_material", "list_materials", "search_materials", "semantic_search",
+    "get_source_chain", "get_node_sources", "get_node_edges", "get_node_bundle", "list_graph_edges",
+    "get_graph_overview", "get_connectivity_cube", "get_statistics", "get_integrity_keys",
+    "store_source_extractions", "record_material_version", "list_material_versions",
+    "get_material_version", "log_operation", "log_operations_batch", "append_session_materials",
+)
+instrument_methods(DatabaseManager, "db", DB_OPERATIONS, sql=True)
+
+
+def _session_uuid(session_id: Optional[str]) -> Optional[str]:
+    """UUID сессии для колонок типа UUID; произвольные ID (batch-1, request id) — детерминированный uuid5"""
+    if not session_id:
+        return None
+    try:
+        return str(uuid.UUID(session_id))
+    except ValueError:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, session_id))
+
+
+# Глобальный экземпляр менеджера создаётся при первом обращении
+_db_manager: Optional[DatabaseManager] = None
+
+
+def __getattr__(name: str):
+    global _db_manager
+    if name == "db_manager":
+        if _db_manager is None:
+            _db_manager = DatabaseManager()
+        return _db_manager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,167 @@
+"""
+Result Rows
+Строки результатов DatabaseManager и сериализация в JSON
+
+Строка результата — кортеж значений, полученный от курсора без
+копирования, и общая для всех строк запроса схема (имя колонки → позиция).
+Row ведёт себя как неизменяемый словарь (row["title"], row.get, dict(row)),
+но не хранит собственную хеш-таблицу ключей: страница из сотен строк
+занимает в несколько раз меньше памяти, чем список dict.
+
+dumps кодирует результаты операций сразу в JSON-байты. При установленном
+orjson UUID, datetime, dataclass и numpy-массивы (embedding) кодируются
+им нативно, иначе — через стандартный json с тем же набором типов.
+Decimal (NUMERIC) кодируется числом, Enum — значением, Row — объектом.
+"""
+import json
+import threading
+from collections.abc import Mapping
+from dataclasses import asdict, is_dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ==========================================
+# СТРОКИ
+# ==========================================
+
+# Набор колонок → схема; запросы с одинаковыми колонками делят одну схему
+_SCHEMAS: Dict[Tuple[str, ...], Dict[str, int]] = {}
+_SCHEMAS_LOCK = threading.Lock()
+
+
+def schema_for(columns: Tuple[str, ...]) -> Dict[str, int]:
+    """Общая схема строк для набора колонок"""
+    schema = _SCHEMAS.get(columns)
+    if schema is None:
+        with _SCHEMAS_LOCK:
+            schema = _SCHEMAS.setdefault(columns, {name: i for i, name in enumerate(columns)})
+    return schema
+
+
+class Row(Mapping):
+    """Строка результата: кортеж значений и общая схема колонок"""
+
+    __slots__ = ("_schema", "_values")
+
+    def __init__(self, schema: Dict[str, int], values: tuple):
+        self._schema = schema
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._schema[key]]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        index = self._schema.get(key)
+        return default if index is None else self._values[index]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._schema
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._schema)
+
+    def __len__(self) -> int:
+        return len(self._schema)
+
+    def keys(self):
+        return self._schema.keys()
+
+    def values(self) -> tuple:
+        return self._values
+
+    def items(self):
+        return zip(self._schema, self._values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._schema, self._values))
+
+    def __repr__(self) -> str:
+        return f"Row({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # Pickle (снимки, spill сессий) — как обычный словарь
+        return (dict, (self.to_dict(),))
+
+
+def fetch_rows(cur) -> List[Row]:
+    """Все строки курсора в виде Row (курсор — обычный, не RealDictCursor)"""
+    rows = cur.fetchall()
+    if not rows:
+        return []
+    schema = schema_for(tuple(column[0] for column in cur.description))
+    return [Row(schema, values) for values in rows]
+
+
+def fetch_row(cur) -> Optional[Row]:
+    """Следующая строка курсора в виде Row (None, если строк нет)"""
+    values = cur.fetchone()
+    if values is None:
+        return None
+    return Row(schema_for(tuple(column[0] for column in cur.description)), values)
+
+
+# ==========================================
+# JSON
+# ==========================================
+
+# Точный тип → преобразование (быстрее цепочки isinstance на каждом значении)
+_CONVERTERS = {
+    Row: Row.to_dict,
+    Decimal: float,
+    UUID: str,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+    set: list,
+    frozenset: list,
+}
+
+
+def _default(value: Any) -> Any:
+    """Типы, которые не кодируются напрямую"""
+    convert = _CONVERTERS.get(type(value))
+    if convert is not None:
+        return convert(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if is_dataclass(value) and not isinstance(value, type):
+        return asdict(value)
+    if hasattr(value, "tolist"):
+        # numpy-массивы (embedding из pgvector)
+        return value.tolist()
+    # Прочие объекты (Path, ...) — строкой, как раньше с default=str
+    return str(value)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(value: Any, indent: bool = False) -> bytes:
+        """JSON-байты (UTF-8); indent — отступ 2 пробела"""
+        return orjson.dumps(value, default=_default, option=(_OPTIONS | orjson.OPT_INDENT_2) if indent else _OPTIONS)
+else:
+    _COMPACT = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+    _INDENTED = json.JSONEncoder(ensure_ascii=False, indent=2, default=_default)
+
+    def dumps(value: Any, indent: bool = False) -> bytes:
+        """JSON-байты (UTF-8); indent — отступ 2 пробела"""
+        return (_INDENTED if indent else _COMPACT).encode(value).encode("utf-8")
+
+
+def dumps_text(value: Any, indent: bool = False) -> str:
+    """JSON-строка (для текстовых файлов и колонок)"""
+    return dumps(value, indent).decode("utf-8")
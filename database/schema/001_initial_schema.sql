@@ -151,7 +151,8 @@ CREATE TABLE material_edges (
     source_material_id UUID NOT NULL REFERENCES materials(id) ON DELETE CASCADE,
     target_material_id UUID NOT NULL REFERENCES materials(id) ON DELETE CASCADE,
     edge_type edge_type NOT NULL,
-    weight DECIMAL(5,4) DEFAULT 1.0,
+    -- NULL — вес по метке силы связи (agent.graph_paths.edge_weight)
+    weight DECIMAL(5,4),
     description TEXT,
     metadata JSONB DEFAULT '{}',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
@@ -0,0 +1,121 @@
+-- ============================================
+-- Portal_DTwins Connectivity Cube
+-- Агрегат связности слоёв, обновляемый триггерами material_edges
+-- ============================================
+
+-- (source_layer, target_layer, strength, relationship) → count, weight_sum
+CREATE TABLE IF NOT EXISTS edge_connectivity_cube (
+    source_layer VARCHAR(50) NOT NULL DEFAULT 'unknown',
+    target_layer VARCHAR(50) NOT NULL DEFAULT 'unknown',
+    strength VARCHAR(20) NOT NULL DEFAULT '',
+    relationship VARCHAR(100) NOT NULL,
+    edges_count INTEGER NOT NULL DEFAULT 0,
+    weight_sum DECIMAL(14,4) NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (source_layer, target_layer, strength, relationship)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cube_layers ON edge_connectivity_cube(source_layer, target_layer);
+CREATE INDEX IF NOT EXISTS idx_cube_strength ON edge_connectivity_cube(strength);
+
+-- Вес ребра без значения по умолчанию: NULL означает «по метке силы»
+-- (прежний DEFAULT 1.0 делал ветку метки силы недостижимой)
+ALTER TABLE material_edges ALTER COLUMN weight DROP DEFAULT;
+
+-- Вес ребра: явный weight или значение по метке силы
+-- (то же правило, что agent.graph_paths.edge_weight для in-memory куба и путей)
+CREATE OR REPLACE FUNCTION connectivity_edge_weight(p_weight DECIMAL, p_metadata JSONB)
+RETURNS DECIMAL AS $$
+    SELECT CASE
+        WHEN p_weight > 0 THEN p_weight
+        ELSE CASE p_metadata->>'strength'
+            WHEN 'CRITICAL' THEN 1.0
+            WHEN 'STRONG' THEN 0.8
+            WHEN 'MEDIUM' THEN 0.5
+            WHEN 'MODERATE' THEN 0.4
+            WHEN 'WEAK' THEN 0.2
+            ELSE 0.3
+        END
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Применение дельты к ячейке куба
+CREATE OR REPLACE FUNCTION apply_connectivity_delta(
+    p_source UUID, p_target UUID, p_edge_type edge_type, p_weight DECIMAL,
+    p_metadata JSONB, p_delta INTEGER
+) RETURNS VOID AS $$
+DECLARE
+    v_source_layer VARCHAR(50);
+    v_target_layer VARCHAR(50);
+    v_strength VARCHAR(20) := COALESCE(p_metadata->>'strength', '');
+    v_relationship VARCHAR(100) := COALESCE(p_metadata->>'relationship', p_edge_type::text);
+BEGIN
+    SELECT COALESCE(layer::text, 'unknown') INTO v_source_layer FROM materials WHERE id = p_source;
+    SELECT COALESCE(layer::text, 'unknown') INTO v_target_layer FROM materials WHERE id = p_target;
+    v_source_layer := COALESCE(v_source_layer, 'unknown');
+    v_target_layer := COALESCE(v_target_layer, 'unknown');
+
+    INSERT INTO edge_connectivity_cube AS c
+        (source_layer, target_layer, strength, relationship, edges_count, weight_sum)
+    VALUES
+        (v_source_layer, v_target_layer, v_strength, v_relationship, p_delta,
+         p_delta * connectivity_edge_weight(p_weight, p_metadata))
+    ON CONFLICT (source_layer, target_layer, strength, relationship) DO UPDATE
+        SET edges_count = c.edges_count + EXCLUDED.edges_count,
+            weight_sum = c.weight_sum + EXCLUDED.weight_sum;
+
+    DELETE FROM edge_connectivity_cube
+    WHERE source_layer = v_source_layer AND target_layer = v_target_layer
+      AND strength = v_strength AND relationship = v_relationship
+      AND edges_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_connectivity_cube()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        PERFORM apply_connectivity_delta(
+            OLD.source_material_id, OLD.target_material_id, OLD.edge_type, OLD.weight, OLD.metadata, -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_connectivity_delta(
+            NEW.source_material_id, NEW.target_material_id, NEW.edge_type, NEW.weight, NEW.metadata, 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_connectivity_cube ON material_edges;
+CREATE TRIGGER trigger_connectivity_cube
+    AFTER INSERT OR DELETE OR UPDATE OF source_material_id, target_material_id, edge_type, weight, metadata
+    ON material_edges
+    FOR EACH ROW
+    EXECUTE FUNCTION update_connectivity_cube();
+
+-- Полная пересборка (после каскадных удалений материалов или смены слоя)
+CREATE OR REPLACE FUNCTION rebuild_connectivity_cube()
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM edge_connectivity_cube;
+    INSERT INTO edge_connectivity_cube
+        (source_layer, target_layer, strength, relationship, edges_count, weight_sum)
+    SELECT
+        COALESCE(sm.layer::text, 'unknown'),
+        COALESCE(tm.layer::text, 'unknown'),
+        COALESCE(me.metadata->>'strength', ''),
+        COALESCE(me.metadata->>'relationship', me.edge_type::text),
+        COUNT(*),
+        SUM(connectivity_edge_weight(me.weight, me.metadata))
+    FROM material_edges me
+    JOIN materials sm ON me.source_material_id = sm.id
+    JOIN materials tm ON me.target_material_id = tm.id
+    GROUP BY 1, 2, 3, 4;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_connectivity_cube();
+
+COMMENT ON TABLE edge_connectivity_cube IS 'Куб связности слоёв: (source_layer, target_layer, strength, relationship) → count, weight_sum';
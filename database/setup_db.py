@@ -19,10 +19,14 @@ import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 from database.config import DatabaseConfig
+from database.sync import print_changes, sync
 
 # Перезагружаем конфигурацию после загрузки .env
 db_config = DatabaseConfig.from_env()
 
+# Базовая схема (не идемпотентна); последующие миграции можно применять повторно
+BASELINE_SCHEMA = "001_initial_schema.sql"
+
 
 def create_database():
     """Создание базы данных portal_dtwins"""
@@ -55,17 +59,9 @@ def create_database():
     conn.close()
 
 
-def run_schema():
-    """Выполнение схемы базы данных"""
-    print("📋 Применение схемы...")
-
-    schema_file = PROJECT_ROOT / "database" / "schema" / "001_initial_schema.sql"
-
-    if not schema_file.exists():
-        print(f"   ❌ Файл схемы не найден: {schema_file}")
-        return False
-
-    conn = psycopg2.connect(
+def connect():
+    """Соединение с базой portal_dtwins (одно на все шаги инициализации)"""
+    return psycopg2.connect(
         host=db_config.host,
         port=db_config.port,
         database=db_config.database,
@@ -73,9 +69,36 @@ def run_schema():
         password=db_config.password,
     )
 
+
+def schema_exists(conn) -> bool:
+    """Применена ли схема (таблица materials существует)"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.materials') IS NOT NULL")
+        return cur.fetchone()[0]
+
+
+def run_schema(conn, migrations_only: bool = False):
+    """
+    Выполнение схемы базы данных (все миграции database/schema/ по порядку)
+
+    Args:
+        migrations_only: Существующая БД — все файлы, кроме базовой схемы
+    """
+    print("📋 Применение схемы...")
+
+    schema_files = sorted((PROJECT_ROOT / "database" / "schema").glob("*.sql"))
+
+    if not schema_files:
+        print("   ❌ Файлы схемы не найдены в database/schema/")
+        return False
+    if migrations_only:
+        schema_files = [f for f in schema_files if f.name != BASELINE_SCHEMA]
+
     try:
         with conn.cursor() as cur:
-            cur.execute(schema_file.read_text())
+            for schema_file in schema_files:
+                cur.execute(schema_file.read_text())
+                print(f"   • {schema_file.name}")
         conn.commit()
         print("   ✅ Схема применена успешно")
         return True
@@ -83,11 +106,9 @@ def run_schema():
         conn.rollback()
         print(f"   ❌ Ошибка при применении схемы: {e}")
         return False
-    finally:
-        conn.close()
 
 
-def run_seeds():
+def run_seeds(conn):
     """Загрузка начальных данных"""
     print("🌱 Загрузка начальных данных...")
 
@@ -97,14 +118,6 @@ def run_seeds():
         print(f"   ❌ Файл seeds не найден: {seed_file}")
         return False
 
-    conn = psycopg2.connect(
-        host=db_config.host,
-        port=db_config.port,
-        database=db_config.database,
-        user=db_config.user,
-        password=db_config.password,
-    )
-
     try:
         with conn.cursor() as cur:
             cur.execute(seed_file.read_text())
@@ -115,22 +128,12 @@ def run_seeds():
         conn.rollback()
         print(f"   ❌ Ошибка при загрузке данных: {e}")
         return False
-    finally:
-        conn.close()
 
 
-def verify_data():
+def verify_data(conn):
     """Проверка загруженных данных"""
     print("🔍 Проверка данных...")
 
-    conn = psycopg2.connect(
-        host=db_config.host,
-        port=db_config.port,
-        database=db_config.database,
-        user=db_config.user,
-        password=db_config.password,
-    )
-
     with conn.cursor() as cur:
         # Материалы
         cur.execute("SELECT COUNT(*) FROM materials")
@@ -153,8 +156,6 @@ def verify_data():
         cur.execute("SELECT COUNT(*) FROM source_node_mapping")
         mappings_count = cur.fetchone()[0]
 
-    conn.close()
-
     print(f"\n📊 Статистика базы данных:")
     print(f"   • Всего материалов: {materials_count}")
     print(f"   • Аналитических узлов: {nodes_count}")
@@ -178,15 +179,25 @@ def main():
 
     try:
         create_database()
-        if run_schema():
-            run_seeds()
-            verify_data()
-            print("\n" + "=" * 50)
-            print("✅ Инициализация завершена успешно!")
-            print("=" * 50)
-        else:
-            print("\n❌ Инициализация прервана из-за ошибок")
-            sys.exit(1)
+        conn = connect()
+        try:
+            if schema_exists(conn):
+                # Существующая БД: миграции после базовой схемы и изменения файлов, без повторного seed
+                print("   ℹ️  Схема уже применена — миграции и инкрементальная синхронизация")
+                if not run_schema(conn, migrations_only=True):
+                    print("\n❌ Инициализация прервана из-за ошибок")
+                    sys.exit(1)
+            elif not (run_schema(conn) and run_seeds(conn)):
+                print("\n❌ Инициализация прервана из-за ошибок")
+                sys.exit(1)
+            print("🔄 Синхронизация materials с файлами...")
+            print_changes(sync(conn))
+            verify_data(conn)
+        finally:
+            conn.close()
+        print("\n" + "=" * 50)
+        print("✅ Инициализация завершена успешно!")
+        print("=" * 50)
     except Exception as e:
         print(f"\n❌ Критическая ошибка: {e}")
         sys.exit(1)
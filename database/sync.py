@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Инкрементальная синхронизация файлов и таблицы materials
+
+Сравнивает файлы из gold_index.id_to_path с materials и применяет только
+изменения (вставки, обновления, архивацию) одной транзакцией — вместо
+полного повторного seed-а.
+
+Сравнение в два этапа:
+    1. размер и mtime (metadata->>'file_mtime_ns') — без чтения файла;
+    2. SHA-256 — только если размер/mtime отличаются или хэш в БД пуст.
+Файл с новым mtime, но прежним содержимым обновляет лишь отметку mtime.
+
+Использование:
+    python -m database.sync            # применить изменения
+    python -m database.sync --dry-run  # только показать набор изменений
+"""
+import argparse
+import hashlib
+import json
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional
+
+if TYPE_CHECKING:
+    import psycopg2
+
+PROJECT_ROOT = Path(__file__).parent.parent
+GOLD_INDEX_PATH = PROJECT_ROOT / "data" / "gold" / "gold_index.json"
+
+# Префикс ID → категория материала
+CATEGORY_BY_PREFIX = {
+    "SRC": "RAW_SOURCES",
+    "NODE": "ANALYTICAL_NODES",
+    "GRAPH": "KNOWLEDGE_GRAPH",
+    "SCHEMA": "SCHEMAS",
+    "IDX": "INDEXES",
+    "REG": "INDEXES",
+    "DOC": "DOCUMENTATION",
+    "GOLD": "GOLD",
+}
+
+MIME_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".pdf": "application/pdf",
+    ".json": "application/json",
+    ".md": "text/markdown",
+}
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class FileState:
+    """Состояние файла материала на диске"""
+    material_id: str
+    file_path: str          # путь из Gold Index (хранится в materials.file_path)
+    disk_path: Path         # фактический файл (имена первоисточников на диске искажены)
+    size: int
+    mtime_ns: int
+    _hash: Optional[str] = None
+
+    @property
+    def hash(self) -> str:
+        """SHA-256 (считается при первом обращении)"""
+        if self._hash is None:
+            digest = hashlib.sha256()
+            with open(self.disk_path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            self._hash = digest.hexdigest()
+        return self._hash
+
+    @property
+    def hashed(self) -> bool:
+        return self._hash is not None
+
+
+@dataclass
+class ChangeSet:
+    """Набор изменений materials"""
+    inserts: List[FileState] = field(default_factory=list)
+    updates: List[FileState] = field(default_factory=list)
+    touches: List[FileState] = field(default_factory=list)
+    archivals: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    hashed: int = 0
+    missing: List[str] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.inserts or self.updates or self.touches or self.archivals)
+
+    def summary(self) -> Dict:
+        return {
+            "inserts": [f.material_id for f in self.inserts],
+            "updates": [f.material_id for f in self.updates],
+            "touches": len(self.touches),
+            "archivals": self.archivals,
+            "unchanged": self.unchanged,
+            "hashed": self.hashed,
+            "missing": self.missing,
+        }
+
+
+# ==========================================
+# СОСТОЯНИЕ ФАЙЛОВ
+# ==========================================
+
+@lru_cache(maxsize=None)
+def _source_files(directory: Path) -> Dict[tuple, Optional[Path]]:
+    """Ключ первоисточника → файл каталога (каталог читается один раз за запуск)"""
+    from pipeline.extraction import source_key
+
+    files = {}
+    for candidate in sorted(directory.iterdir()):
+        if candidate.is_file():
+            key = source_key(candidate.name)
+            if key[0] is None and key in files:
+                # Без номера документа файл определяется только расширением — неоднозначно
+                files[key] = None
+            else:
+                files.setdefault(key, candidate)
+    return files
+
+
+def resolve_disk_path(material_id: str, path: Path) -> Optional[Path]:
+    """Файл на диске; для первоисточников — поиск по номеру документа/приложения"""
+    if path.exists():
+        return path
+    if not material_id.startswith("SRC-") or not path.parent.is_dir():
+        return None
+    from pipeline.extraction import source_key
+
+    # Файл без номера документа (хронология) — если он единственный с таким расширением
+    return _source_files(path.parent).get(source_key(path.name))
+
+
+def scan_files(gold_index: Mapping, root: Path = PROJECT_ROOT) -> Dict[str, Optional[FileState]]:
+    """
+    Состояние файлов из id_to_path (None — файл отсутствует на диске)
+    """
+    states: Dict[str, Optional[FileState]] = {}
+    for material_id, file_path in gold_index.get("id_to_path", {}).items():
+        disk_path = resolve_disk_path(material_id, root / file_path)
+        if disk_path is None:
+            states[material_id] = None
+            continue
+        stat = disk_path.stat()
+        states[material_id] = FileState(material_id, file_path, disk_path, stat.st_size, stat.st_mtime_ns)
+    return states
+
+
+def fetch_materials(conn: "psycopg2.extensions.connection") -> Dict[str, Dict]:
+    """Текущие записи materials (один запрос)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT material_id, file_path, file_size_bytes, file_hash,
+                   (metadata->>'file_mtime_ns')::BIGINT AS mtime_ns, status::text
+            FROM materials
+        """)
+        return {
+            row[0]: {
+                "file_path": row[1],
+                "size": row[2],
+                "hash": row[3],
+                "mtime_ns": row[4],
+                "status": row[5],
+            }
+            for row in cur.fetchall()
+        }
+
+
+# ==========================================
+# НАБОР ИЗМЕНЕНИЙ
+# ==========================================
+
+def compute_changes(files: Mapping[str, Optional[FileState]], rows: Mapping[str, Dict]) -> ChangeSet:
+    """
+    Сравнение файлов и записей materials
+
+    - insert: материал есть в Gold Index и на диске, но не в БД;
+    - update: изменились путь, размер или хэш (или материал был архивирован);
+    - touch: изменился только mtime, содержимое прежнее;
+    - archive: материала нет в Gold Index или его файл пропал с диска.
+    """
+    changes = ChangeSet()
+    for material_id, state in files.items():
+        if state is None:
+            changes.missing.append(material_id)
+            continue
+        row = rows.get(material_id)
+        if row is None:
+            state.hash
+            changes.inserts.append(state)
+        elif (row["status"] != "archived"
+              and row["file_path"] == state.file_path
+              and row["size"] == state.size
+              and row["mtime_ns"] == state.mtime_ns
+              and row["hash"]):
+            changes.unchanged += 1
+        elif (row["status"] != "archived"
+              and row["file_path"] == state.file_path
+              and row["size"] == state.size
+              and row["hash"] == state.hash):
+            changes.touches.append(state)
+        else:
+            state.hash
+            changes.updates.append(state)
+
+    present = {material_id for material_id, state in files.items() if state is not None}
+    changes.archivals = sorted(
+        material_id for material_id, row in rows.items()
+        if material_id not in present and row["status"] != "archived"
+    )
+    changes.hashed = sum(1 for state in files.values() if state is not None and state.hashed)
+    return changes
+
+
+def _default_status(material_id: str) -> str:
+    return "immutable" if material_id.startswith("SRC-") else "production"
+
+
+def _layers(gold_index: Mapping) -> Dict[str, str]:
+    return {
+        node_id: layer
+        for layer, members in gold_index.get("layer_members", {}).items()
+        for node_id in members
+    }
+
+
+def apply_changes(conn: "psycopg2.extensions.connection", changes: ChangeSet, gold_index: Mapping):
+    """Применение набора изменений одной транзакцией"""
+    from psycopg2.extras import execute_values
+
+    layers = _layers(gold_index)
+    try:
+        with conn.cursor() as cur:
+            if changes.inserts:
+                execute_values(cur, """
+                    INSERT INTO materials
+                    (material_id, filename, title, category, status, layer, file_path,
+                     file_size_bytes, file_hash, mime_type, metadata, version_date)
+                    VALUES %s
+                """, [(
+                    state.material_id,
+                    Path(state.file_path).name,
+                    Path(state.file_path).stem,
+                    CATEGORY_BY_PREFIX.get(state.material_id.split("-", 1)[0], "ARCHIVE"),
+                    _default_status(state.material_id),
+                    layers.get(state.material_id),
+                    state.file_path,
+                    state.size,
+                    state.hash,
+                    MIME_TYPES.get(Path(state.file_path).suffix.lower(), "application/octet-stream"),
+                    json.dumps({"file_mtime_ns": state.mtime_ns}),
+                ) for state in changes.inserts],
+                    template="(%s, %s, %s, %s::material_category, %s::material_status, "
+                             "%s::layer_type, %s, %s, %s, %s, %s::jsonb, NOW())")
+
+            if changes.updates:
+                execute_values(cur, """
+                    UPDATE materials m SET
+                        file_path = v.file_path,
+                        filename = v.filename,
+                        file_size_bytes = v.size,
+                        file_hash = v.hash,
+                        status = CASE WHEN m.status = 'archived'
+                                      THEN v.status::material_status ELSE m.status END,
+                        archived_at = NULL,
+                        version_date = NOW(),
+                        metadata = COALESCE(m.metadata, '{}') || jsonb_build_object('file_mtime_ns', v.mtime_ns)
+                    FROM (VALUES %s) AS v(material_id, file_path, filename, size, hash, mtime_ns, status)
+                    WHERE m.material_id = v.material_id
+                """, [(
+                    state.material_id,
+                    state.file_path,
+                    Path(state.file_path).name,
+                    state.size,
+                    state.hash,
+                    state.mtime_ns,
+                    _default_status(state.material_id),
+                ) for state in changes.updates],
+                    template="(%s, %s, %s, %s::BIGINT, %s, %s::BIGINT, %s)")
+
+            if changes.touches:
+                execute_values(cur, """
+                    UPDATE materials m SET
+                        metadata = COALESCE(m.metadata, '{}') || jsonb_build_object('file_mtime_ns', v.mtime_ns)
+                    FROM (VALUES %s) AS v(material_id, mtime_ns)
+                    WHERE m.material_id = v.material_id
+                """, [(state.material_id, state.mtime_ns) for state in changes.touches],
+                    template="(%s, %s::BIGINT)")
+
+            if changes.archivals:
+                cur.execute("""
+                    UPDATE materials
+                    SET status = 'archived', archived_at = NOW()
+                    WHERE material_id = ANY(%s)
+                """, (changes.archivals,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# ==========================================
+# CLI
+# ==========================================
+
+def load_gold_index(path: Path = GOLD_INDEX_PATH) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sync(conn: "psycopg2.extensions.connection", dry_run: bool = False,
+         gold_index: Optional[Mapping] = None) -> ChangeSet:
+    """Вычисление и (если не dry_run) применение набора изменений"""
+    gold_index = gold_index if gold_index is not None else load_gold_index()
+    changes = compute_changes(scan_files(gold_index), fetch_materials(conn))
+    if not dry_run and not changes.is_empty:
+        apply_changes(conn, changes, gold_index)
+    return changes
+
+
+def print_changes(changes: ChangeSet, dry_run: bool = False):
+    print(f"\n📊 Набор изменений{' (dry-run)' if dry_run else ''}:")
+    print(f"   • Новых: {len(changes.inserts)}")
+    for state in changes.inserts:
+        print(f"      + {state.material_id}")
+    print(f"   • Изменённых: {len(changes.updates)}")
+    for state in changes.updates:
+        print(f"      ~ {state.material_id}")
+    print(f"   • Только mtime: {len(changes.touches)}")
+    print(f"   • В архив: {len(changes.archivals)}")
+    for material_id in changes.archivals:
+        print(f"      - {material_id}")
+    print(f"   • Без изменений: {changes.unchanged}")
+    print(f"   • Захэшировано файлов: {changes.hashed}")
+    if changes.missing:
+        print(f"\n⚠️  Файлы из Gold Index не найдены на диске: {', '.join(changes.missing)}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Инкрементальная синхронизация файлов и materials")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать набор изменений")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+    from database.operations import DatabaseManager
+
+    print("🔄 Синхронизация materials с файлами Gold Index...")
+    manager = DatabaseManager()
+    try:
+        changes = sync(manager.connect(), dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Ошибка синхронизации: {e}")
+        sys.exit(1)
+    finally:
+        manager.close()
+
+    print_changes(changes, dry_run=args.dry_run)
+    if changes.is_empty:
+        print("\n✅ База данных актуальна")
+    elif not args.dry_run:
+        print("\n✅ Изменения применены")
+
+
+if __name__ == "__main__":
+    main()
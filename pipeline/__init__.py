@@ -0,0 +1,9 @@
+"""
+Portal_DTwins Data Pipeline
+Пакетная обработка корпуса
+
+Модули запускаются как скрипты (python -m pipeline.<module>),
+поэтому пакет не импортирует их при загрузке.
+"""
+
+__version__ = "1.0.0"
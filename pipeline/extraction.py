@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Source Text Extraction
+Извлечение текста и метаданных из SOURCE_DOCUMENTS
+
+Файлы разбираются в пуле процессов; результат кэшируется по SHA-256
+содержимого, поэтому повторный прогон по неизменённому корпусу сводится
+к хэшированию. Формат определяется по содержимому, а не только по
+расширению: в корпусе встречаются .docx, сохранённые как текст, и .pdf,
+экспортированные постранично (zip с manifest.json и N.txt).
+
+Результат записывается в source_documents и search_index (--db).
+
+Использование:
+    python -m pipeline.extraction
+    python -m pipeline.extraction --db --workers 4
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+SOURCE_DIR = PROJECT_ROOT / "SOURCE_DOCUMENTS"
+GOLD_INDEX_PATH = PROJECT_ROOT / "data" / "gold" / "gold_index.json"
+CACHE_DIR = PROJECT_ROOT / "data" / "index" / ".extraction_cache"
+
+# Смена логики извлечения инвалидирует кэш
+EXTRACTOR_VERSION = 1
+
+SUPPORTED_FORMATS = ("docx", "pdf", "xlsx")
+
+_NS = {
+    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "cp": "http://schemas.openxmlformats.org/package/2006/metadata/core-properties",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+    "ep": "http://schemas.openxmlformats.org/officeDocument/2006/extended-properties",
+}
+
+_DOC_NUMBER_RE = re.compile(r"^(\d+)_\d{4}_\d{2}_")
+_ATTACHMENT_RE = re.compile(r"Приложение_(\d+)")
+
+
+class ExtractionError(Exception):
+    """Файл не удалось разобрать"""
+
+
+# ==========================================
+# ИЗВЛЕЧЕНИЕ ПО ФОРМАТАМ
+# ==========================================
+
+def _as_text(data: bytes) -> Optional[str]:
+    """Содержимое как UTF-8 текст (файлы, сохранённые без контейнера)"""
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def _open_zip(data: bytes) -> Optional[zipfile.ZipFile]:
+    if not data.startswith(b"PK"):
+        return None
+    try:
+        return zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        return None
+
+
+def _office_properties(archive: zipfile.ZipFile) -> Dict:
+    """docProps/core.xml и app.xml"""
+    properties = {}
+    names = set(archive.namelist())
+    if "docProps/core.xml" in names:
+        core = ElementTree.fromstring(archive.read("docProps/core.xml"))
+        for key, tag in (("title", "dc:title"), ("author", "dc:creator"),
+                         ("created", "dcterms:created"), ("modified", "dcterms:modified")):
+            element = core.find(tag, _NS)
+            if element is not None and element.text:
+                properties[key] = element.text
+    if "docProps/app.xml" in names:
+        app = ElementTree.fromstring(archive.read("docProps/app.xml"))
+        for key, tag in (("pages", "ep:Pages"), ("words", "ep:Words"), ("organization", "ep:Company")):
+            element = app.find(tag, _NS)
+            if element is not None and element.text:
+                properties[key] = int(element.text) if element.text.isdigit() else element.text
+    return properties
+
+
+def extract_docx(data: bytes) -> Tuple[str, Dict]:
+    archive = _open_zip(data)
+    if archive is None:
+        text = _as_text(data)
+        if text is None:
+            raise ExtractionError("Не OOXML и не текст")
+        return text, {"container": "text"}
+
+    if "word/document.xml" not in archive.namelist():
+        raise ExtractionError("В архиве нет word/document.xml")
+    root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = [
+        "".join(node.text or "" for node in paragraph.iter(f"{{{_NS['w']}}}t"))
+        for paragraph in root.iter(f"{{{_NS['w']}}}p")
+    ]
+    metadata = dict(_office_properties(archive), container="ooxml")
+    return "\n".join(p for p in paragraphs if p), metadata
+
+
+def extract_xlsx(data: bytes) -> Tuple[str, Dict]:
+    archive = _open_zip(data)
+    if archive is None:
+        raise ExtractionError("Не OOXML-архив")
+    names = set(archive.namelist())
+
+    shared: List[str] = []
+    if "xl/sharedStrings.xml" in names:
+        root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+        shared = [
+            "".join(t.text or "" for t in item.iter(f"{{{_NS['s']}}}t"))
+            for item in root.iter(f"{{{_NS['s']}}}si")
+        ]
+
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    sheet_names = [sheet.get("name") for sheet in workbook.iter(f"{{{_NS['s']}}}sheet")]
+    sheet_files = sorted(
+        (n for n in names if n.startswith("xl/worksheets/sheet") and n.endswith(".xml")),
+        key=lambda n: int(re.search(r"(\d+)\.xml$", n).group(1))
+    )
+
+    blocks = []
+    for i, sheet_file in enumerate(sheet_files):
+        root = ElementTree.fromstring(archive.read(sheet_file))
+        lines = []
+        for row in root.iter(f"{{{_NS['s']}}}row"):
+            cells = []
+            for cell in row.iter(f"{{{_NS['s']}}}c"):
+                value = cell.find("s:v", _NS)
+                inline = cell.find("s:is", _NS)
+                if cell.get("t") == "s" and value is not None:
+                    cells.append(shared[int(value.text)])
+                elif inline is not None:
+                    cells.append("".join(t.text or "" for t in inline.iter(f"{{{_NS['s']}}}t")))
+                elif value is not None and value.text:
+                    cells.append(value.text)
+            if cells:
+                lines.append("\t".join(cells))
+        title = sheet_names[i] if i < len(sheet_names) else sheet_file
+        blocks.append(f"## {title}\n" + "\n".join(lines))
+
+    metadata = dict(_office_properties(archive), container="ooxml", sheets=sheet_names)
+    return "\n\n".join(blocks), metadata
+
+
+def extract_pdf(data: bytes) -> Tuple[str, Dict]:
+    if data.startswith(b"%PDF"):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise ExtractionError("Для PDF нужен пакет pypdf")
+        reader = PdfReader(io.BytesIO(data))
+        pages = [page.extract_text() or "" for page in reader.pages]
+        info = reader.metadata or {}
+        metadata = {"container": "pdf", "pages": len(pages)}
+        if info.get("/Title"):
+            metadata["title"] = str(info["/Title"])
+        if info.get("/Author"):
+            metadata["author"] = str(info["/Author"])
+        return "\n\n".join(pages), metadata
+
+    # Постраничный экспорт: manifest.json + N.txt (+ изображения страниц)
+    archive = _open_zip(data)
+    if archive is None or "manifest.json" not in archive.namelist():
+        raise ExtractionError("Не PDF и не постраничный экспорт")
+    manifest = json.loads(archive.read("manifest.json"))
+    pages = [
+        archive.read(page["text"]["path"]).decode("utf-8")
+        for page in sorted(manifest.get("pages", []), key=lambda p: p.get("page_number", 0))
+        if page.get("text", {}).get("path")
+    ]
+    metadata = {"container": "page_export", "pages": manifest.get("num_pages", len(pages))}
+    return "\n\n".join(pages), metadata
+
+
+EXTRACTORS = {
+    "docx": extract_docx,
+    "pdf": extract_pdf,
+    "xlsx": extract_xlsx,
+}
+
+
+def _extract_file(path: str) -> Dict:
+    """Работа воркера: извлечение одного файла"""
+    started = time.perf_counter()
+    source = Path(path)
+    file_format = source.suffix.lower().lstrip(".")
+    data = source.read_bytes()
+    try:
+        text, metadata = EXTRACTORS[file_format](data)
+        error = None
+    except Exception as e:
+        text, metadata, error = "", {}, str(e)
+    return {
+        "path": path,
+        "format": file_format,
+        "text": text,
+        "metadata": metadata,
+        "error": error,
+        "seconds": time.perf_counter() - started
+    }
+
+
+# ==========================================
+# СОПОСТАВЛЕНИЕ С МАТЕРИАЛАМИ
+# ==========================================
+
+def source_key(filename: str) -> Tuple[Optional[int], Optional[int], str]:
+    """(номер документа, номер приложения, расширение) — устойчиво к искажённым именам"""
+    doc = _DOC_NUMBER_RE.match(filename)
+    attachment = _ATTACHMENT_RE.search(filename)
+    return (
+        int(doc.group(1)) if doc else None,
+        int(attachment.group(1)) if attachment else None,
+        Path(filename).suffix.lower()
+    )
+
+
+def source_material_ids() -> Dict[Tuple, str]:
+    """Ключ файла → SRC-* ID из Gold Index"""
+    with open(GOLD_INDEX_PATH, "r", encoding="utf-8") as f:
+        gold_index = json.load(f)
+    return {
+        source_key(Path(path).name): material_id
+        for material_id, path in gold_index.get("id_to_path", {}).items()
+        if material_id.startswith("SRC-")
+    }
+
+
+# ==========================================
+# КОНВЕЙЕР
+# ==========================================
+
+def _file_hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _cache_path(cache_dir: Path, digest: str) -> Path:
+    return cache_dir / f"{digest}.v{EXTRACTOR_VERSION}.json"
+
+
+def extract_sources(
+    paths: Optional[List[Path]] = None,
+    workers: Optional[int] = None,
+    cache_dir: Path = CACHE_DIR,
+    full: bool = False
+) -> Dict:
+    """
+    Извлечение текста из набора файлов
+
+    Returns:
+        {"documents": [...], "throughput": {format: {...}}, "unmatched": [...]}
+    """
+    if paths is None:
+        paths = sorted(
+            p for p in SOURCE_DIR.iterdir()
+            if p.suffix.lower().lstrip(".") in SUPPORTED_FORMATS
+        )
+    material_ids = source_material_ids()
+    throughput: Dict[str, Dict] = {
+        fmt: {"files": 0, "bytes": 0, "cached": 0, "extracted": 0, "errors": 0, "seconds": 0.0}
+        for fmt in SUPPORTED_FORMATS
+    }
+
+    documents: Dict[str, Dict] = {}
+    pending: List[str] = []
+    hashes: Dict[str, str] = {}
+    for path in paths:
+        digest = _file_hash(path)
+        hashes[str(path)] = digest
+        stats = throughput[path.suffix.lower().lstrip(".")]
+        stats["files"] += 1
+        stats["bytes"] += path.stat().st_size
+
+        cached = _cache_path(cache_dir, digest)
+        if not full and cached.exists():
+            with open(cached, "r", encoding="utf-8") as f:
+                documents[str(path)] = json.load(f)
+            stats["cached"] += 1
+        else:
+            pending.append(str(path))
+
+    if pending:
+        workers = workers or min(len(pending), os.cpu_count() or 1)
+        if workers == 1:
+            results = map(_extract_file, pending)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_extract_file, pending)
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            for result in results:
+                stats = throughput[result["format"]]
+                stats["seconds"] += result["seconds"]
+                if result["error"]:
+                    stats["errors"] += 1
+                    logger.warning(f"{Path(result['path']).name}: {result['error']}")
+                else:
+                    stats["extracted"] += 1
+                document = {
+                    "sha256": hashes[result["path"]],
+                    "format": result["format"],
+                    "text": result["text"],
+                    "metadata": result["metadata"],
+                    "error": result["error"],
+                    "extracted_at": datetime.now().isoformat()
+                }
+                documents[result["path"]] = document
+                if not result["error"]:
+                    cached = _cache_path(cache_dir, document["sha256"])
+                    tmp_path = cached.with_suffix(".tmp")
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(document, f, ensure_ascii=False)
+                    os.replace(tmp_path, cached)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    output = []
+    unmatched = []
+    for path, document in documents.items():
+        key = source_key(Path(path).name)
+        material_id = material_ids.get(key)
+        if material_id is None:
+            unmatched.append(Path(path).name)
+        output.append(dict(
+            document,
+            material_id=material_id,
+            filename=Path(path).name,
+            document_number=key[0],
+            attachment_number=key[1]
+        ))
+
+    for stats in throughput.values():
+        stats["mb_per_s"] = round(stats["bytes"] / 1e6 / stats["seconds"], 2) if stats["seconds"] else None
+        stats["seconds"] = round(stats["seconds"], 4)
+
+    return {
+        "documents": sorted(output, key=lambda d: d["filename"]),
+        "throughput": throughput,
+        "unmatched": unmatched
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    """Точка входа CLI"""
+    parser = argparse.ArgumentParser(description="Извлечение текста из SOURCE_DOCUMENTS")
+    parser.add_argument("paths", nargs="*", type=Path, help="Файлы (по умолчанию SOURCE_DOCUMENTS/*)")
+    parser.add_argument("--workers", type=int, default=None, help="Размер пула процессов")
+    parser.add_argument("--full", action="store_true", help="Игнорировать кэш")
+    parser.add_argument("--db", action="store_true", help="Записать в source_documents и search_index")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    result = extract_sources(args.paths or None, workers=args.workers, full=args.full)
+    elapsed = time.perf_counter() - started
+
+    print(f"📄 Документов: {len(result['documents'])} за {elapsed:.2f} с")
+    for fmt, stats in result["throughput"].items():
+        if not stats["files"]:
+            continue
+        speed = f"{stats['mb_per_s']} MB/s" if stats["mb_per_s"] else "—"
+        print(f"   • {fmt}: {stats['files']} файлов, {stats['bytes'] / 1024:.0f} KB, "
+              f"извлечено {stats['extracted']}, из кэша {stats['cached']}, "
+              f"ошибок {stats['errors']}, {speed}")
+    for name in result["unmatched"]:
+        print(f"   ⚠️  Нет SRC-* материала для {name}")
+
+    if args.db:
+        from database.operations import DatabaseManager
+        records = [d for d in result["documents"] if d["material_id"] and not d["error"]]
+        written = DatabaseManager().store_source_extractions(records)
+        print(f"💾 Записано в БД: {written}")
+
+    errors = sum(s["errors"] for s in result["throughput"].values())
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Integrity Check
+Сквозная проверка целостности: файлы, Gold Index, Master KB и база данных
+
+Один проход: файлы из id_to_path хэшируются в пуле потоков (узлы при
+этом же чтении разбираются для подсчёта обратных ссылок), наборы ключей
+БД забираются одним запросом на таблицу, всё сравнивается операциями
+над множествами. Заявленные значения (gold_index.quick_stats,
+master_knowledge_base.integrity_checks) проверяются по фактическим.
+
+Результат: data/index/integrity_report.json в формате integrity_checks
+(check / expected / actual / status).
+
+Использование:
+    python -m pipeline.integrity
+    python -m pipeline.integrity --db --workers 16
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+GOLD_INDEX_PATH = PROJECT_ROOT / "data" / "gold" / "gold_index.json"
+MASTER_KB_PATH = PROJECT_ROOT / "data" / "gold" / "master_knowledge_base.json"
+REPORT_PATH = PROJECT_ROOT / "data" / "index" / "integrity_report.json"
+
+# Каталоги, файлы которых считаются материалами (quick_stats.total_materials_files)
+MATERIAL_DIRS = ("SOURCE_DOCUMENTS", "data", "archive", "docs")
+
+# quick_stats → категория Gold Index
+CATEGORY_STATS = {
+    "raw_sources": "CAT-RAW",
+    "analytical_nodes": "CAT-NODES",
+    "knowledge_graph": "CAT-GRAPH",
+    "schemas": "CAT-SCHEMA",
+    "gold_files": "CAT-GOLD",
+}
+
+STATUS_PASS = "PASS"
+STATUS_FAIL = "FAIL"
+
+# Ограничение списков расхождений в отчёте
+MAX_DETAILS = 50
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class FileFacts:
+    """Результат чтения одного файла"""
+    material_id: str
+    path: Optional[Path]
+    sha256: Optional[str] = None
+    size: int = 0
+    node_id: Optional[str] = None                              # meta.node_id файла узла
+    referenced_by: List[str] = field(default_factory=list)   # from_node обратных ссылок
+    error: Optional[str] = None
+
+
+def _read_file(material_id: str, path: Optional[Path]) -> FileFacts:
+    """Хэш файла; для узлов — обратные ссылки из того же чтения"""
+    facts = FileFacts(material_id, path)
+    if path is None:
+        facts.error = "missing"
+        return facts
+    try:
+        digest = hashlib.sha256()
+        chunks = []
+        is_node = material_id.startswith("NODE-") and path.suffix == ".json"
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                facts.size += len(chunk)
+                if is_node:
+                    chunks.append(chunk)
+        facts.sha256 = digest.hexdigest()
+        if is_node:
+            meta = json.loads(b"".join(chunks)).get("meta", {})
+            facts.node_id = meta.get("node_id")
+            facts.referenced_by = [
+                link.get("from_node", "")
+                for link in meta.get("semantic_network", {}).get("referenced_by", [])
+            ]
+    except (OSError, ValueError) as e:
+        facts.error = str(e)
+    return facts
+
+
+class IntegrityReport:
+    """Накопитель результатов проверок"""
+
+    def __init__(self):
+        self.checks: List[Dict] = []
+
+    def add(self, check: str, expected: Any, actual: Any, details: Optional[Dict] = None,
+            passed: Optional[bool] = None) -> bool:
+        passed = expected == actual if passed is None else passed
+        entry = {
+            "check": check,
+            "expected": expected,
+            "actual": actual,
+            "status": STATUS_PASS if passed else STATUS_FAIL
+        }
+        if details:
+            entry["details"] = {
+                key: sorted(value)[:MAX_DETAILS] if isinstance(value, (set, frozenset, list)) else value
+                for key, value in details.items()
+                if value
+            }
+        self.checks.append(entry)
+        return passed
+
+    def compare_sets(self, check: str, expected: Set, actual: Set,
+                     expected_label: str = "expected", actual_label: str = "actual") -> bool:
+        """Сравнение множеств: в отчёт — мощности и симметричная разность"""
+        missing = expected - actual
+        extra = actual - expected
+        return self.add(check, len(expected), len(actual), {
+            f"only_in_{expected_label}": {_fmt(k) for k in missing},
+            f"only_in_{actual_label}": {_fmt(k) for k in extra},
+        }, passed=not missing and not extra)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for c in self.checks if c["status"] == STATUS_FAIL)
+
+
+def _fmt(key: Any) -> str:
+    return " → ".join(key) if isinstance(key, tuple) else str(key)
+
+
+def _pairs(mapping: Dict[str, Iterable[str]], reverse: bool = False) -> Set[Tuple[str, str]]:
+    pairs = set()
+    for key, values in mapping.items():
+        for value in ([values] if isinstance(values, str) else values):
+            pairs.add((value, key) if reverse else (key, value))
+    return pairs
+
+
+# ==========================================
+# ПРОВЕРКИ
+# ==========================================
+
+def _count_material_files(root: Path) -> int:
+    total = 0
+    for directory in MATERIAL_DIRS:
+        for dirpath, dirnames, filenames in os.walk(root / directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "__pycache__"]
+            total += sum(1 for name in filenames if not name.startswith("."))
+    return total
+
+
+def _check_files(report: IntegrityReport, facts: Dict[str, FileFacts], stats: Dict, root: Path):
+    missing = {mid for mid, f in facts.items() if f.error == "missing"}
+    unreadable = {f"{mid}: {f.error}" for mid, f in facts.items() if f.error and f.error != "missing"}
+    report.add("id_to_path_files_exist", 0, len(missing) + len(unreadable),
+               {"missing": missing, "unreadable": unreadable})
+
+    by_hash = defaultdict(set)
+    for mid, f in facts.items():
+        if f.sha256:
+            by_hash[f.sha256].add(mid)
+    duplicates = {", ".join(sorted(ids)) for ids in by_hash.values() if len(ids) > 1}
+    report.add("no_duplicate_content", 0, len(duplicates), {"duplicates": duplicates})
+
+    if "total_materials_files" in stats:
+        report.add("total_materials_files", stats["total_materials_files"], _count_material_files(root))
+
+
+def _check_gold(report: IntegrityReport, gold: Dict, facts: Dict[str, FileFacts], edges: List):
+    stats = gold.get("quick_stats", {})
+    id_to_path = gold.get("id_to_path", {})
+    categories = gold.get("category_members", {})
+
+    members = {mid for ids in categories.values() for mid in ids}
+    report.compare_sets("category_members_match_id_to_path", set(id_to_path), members,
+                        "id_to_path", "category_members")
+    for stat, category in CATEGORY_STATS.items():
+        if stat in stats:
+            report.add(f"quick_stats.{stat}", stats[stat], len(categories.get(category, [])))
+
+    # Трассировка источник → узел и обратная карта должны совпадать
+    source_pairs = _pairs(gold.get("source_to_node_quick", {}))
+    node_pairs = _pairs(gold.get("node_to_source_quick", {}), reverse=True)
+    report.compare_sets("source_to_node_matches_node_to_source", source_pairs, node_pairs,
+                        "source_to_node", "node_to_source")
+    if "source_node_mappings" in stats:
+        report.add("quick_stats.source_node_mappings", stats["source_node_mappings"], len(source_pairs))
+
+    # Рёбра графа
+    if "total_edges" in stats:
+        report.add("quick_stats.total_edges", stats["total_edges"], len(edges))
+    node_ids = {mid for mid in id_to_path if mid.startswith("NODE-")}
+    endpoints = {e.source for e in edges} | {e.target for e in edges}
+    report.add("edge_endpoints_known", 0, len(endpoints - node_ids),
+               {"unknown_nodes": endpoints - node_ids})
+
+    # Обратные ссылки: referenced_by узлов против backlinks_ranking
+    actual = {mid: len(f.referenced_by) for mid, f in facts.items() if mid.startswith("NODE-") and f.sha256}
+    if "total_backlinks" in stats:
+        report.add("quick_stats.total_backlinks", stats["total_backlinks"], sum(actual.values()))
+    ranking = {row["node"]: row["backlinks"] for row in gold.get("backlinks_ranking", [])}
+    mismatched = {f"{node}: {count} ≠ {actual.get(node, 0)}"
+                  for node, count in ranking.items() if actual.get(node, 0) != count}
+    report.add("backlinks_ranking_matches_nodes", 0, len(mismatched), {"mismatched": mismatched})
+
+
+def _check_master(report: IntegrityReport, master: Dict, gold: Dict, graph_version: Optional[str]):
+    """Повторное вычисление master_knowledge_base.integrity_checks"""
+    id_to_path = gold.get("id_to_path", {})
+    sources = {mid for mid in id_to_path if mid.startswith("SRC-")}
+    nodes = {mid for mid in id_to_path if mid.startswith("NODE-")}
+    source_to_node = gold.get("source_to_node_quick", {})
+    node_to_source = gold.get("node_to_source_quick", {})
+    evaluators = {
+        "raw_sources_count": lambda: len(sources),
+        "nodes_count": lambda: len(nodes),
+        "graph_version": lambda: f"v{int(float(graph_version))}" if graph_version else None,
+        "all_sources_have_derived_nodes": lambda: all(source_to_node.get(s) for s in sources),
+        "all_nodes_have_sources": lambda: all(node_to_source.get(n) for n in nodes),
+    }
+    for declared in master.get("integrity_checks", {}).get("checks", []):
+        evaluate = evaluators.get(declared["check"])
+        if evaluate is None:
+            report.add(f"master.{declared['check']}", declared.get("expected"), None,
+                       {"note": "проверка не реализована"}, passed=False)
+            continue
+        report.add(f"master.{declared['check']}", declared.get("expected"), evaluate())
+
+
+def _check_database(report: IntegrityReport, keys: Dict[str, List[Tuple]], gold: Dict,
+                    facts: Dict[str, FileFacts], edges: List):
+    stats = gold.get("quick_stats", {})
+    id_to_path = gold.get("id_to_path", {})
+    materials = {row[0]: row for row in keys["materials"]}
+    active = {mid for mid, row in materials.items() if row[2] != "archived"}
+
+    if "total_materials_db" in stats:
+        report.add("db.total_materials", stats["total_materials_db"], len(active))
+    report.compare_sets("db.materials_match_id_to_path", set(id_to_path), active, "id_to_path", "materials")
+
+    mismatched = {mid for mid, f in facts.items()
+                  if f.sha256 and mid in materials and materials[mid][1] and materials[mid][1] != f.sha256}
+    unhashed = {mid for mid in active if not materials[mid][1]}
+    report.add("db.file_hash_matches", 0, len(mismatched),
+               {"mismatched": mismatched, "not_hashed_in_db": unhashed})
+
+    report.compare_sets("db.source_node_mapping", _pairs(gold.get("source_to_node_quick", {})),
+                        set(keys["source_node_mapping"]), "gold_index", "db")
+    report.compare_sets("db.material_edges", {(e.source, e.target) for e in edges},
+                        set(keys["edges"]), "graph", "db")
+
+    # Узлы ссылаются друг на друга по meta.node_id, БД — по ID Gold Index
+    aliases = {f.node_id: mid for mid, f in facts.items() if f.node_id}
+    node_backlinks = {(mid, aliases.get(source, source))
+                      for mid, f in facts.items() for source in f.referenced_by if source}
+    report.compare_sets("db.backlinks", node_backlinks, set(keys["backlinks"]), "nodes", "db")
+
+
+# ==========================================
+# ЗАПУСК
+# ==========================================
+
+def check_integrity(
+    root: Path = PROJECT_ROOT,
+    db: bool = False,
+    workers: Optional[int] = None
+) -> Dict:
+    """
+    Полная проверка целостности
+
+    Args:
+        root: Корень проекта
+        db: Сверять с базой данных
+        workers: Потоков хэширования (по умолчанию min(32, os.cpu_count() * 4))
+
+    Returns:
+        Отчёт (meta / summary / checks)
+    """
+    from agent.graph_index import EdgeIndex
+    from database.sync import resolve_disk_path
+
+    started = datetime.now()
+    with open(root / GOLD_INDEX_PATH.relative_to(PROJECT_ROOT), "r", encoding="utf-8") as f:
+        gold = json.load(f)
+    master_path = root / MASTER_KB_PATH.relative_to(PROJECT_ROOT)
+    master = {}
+    if master_path.exists():
+        with open(master_path, "r", encoding="utf-8") as f:
+            master = json.load(f)
+
+    id_to_path = gold.get("id_to_path", {})
+    targets = [(mid, resolve_disk_path(mid, root / path)) for mid, path in id_to_path.items()]
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # БД опрашивается параллельно с хэшированием
+        keys_future = executor.submit(_fetch_db_keys) if db else None
+        facts = {f.material_id: f for f in executor.map(lambda t: _read_file(*t), targets)}
+        keys = keys_future.result() if keys_future else None
+
+    graph_path = id_to_path.get("GRAPH-V14")
+    edges, graph_version = [], None
+    if graph_path and facts.get("GRAPH-V14") and facts["GRAPH-V14"].sha256:
+        index = EdgeIndex.load(facts["GRAPH-V14"].path, gold_index=gold)
+        edges, graph_version = index.edges, index.version
+
+    report = IntegrityReport()
+    _check_files(report, facts, gold.get("quick_stats", {}), root)
+    _check_gold(report, gold, facts, edges)
+    if master:
+        _check_master(report, master, gold, graph_version)
+    if keys is not None:
+        _check_database(report, keys, gold, facts, edges)
+
+    elapsed = (datetime.now() - started).total_seconds()
+    return {
+        "meta": {
+            "title": "Отчёт проверки целостности",
+            "last_check": datetime.now().isoformat(timespec="seconds"),
+            "database": db
+        },
+        "summary": {
+            "status": "VALID" if not report.failed else "INVALID",
+            "checks": len(report.checks),
+            "passed": len(report.checks) - report.failed,
+            "failed": report.failed,
+            "files_hashed": sum(1 for f in facts.values() if f.sha256),
+            "bytes_hashed": sum(f.size for f in facts.values()),
+            "seconds": round(elapsed, 3)
+        },
+        "checks": report.checks
+    }
+
+
+def _fetch_db_keys() -> Dict[str, List[Tuple]]:
+    from database.operations import DatabaseManager
+
+    manager = DatabaseManager()
+    try:
+        return manager.get_integrity_keys()
+    finally:
+        manager.close()
+
+
+def write_report(report: Dict, report_path: Path = REPORT_PATH):
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Точка входа CLI"""
+    parser = argparse.ArgumentParser(description="Проверка целостности файлов, Gold Index и БД")
+    parser.add_argument("--db", action="store_true", help="Сверять с базой данных")
+    parser.add_argument("--workers", type=int, default=None, help="Потоков хэширования")
+    parser.add_argument("--report", type=Path, default=REPORT_PATH, help="Файл отчёта")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+    try:
+        report = check_integrity(db=args.db, workers=args.workers)
+    except Exception as e:
+        print(f"❌ Ошибка проверки: {e}")
+        sys.exit(1)
+    write_report(report, args.report)
+
+    summary = report["summary"]
+    print(f"🔍 Проверок: {summary['checks']} за {summary['seconds']:.2f} с "
+          f"({summary['files_hashed']} файлов, {summary['bytes_hashed'] / 1e6:.1f} МБ)")
+    print(f"   ✅ Пройдено: {summary['passed']}")
+    print(f"   ❌ Не пройдено: {summary['failed']}")
+    for check in report["checks"]:
+        if check["status"] == STATUS_FAIL:
+            print(f"\n   {check['check']}: ожидалось {check['expected']}, фактически {check['actual']}")
+            for key, values in check.get("details", {}).items():
+                shown = values[:5] if isinstance(values, list) else [values]
+                for value in shown:
+                    print(f"      • {key}: {value}")
+    print(f"\n💾 Отчёт: {args.report}")
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Analysis Normalization
+Нормализация сырых аналитических JSON в узлы data/nodes
+
+Файлы проходят три стадии:
+    1. ID — meta.node_id, приведение ID к id_convention.json
+       (legacy_mapping, EDGE-{NODE}-{NNN}, {DOMAIN}-{NNN});
+    2. перекрёстные ссылки — ссылки file.json#path переписываются
+       по карте ID целевого файла, пустые links_to → [];
+    3. обогащение — meta.layer, semantic_network (position_in_graph,
+       legacy_links, referenced_by) и курируемые поля уже
+       нормализованного узла (executive_summary, narrative_summary).
+
+Обратные ссылки требуют сведений обо всём корпусе, поэтому обработка
+идёт в два прохода по пулу процессов: сбор ID и ссылок, затем запись.
+Документы не передаются между процессами — каждый проход читает файл
+в воркере, в памяти одновременно только файлы, обрабатываемые пулом.
+
+Результат: узлы в data/nodes/ и отчёт о переименованиях
+data/index/normalization_report.json.
+
+Использование:
+    python -m pipeline.normalization --dry-run
+    python -m pipeline.normalization archive/new_batch/*.json --workers 8
+    python -m pipeline.normalization --force   # перезаписать существующие узлы
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+INPUT_DIR = PROJECT_ROOT / "archive" / "json_pre_normalization"
+NODES_DIR = PROJECT_ROOT / "data" / "nodes"
+ID_CONVENTION_PATH = PROJECT_ROOT / "data" / "schema" / "id_convention.json"
+GOLD_INDEX_PATH = PROJECT_ROOT / "data" / "gold" / "gold_index.json"
+REPORT_PATH = PROJECT_ROOT / "data" / "index" / "normalization_report.json"
+
+# Поля, которые дописываются вручную и переносятся из существующего узла
+CURATED_FIELDS = ("executive_summary", "narrative_summary")
+CURATED_NETWORK_FIELDS = ("primary_question", "layer")
+
+# Контейнеры ссылок: None → []
+REF_LIST_KEYS = ("links_to", "semantic_refs", "references")
+
+_REF_RE = re.compile(r"^([\w.-]+\.json)(?:#(.+))?$")
+_DOMAIN_ID_RE = re.compile(r"^([A-Za-z][A-Za-z0-9]*(?:-[A-Za-z][A-Za-z0-9]*)*)-(\d+)$")
+_EDGE_NUMBER_RE = re.compile(r"^EDGE-([A-Z0-9]+)-(\d{3})$")
+_FILE_DOMAIN_RE = re.compile(r"^psb_([a-z0-9]+)")
+_ID_KEYS = ("id", "edge_id")
+
+# Состояние воркера (заполняется _init_worker)
+_context: Dict[str, Any] = {}
+
+
+# ==========================================
+# ОБХОД ДОКУМЕНТА
+# ==========================================
+
+def _walk(value: Any, path: str = "") -> Iterator[Tuple[Any, Any, str, Any]]:
+    """(контейнер, ключ, путь, значение) для всех листьев и узлов документа"""
+    stack = [(value, path)]
+    while stack:
+        current, current_path = stack.pop()
+        if isinstance(current, dict):
+            items = [(k, v, f"{current_path}.{k}" if current_path else k) for k, v in current.items()]
+        elif isinstance(current, list):
+            items = [(i, v, f"{current_path}[{i}]") for i, v in enumerate(current)]
+        else:
+            continue
+        for key, child, child_path in items:
+            yield current, key, child_path, child
+        stack.extend((child, child_path) for _, child, child_path in reversed(items))
+
+
+def _ref_origin(path: str) -> str:
+    """Путь объекта, из которого сделана ссылка (без контейнера semantic_refs)"""
+    cut = path.find(".semantic_ref")
+    if cut != -1:
+        return path[:cut]
+    return re.sub(r"(\[\d+\])+$", "", path).rpartition(".")[0]
+
+
+# ==========================================
+# СТАДИЯ 1: ID
+# ==========================================
+
+def resolve_node_id(document: Dict, filename: str, file_nodes: Dict[str, str]) -> Tuple[str, str]:
+    """(NODE-ID, источник): meta → Gold Index → имя файла"""
+    meta = document.get("meta", {})
+    for source, value in (
+        ("meta.node_id", meta.get("node_id")),
+        ("semantic_network", meta.get("semantic_network", {}).get("position_in_graph")),
+        ("gold_index", file_nodes.get(filename)),
+    ):
+        if value:
+            return value, source
+    match = _FILE_DOMAIN_RE.match(filename)
+    domain = match.group(1) if match else Path(filename).stem
+    return f"NODE-{domain.upper()}", "filename"
+
+
+def rewrite_ids(document: Dict, node_id: str, legacy: Dict[str, str],
+                edge_pattern: "re.Pattern") -> Dict[str, str]:
+    """
+    Приведение ID к ID Convention (на месте)
+
+    Returns:
+        Карта переименований {старый ID: новый ID}
+    """
+    edge_prefix = node_id.split("-", 1)[1] if "-" in node_id else node_id
+    id_slots = [
+        (container, key, value) for container, key, _, value in _walk(document)
+        if key in _ID_KEYS and isinstance(value, str)
+    ]
+    next_edge = 1 + max(
+        (int(m.group(2)) for _, _, value in id_slots
+         for m in [_EDGE_NUMBER_RE.match(value)] if m and m.group(1) == edge_prefix),
+        default=0
+    )
+
+    renames: Dict[str, str] = {}
+    for container, key, value in id_slots:
+        if value in renames:
+            new = renames[value]
+        elif value in legacy:
+            new = legacy[value]
+        elif value.upper().startswith("EDGE-"):
+            if edge_pattern.match(value):
+                continue
+            new = f"EDGE-{edge_prefix}-{next_edge:03d}"
+            next_edge += 1
+        else:
+            match = _DOMAIN_ID_RE.match(value)
+            if not match:
+                continue
+            new = f"{match.group(1).upper()}-{int(match.group(2)):03d}"
+        if new != value:
+            renames[value] = new
+            container[key] = new
+    return renames
+
+
+def _prepare(path: str) -> Tuple[Dict, str, str, Dict[str, str]]:
+    """Чтение и стадия 1 (одинакова в обоих проходах)"""
+    with open(path, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    filename = Path(path).name
+    node_id, source = resolve_node_id(document, filename, _context["file_nodes"])
+    renames = rewrite_ids(document, node_id, _context["legacy"], _context["edge_pattern"])
+    return document, node_id, source, renames
+
+
+def _outgoing(document: Dict, filename: str) -> Dict[str, List]:
+    """Исходящие ссылки документа: точные (file.json#path) и зависимости узла"""
+    refs = []
+    for _, key, path, value in _walk(document):
+        if path.startswith("meta.") or not isinstance(value, str):
+            continue
+        match = _REF_RE.match(value)
+        if match and match.group(2) and match.group(1) != filename:
+            refs.append((match.group(1), _ref_origin(path), value))
+    dependencies = [
+        (dep["file"], dep.get("relationship"), dep.get("description"))
+        for dep in document.get("meta", {}).get("semantic_network", {}).get("primary_dependencies", [])
+        if isinstance(dep, dict) and dep.get("file")
+    ]
+    return {"refs": refs, "dependencies": dependencies}
+
+
+# ==========================================
+# СТАДИЯ 2: ПЕРЕКРЁСТНЫЕ ССЫЛКИ
+# ==========================================
+
+def rewrite_references(document: Dict, own_renames: Dict[str, str],
+                       file_renames: Dict[str, Dict[str, str]]) -> int:
+    """
+    Переписывание ссылок по картам ID (на месте)
+
+    Ссылка file.json#a.OLD переписывается по карте целевого файла,
+    одиночный ID — по карте своего файла.
+
+    Returns:
+        Количество переписанных ссылок
+    """
+    rewritten = 0
+    for container, key, _, value in list(_walk(document)):
+        if value is None and key in REF_LIST_KEYS:
+            container[key] = []
+            continue
+        if not isinstance(value, str) or key in _ID_KEYS:
+            continue
+        match = _REF_RE.match(value)
+        if match and match.group(2):
+            renames = file_renames.get(match.group(1), {})
+            if not renames:
+                continue
+            segments = match.group(2).split(".")
+            new_path = ".".join(renames.get(segment, segment) for segment in segments)
+            new = f"{match.group(1)}#{new_path}"
+        else:
+            new = own_renames.get(value, value)
+        if new != value:
+            container[key] = new
+            rewritten += 1
+    return rewritten
+
+
+# ==========================================
+# СТАДИЯ 3: ОБОГАЩЕНИЕ
+# ==========================================
+
+def enrich(document: Dict, node_id: str, referenced_by: List[Dict],
+           existing: Optional[Dict] = None) -> List[str]:
+    """
+    meta.node_id, meta.layer, semantic_network и курируемые поля (на месте)
+
+    Returns:
+        Поля, перенесённые из существующего узла
+    """
+    meta = document.setdefault("meta", {})
+    network = meta.setdefault("semantic_network", {})
+    legacy_links = meta.pop("semantic_links", None)
+
+    network.setdefault("position_in_graph", node_id)
+    carried = []
+    existing_meta = (existing or {}).get("meta", {})
+    existing_network = existing_meta.get("semantic_network", {})
+    for field in CURATED_NETWORK_FIELDS:
+        if field not in network and field in existing_network:
+            network[field] = existing_network[field]
+            carried.append(f"meta.semantic_network.{field}")
+    if legacy_links is not None:
+        network["legacy_links"] = legacy_links
+    if referenced_by:
+        network["referenced_by"] = referenced_by
+
+    meta["node_id"] = node_id
+    layer = network.get("layer") or existing_meta.get("layer")
+    if layer:
+        meta["layer"] = layer
+
+    for field in CURATED_FIELDS:
+        if field not in document and existing and field in existing:
+            document[field] = existing[field]
+            carried.append(field)
+    return carried
+
+
+# ==========================================
+# ВОРКЕРЫ
+# ==========================================
+
+def _init_worker(convention_path: str, gold_index_path: str):
+    """Загрузка ID Convention и карты файл → узел один раз на процесс"""
+    from .validation import compile_id_pattern
+
+    with open(convention_path, "r", encoding="utf-8") as f:
+        convention = json.load(f)
+    _context["legacy"] = convention.get("legacy_mapping", {})
+    edge_template = convention.get("convention", {}).get("patterns", {}).get("edges", {}).get("pattern")
+    _context["edge_pattern"] = compile_id_pattern(edge_template or "EDGE-{SOURCE_NODE}-{NNN}")
+
+    file_nodes = {}
+    if Path(gold_index_path).exists():
+        with open(gold_index_path, "r", encoding="utf-8") as f:
+            id_to_path = json.load(f).get("id_to_path", {})
+        file_nodes = {
+            Path(path).name: material_id
+            for material_id, path in id_to_path.items()
+            if material_id.startswith("NODE-")
+        }
+    _context["file_nodes"] = file_nodes
+
+
+def _scan_file(path: str) -> Dict:
+    """Проход 1: узел, переименования ID и исходящие ссылки"""
+    document, node_id, source, renames = _prepare(path)
+    return {
+        "path": path,
+        "node_id": node_id,
+        "node_id_source": source,
+        "renames": renames,
+        **_outgoing(document, Path(path).name)
+    }
+
+
+def _normalize_file(task: Tuple[str, Dict[str, Dict[str, str]], List[Dict], str, bool]) -> Dict:
+    """Проход 2: стадии 1–3 и запись узла"""
+    path, file_renames, referenced_by, output_path, dry_run = task
+    document, node_id, _, renames = _prepare(path)
+    refs_rewritten = rewrite_references(document, renames, file_renames)
+
+    existing = None
+    if Path(output_path).exists():
+        with open(output_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+    carried = enrich(document, node_id, referenced_by, existing)
+
+    if not dry_run:
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, output_path)
+
+    return {
+        "path": path,
+        "layer": document["meta"].get("layer"),
+        "refs_rewritten": refs_rewritten,
+        "carried": carried
+    }
+
+
+def _pool_map(func, items: List, workers: int, init_args: Tuple) -> Iterator:
+    """Потоковая обработка: результаты выдаются по мере готовности (в порядке items)"""
+    if workers == 1 or len(items) <= 1:
+        _init_worker(*init_args)
+        yield from map(func, items)
+        return
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+        yield from executor.map(func, items, chunksize=chunksize)
+
+
+# ==========================================
+# КОНВЕЙЕР
+# ==========================================
+
+def _backlinks(scans: Iterable[Dict]) -> Dict[str, List[Dict]]:
+    """Целевой файл → referenced_by (зависимости узла, затем точные ссылки)"""
+    backlinks: Dict[str, List[Dict]] = defaultdict(list)
+    for scan in sorted(scans, key=lambda s: Path(s["path"]).name):
+        filename = Path(scan["path"]).name
+        for target, relationship, description in scan["dependencies"]:
+            backlinks[target].append({
+                "from_file": filename,
+                "from_node": scan["node_id"],
+                "relationship": relationship,
+                "description": description
+            })
+        for target, from_path, full_ref in scan["refs"]:
+            backlinks[target].append({
+                "from_file": filename,
+                "from_node": scan["node_id"],
+                "from_path": from_path,
+                "full_ref": full_ref
+            })
+    return backlinks
+
+
+def normalize_files(
+    paths: Iterable[Path],
+    output_dir: Path = NODES_DIR,
+    workers: Optional[int] = None,
+    force: bool = False,
+    dry_run: bool = False,
+    convention_path: Path = ID_CONVENTION_PATH,
+    gold_index_path: Path = GOLD_INDEX_PATH
+) -> Dict:
+    """
+    Нормализация набора файлов
+
+    Args:
+        paths: Сырые аналитические JSON
+        output_dir: Каталог узлов
+        workers: Размер пула процессов (по умолчанию os.cpu_count())
+        force: Перезаписывать существующие узлы
+        dry_run: Только отчёт, без записи узлов
+        convention_path: id_convention.json
+        gold_index_path: Gold Index (карта файл → NODE-ID)
+
+    Returns:
+        Отчёт о нормализации
+    """
+    paths = sorted(str(Path(p).resolve()) for p in paths)
+    workers = workers or os.cpu_count() or 1
+    init_args = (str(convention_path), str(gold_index_path))
+    batch_names = {Path(p).name for p in paths}
+
+    # Ссылки из уже нормализованных узлов тоже дают обратные ссылки
+    context_paths = sorted(
+        str(p) for p in output_dir.glob("*.json") if p.name not in batch_names
+    ) if output_dir.exists() else []
+
+    scans = list(_pool_map(_scan_file, paths + context_paths, workers, init_args))
+    batch_paths = set(paths)
+    batch_scans = [s for s in scans if s["path"] in batch_paths]
+    file_renames = {Path(s["path"]).name: s["renames"] for s in batch_scans if s["renames"]}
+    backlinks = _backlinks(scans)
+    known_files = batch_names | {Path(p).name for p in context_paths}
+
+    tasks = []
+    skipped = []
+    for scan in batch_scans:
+        filename = Path(scan["path"]).name
+        output_path = output_dir / filename
+        if output_path.exists() and not force and not dry_run:
+            skipped.append(filename)
+            continue
+        tasks.append((scan["path"], file_renames, backlinks.get(filename, []), str(output_path), dry_run))
+
+    if tasks and not dry_run:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    results = {r["path"]: r for r in _pool_map(_normalize_file, tasks, workers, init_args)}
+
+    files = []
+    for scan in batch_scans:
+        filename = Path(scan["path"]).name
+        result = results.get(scan["path"])
+        files.append({
+            "file": filename,
+            "node_id": scan["node_id"],
+            "node_id_source": scan["node_id_source"],
+            "layer": result["layer"] if result else None,
+            "status": "skipped" if result is None else ("planned" if dry_run else "written"),
+            "id_mapping": scan["renames"],
+            "refs_rewritten": result["refs_rewritten"] if result else 0,
+            "referenced_by": len(backlinks.get(filename, [])),
+            "carried_fields": result["carried"] if result else []
+        })
+
+    unresolved = sorted({
+        (Path(scan["path"]).name, target)
+        for scan in batch_scans
+        for target in [r[0] for r in scan["refs"]] + [d[0] for d in scan["dependencies"]]
+        if target not in known_files
+    })
+    # Новые обратные ссылки на узлы вне пакета (их referenced_by не перезаписывается)
+    external_backlinks = {
+        target: sum(1 for link in links if link["from_file"] in batch_names)
+        for target, links in backlinks.items()
+        if target not in batch_names and target in known_files
+    }
+
+    return {
+        "meta": {
+            "title": "Отчёт нормализации аналитических JSON",
+            "generated": datetime.now().strftime("%Y-%m-%d"),
+            "output_dir": _display_path(output_dir),
+            "dry_run": dry_run
+        },
+        "summary": {
+            "files": len(batch_scans),
+            "written": sum(1 for f in files if f["status"] == "written"),
+            "skipped": len(skipped),
+            "ids_rewritten": sum(len(f["id_mapping"]) for f in files),
+            "refs_rewritten": sum(f["refs_rewritten"] for f in files),
+            "backlinks": sum(f["referenced_by"] for f in files),
+            "unresolved_refs": len(unresolved)
+        },
+        "files": files,
+        "unresolved_refs": [{"file": f, "target": t} for f, t in unresolved],
+        "external_backlinks": {k: v for k, v in sorted(external_backlinks.items()) if v}
+    }
+
+
+def _display_path(path: Path) -> str:
+    try:
+        return str(path.relative_to(PROJECT_ROOT))
+    except ValueError:
+        return str(path)
+
+
+def write_report(report: Dict, report_path: Path = REPORT_PATH):
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Точка входа CLI"""
+    parser = argparse.ArgumentParser(description="Нормализация сырых аналитических JSON в узлы")
+    parser.add_argument("paths", nargs="*", type=Path,
+                        help="Файлы (по умолчанию archive/json_pre_normalization/*.json)")
+    parser.add_argument("--output", type=Path, default=NODES_DIR, help="Каталог узлов")
+    parser.add_argument("--workers", type=int, default=None, help="Размер пула процессов")
+    parser.add_argument("--report", type=Path, default=REPORT_PATH, help="Файл отчёта")
+    parser.add_argument("--force", action="store_true", help="Перезаписать существующие узлы")
+    parser.add_argument("--dry-run", action="store_true", help="Только отчёт, без записи узлов")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(INPUT_DIR.glob("*.json"))
+    started = datetime.now()
+    report = normalize_files(paths, args.output.resolve(), workers=args.workers,
+                             force=args.force, dry_run=args.dry_run)
+    elapsed = (datetime.now() - started).total_seconds()
+    write_report(report, args.report)
+
+    summary = report["summary"]
+    print(f"🔧 Нормализовано файлов: {summary['files']} за {elapsed:.2f} с"
+          f"{' (dry-run)' if args.dry_run else ''}")
+    print(f"   • Записано: {summary['written']}, пропущено (узел существует): {summary['skipped']}")
+    print(f"   • ID переименовано: {summary['ids_rewritten']}")
+    print(f"   • Ссылок переписано: {summary['refs_rewritten']}")
+    print(f"   • Обратных ссылок: {summary['backlinks']}")
+    for entry in report["files"]:
+        if entry["id_mapping"]:
+            print(f"\n   {entry['file']} ({entry['node_id']}):")
+            for old, new in list(entry["id_mapping"].items())[:5]:
+                print(f"      • {old} → {new}")
+    if report["unresolved_refs"]:
+        print(f"\n⚠️  Ссылки на файлы вне корпуса: {summary['unresolved_refs']}")
+        for item in report["unresolved_refs"][:5]:
+            print(f"      • {item['file']} → {item['target']}")
+    if summary["skipped"]:
+        print("\nℹ️  Существующие узлы не перезаписаны (--force для перезаписи)")
+    print(f"\n💾 Отчёт: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Schema Validation
+Валидация JSON-узлов по аналитической схеме и ID Convention
+
+Схема (data/schema/psb_analytical_json_schema.json) и шаблоны
+id_convention.json компилируются один раз в дерево замыканий; файлы
+проверяются в пуле процессов. Файлы, чей sha256 не изменился с прошлого
+запуска (при той же схеме), не перепроверяются — результат берётся из кэша.
+
+Результат записывается в data/index/validation_report.json в прежнем формате.
+
+Использование:
+    python -m pipeline.validation
+    python -m pipeline.validation data/nodes/*.json --workers 8 --full
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+SCHEMA_PATH = PROJECT_ROOT / "data" / "schema" / "psb_analytical_json_schema.json"
+ID_CONVENTION_PATH = PROJECT_ROOT / "data" / "schema" / "id_convention.json"
+NODES_DIR = PROJECT_ROOT / "data" / "nodes"
+REPORT_PATH = PROJECT_ROOT / "data" / "index" / "validation_report.json"
+CACHE_PATH = PROJECT_ROOT / "data" / "index" / ".validation_cache.json"
+
+STATUS_VALID = "VALID"
+STATUS_INVALID = "INVALID"
+
+# Ограничение числа ошибок на файл
+MAX_ERRORS_PER_FILE = 50
+
+# Проверка: (значение, JSON-путь, список ошибок)
+Check = Callable[[Any, str, List[str]], None]
+
+_JSON_TYPES = {
+    "string": lambda v: isinstance(v, str),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def _is_date(value: str) -> bool:
+    try:
+        date.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+_FORMATS = {
+    "date": _is_date,
+}
+
+
+# ==========================================
+# КОМПИЛЯЦИЯ СХЕМЫ
+# ==========================================
+
+class SchemaCompiler:
+    """Компиляция JSON Schema (draft-07, используемое подмножество) в замыкания"""
+
+    def __init__(self, root: Dict):
+        self.root = root
+        self._refs: Dict[str, Check] = {}
+
+    def compile(self) -> Check:
+        return self._compile(self.root)
+
+    def _ref(self, ref: str) -> Check:
+        if ref not in self._refs:
+            if not ref.startswith("#/"):
+                raise ValueError(f"Внешние $ref не поддерживаются: {ref}")
+            target = self.root
+            for part in ref[2:].split("/"):
+                target = target[part]
+            # Заглушка на время компиляции допускает рекурсивные ссылки
+            compiled: List[Check] = []
+            self._refs[ref] = lambda v, p, e: compiled[0](v, p, e)
+            compiled.append(self._compile(target))
+            self._refs[ref] = compiled[0]
+        return self._refs[ref]
+
+    def _compile(self, schema: Dict) -> Check:
+        if "$ref" in schema:
+            return self._ref(schema["$ref"])
+
+        checks: List[Check] = []
+
+        if "type" in schema:
+            names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+            predicates = [_JSON_TYPES[name] for name in names]
+            expected = " | ".join(names)
+
+            def check_type(v, p, e):
+                if not any(pred(v) for pred in predicates):
+                    e.append(f"{p}: ожидается {expected}, получено {type(v).__name__}")
+            checks.append(check_type)
+
+        if "enum" in schema:
+            allowed = schema["enum"]
+
+            def check_enum(v, p, e):
+                if v not in allowed:
+                    e.append(f"{p}: значение {v!r} не входит в допустимые")
+            checks.append(check_enum)
+
+        if "const" in schema:
+            const = schema["const"]
+
+            def check_const(v, p, e):
+                if v != const:
+                    e.append(f"{p}: ожидается {const!r}")
+            checks.append(check_const)
+
+        if "pattern" in schema:
+            regex = re.compile(schema["pattern"])
+
+            def check_pattern(v, p, e):
+                if isinstance(v, str) and not regex.search(v):
+                    e.append(f"{p}: {v!r} не соответствует {regex.pattern}")
+            checks.append(check_pattern)
+
+        if "format" in schema and schema["format"] in _FORMATS:
+            name, predicate = schema["format"], _FORMATS[schema["format"]]
+
+            def check_format(v, p, e):
+                if isinstance(v, str) and not predicate(v):
+                    e.append(f"{p}: {v!r} не в формате {name}")
+            checks.append(check_format)
+
+        if "minLength" in schema:
+            min_length = schema["minLength"]
+
+            def check_min_length(v, p, e):
+                if isinstance(v, str) and len(v) < min_length:
+                    e.append(f"{p}: длина меньше {min_length}")
+            checks.append(check_min_length)
+
+        if "required" in schema:
+            required = schema["required"]
+
+            def check_required(v, p, e):
+                if isinstance(v, dict):
+                    for key in required:
+                        if key not in v:
+                            e.append(f"{p}: отсутствует обязательное поле '{key}'")
+            checks.append(check_required)
+
+        if "properties" in schema:
+            properties = [(key, self._compile(sub)) for key, sub in schema["properties"].items()]
+
+            def check_properties(v, p, e):
+                if isinstance(v, dict):
+                    for key, sub_check in properties:
+                        if key in v:
+                            sub_check(v[key], f"{p}.{key}", e)
+            checks.append(check_properties)
+
+        additional = schema.get("additionalProperties", True)
+        if additional is not True:
+            known = set(schema.get("properties", {}))
+            extra_check = self._compile(additional) if isinstance(additional, dict) else None
+
+            def check_additional(v, p, e):
+                if isinstance(v, dict):
+                    for key in v.keys() - known:
+                        if extra_check is None:
+                            e.append(f"{p}: недопустимое поле '{key}'")
+                        else:
+                            extra_check(v[key], f"{p}.{key}", e)
+            checks.append(check_additional)
+
+        if "items" in schema and isinstance(schema["items"], dict):
+            item_check = self._compile(schema["items"])
+
+            def check_items(v, p, e):
+                if isinstance(v, list):
+                    for i, item in enumerate(v):
+                        item_check(item, f"{p}[{i}]", e)
+            checks.append(check_items)
+
+        if "minItems" in schema:
+            min_items = schema["minItems"]
+
+            def check_min_items(v, p, e):
+                if isinstance(v, list) and len(v) < min_items:
+                    e.append(f"{p}: элементов меньше {min_items}")
+            checks.append(check_min_items)
+
+        if len(checks) == 1:
+            return checks[0]
+
+        def check_all(v, p, e):
+            for check in checks:
+                check(v, p, e)
+        return check_all
+
+
+# ==========================================
+# ID CONVENTION
+# ==========================================
+
+# Плейсхолдеры шаблонов id_convention.json
+_PLACEHOLDERS = {
+    "NNN": r"\d{3}",
+    "N": r"\d",
+}
+_PLACEHOLDER_DEFAULT = r"[A-Z0-9]+"
+_PLACEHOLDER_RE = re.compile(r"\{([A-Z_]+)\}")
+
+# Префиксы, по которым строка распознаётся как ID конкретного вида
+_ID_KINDS = {
+    "NODE-": "nodes",
+    "EDGE-": "edges",
+    "LAYER-": "layers",
+}
+_ID_CANDIDATE_RE = re.compile(r"^(?:NODE|EDGE|LAYER)-[A-Za-z0-9-]+$")
+# Объекты предметной области (MOT-001): один сегмент и номер до трёх цифр;
+# более длинные номера — годы и номера документов (PHASE-2023, DOC-1315), не ID
+_DOMAIN_CANDIDATE_RE = re.compile(r"^[A-Z][A-Z0-9]*-\d{1,3}$")
+
+
+def compile_id_pattern(template: str) -> "re.Pattern":
+    """NODE-{DOMAIN} → ^NODE-[A-Z0-9]+$"""
+    parts = []
+    position = 0
+    for match in _PLACEHOLDER_RE.finditer(template):
+        parts.append(re.escape(template[position:match.start()]))
+        parts.append(_PLACEHOLDERS.get(match.group(1), _PLACEHOLDER_DEFAULT))
+        position = match.end()
+    parts.append(re.escape(template[position:]))
+    return re.compile("^" + "".join(parts) + "$")
+
+
+class IdConventionChecker:
+    """Проверка ID-подобных строк по шаблонам и legacy-карте"""
+
+    def __init__(self, convention: Dict):
+        patterns = convention.get("convention", {}).get("patterns", {})
+        self.patterns = {
+            kind: compile_id_pattern(spec["pattern"])
+            for kind, spec in patterns.items()
+        }
+        self.legacy = convention.get("legacy_mapping", {})
+
+    def __call__(self, document: Any, path: str, errors: List[str]):
+        stack = [(document, path)]
+        while stack:
+            value, current = stack.pop()
+            if isinstance(value, dict):
+                stack.extend(reversed([(v, f"{current}.{k}") for k, v in value.items()]))
+            elif isinstance(value, list):
+                stack.extend(reversed([(v, f"{current}[{i}]") for i, v in enumerate(value)]))
+            elif isinstance(value, str):
+                if _ID_CANDIDATE_RE.match(value):
+                    self._check_id(value, current, errors)
+                elif _DOMAIN_CANDIDATE_RE.match(value):
+                    self._check_id(value, current, errors, "domain_objects")
+
+    def _check_id(self, value: str, path: str, errors: List[str], kind: Optional[str] = None):
+        if value in self.legacy:
+            errors.append(f"{path}: устаревший ID {value}, используйте {self.legacy[value]}")
+            return
+        if kind is None:
+            kind = next(k for prefix, k in _ID_KINDS.items() if value.startswith(prefix))
+        pattern = self.patterns.get(kind)
+        if pattern is not None and not pattern.match(value):
+            errors.append(f"{path}: ID {value} не соответствует ID Convention ({kind})")
+
+
+# ==========================================
+# ВАЛИДАЦИЯ ФАЙЛОВ
+# ==========================================
+
+class CompiledValidator:
+    """Схема + ID Convention, скомпилированные один раз"""
+
+    def __init__(self, schema: Dict, convention: Optional[Dict] = None):
+        self._schema_check = SchemaCompiler(schema).compile()
+        self._id_check = IdConventionChecker(convention) if convention else None
+
+    @classmethod
+    def load(cls, schema_path: Path = SCHEMA_PATH,
+             convention_path: Optional[Path] = ID_CONVENTION_PATH) -> "CompiledValidator":
+        with open(schema_path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        convention = None
+        if convention_path and Path(convention_path).exists():
+            with open(convention_path, "r", encoding="utf-8") as f:
+                convention = json.load(f)
+        return cls(schema, convention)
+
+    def validate(self, document: Any) -> List[str]:
+        errors: List[str] = []
+        self._schema_check(document, "$", errors)
+        if self._id_check is not None:
+            self._id_check(document, "$", errors)
+        return errors[:MAX_ERRORS_PER_FILE]
+
+    def validate_bytes(self, content: bytes) -> List[str]:
+        try:
+            document = json.loads(content)
+        except ValueError as e:
+            return [f"$: некорректный JSON: {e}"]
+        return self.validate(document)
+
+
+# Валидатор процесса-воркера (компилируется в initializer пула)
+_worker_validator: Optional[CompiledValidator] = None
+
+
+def _init_worker(schema_path: str, convention_path: Optional[str]):
+    global _worker_validator
+    _worker_validator = CompiledValidator.load(
+        Path(schema_path), Path(convention_path) if convention_path else None
+    )
+
+
+def _validate_file(path: str) -> Tuple[str, List[str]]:
+    with open(path, "rb") as f:
+        return path, _worker_validator.validate_bytes(f.read())
+
+
+def _file_hash(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _validator_hash(schema_path: Path, convention_path: Optional[Path]) -> str:
+    digest = hashlib.sha256()
+    for path in (schema_path, convention_path):
+        if path and Path(path).exists():
+            digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def _load_cache(cache_path: Path, validator_hash: str) -> Dict[str, Dict]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("validator_hash") != validator_hash:
+        return {}
+    return cache.get("files", {})
+
+
+def _save_cache(cache_path: Path, validator_hash: str, files: Dict[str, Dict]):
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"validator_hash": validator_hash, "files": files}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить кэш валидации {cache_path}: {e}")
+
+
+def validate_files(
+    paths: Iterable[Path],
+    schema_path: Path = SCHEMA_PATH,
+    convention_path: Optional[Path] = ID_CONVENTION_PATH,
+    workers: Optional[int] = None,
+    cache_path: Optional[Path] = CACHE_PATH,
+    full: bool = False
+) -> Dict:
+    """
+    Валидация набора файлов
+
+    Args:
+        paths: Файлы для проверки
+        schema_path: JSON Schema
+        convention_path: id_convention.json (None — без проверки ID)
+        workers: Размер пула процессов (по умолчанию os.cpu_count())
+        cache_path: Кэш хэшей (None — без кэша)
+        full: Перепроверить все файлы, игнорируя кэш
+
+    Returns:
+        Отчёт в формате validation_report.json
+    """
+    paths = sorted(Path(p).resolve() for p in paths)
+    validator_hash = _validator_hash(schema_path, convention_path)
+    cached = {} if (full or cache_path is None) else _load_cache(cache_path, validator_hash)
+
+    hashes = {str(p): _file_hash(p) for p in paths}
+    results: Dict[str, Dict] = {}
+    pending: List[str] = []
+    for path, digest in hashes.items():
+        entry = cached.get(path)
+        if entry and entry.get("sha256") == digest:
+            results[path] = entry
+        else:
+            pending.append(path)
+
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        init_args = (str(schema_path), str(convention_path) if convention_path else None)
+        executor = None
+        if workers == 1 or len(pending) == 1:
+            _init_worker(*init_args)
+            outcomes = map(_validate_file, pending)
+        else:
+            chunksize = max(1, len(pending) // (workers * 4))
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args)
+            outcomes = executor.map(_validate_file, pending, chunksize=chunksize)
+        try:
+            for path, errors in outcomes:
+                results[path] = {
+                    "sha256": hashes[path],
+                    "status": STATUS_INVALID if errors else STATUS_VALID,
+                    "errors": errors
+                }
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    if cache_path is not None:
+        _save_cache(cache_path, validator_hash, {**cached, **results})
+
+    with open(schema_path, "r", encoding="utf-8") as f:
+        schema_version = json.load(f).get("version", "1.0")
+
+    files = [
+        {"file": Path(path).name, "status": results[path]["status"], "errors": results[path]["errors"]}
+        for path in sorted(results, key=lambda p: Path(p).name)
+    ]
+    valid = sum(1 for f in files if f["status"] == STATUS_VALID)
+    return {
+        "meta": {
+            "title": "Отчёт валидации JSON-корпуса",
+            "generated": datetime.now().strftime("%Y-%m-%d"),
+            "schema_version": schema_version
+        },
+        "summary": {
+            "files_validated": len(files),
+            "files_valid": valid,
+            "files_with_errors": len(files) - valid
+        },
+        "files": files,
+        "_stats": {"revalidated": len(pending), "cached": len(paths) - len(pending)}
+    }
+
+
+def write_report(report: Dict, report_path: Path = REPORT_PATH):
+    """Запись отчёта (служебная статистика запуска не сохраняется)"""
+    data = {k: v for k, v in report.items() if not k.startswith("_")}
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Точка входа CLI"""
+    parser = argparse.ArgumentParser(description="Валидация JSON-узлов по схеме и ID Convention")
+    parser.add_argument("paths", nargs="*", type=Path, help="Файлы (по умолчанию data/nodes/*.json)")
+    parser.add_argument("--schema", type=Path, default=SCHEMA_PATH, help="JSON Schema")
+    parser.add_argument("--convention", type=Path, default=ID_CONVENTION_PATH, help="id_convention.json")
+    parser.add_argument("--workers", type=int, default=None, help="Размер пула процессов")
+    parser.add_argument("--report", type=Path, default=REPORT_PATH, help="Файл отчёта")
+    parser.add_argument("--full", action="store_true", help="Перепроверить все файлы")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(NODES_DIR.glob("*.json"))
+    started = datetime.now()
+    report = validate_files(paths, args.schema, args.convention, workers=args.workers, full=args.full)
+    elapsed = (datetime.now() - started).total_seconds()
+    write_report(report, args.report)
+
+    summary, stats = report["summary"], report["_stats"]
+    print(f"📋 Проверено файлов: {summary['files_validated']} "
+          f"(перепроверено {stats['revalidated']}, из кэша {stats['cached']}) за {elapsed:.2f} с")
+    print(f"   ✅ Валидных: {summary['files_valid']}")
+    print(f"   ❌ С ошибками: {summary['files_with_errors']}")
+    for entry in report["files"]:
+        if entry["errors"]:
+            print(f"\n   {entry['file']}:")
+            for error in entry["errors"][:5]:
+                print(f"      • {error}")
+    print(f"\n💾 Отчёт: {args.report}")
+    sys.exit(1 if summary["files_with_errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Material Version Store
+Контентно-адресуемое хранилище версий материалов
+
+- Объект хранится по SHA-256 содержимого (одинаковые версии не дублируются)
+- Содержимое сжимается zstd; новая версия дополнительно сжимается
+  с предыдущей в качестве словаря (дельта), если так выходит меньше
+- Длина цепочки дельт ограничена, поэтому checkout любой версии — это
+  не более MAX_DELTA_CHAIN распаковок
+- Версии фиксируются в refs/<MATERIAL-ID>.json и в таблице material_versions
+
+Без пакета zstandard используется zlib с preset-словарём (хуже сжатие,
+тот же формат объектов с другим кодом кодека).
+
+Использование:
+    python -m pipeline.version_store import-archive [--db]
+    python -m pipeline.version_store commit data/nodes/x.json --material-id NODE-X --version 1.1.0
+    python -m pipeline.version_store checkout NODE-MKCP pre-normalization -o /tmp/mkcp.json
+    python -m pipeline.version_store log NODE-MKCP
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_STORE_PATH = PROJECT_ROOT / "data" / "versions"
+GOLD_INDEX_PATH = PROJECT_ROOT / "data" / "gold" / "gold_index.json"
+ARCHIVE_DIR = PROJECT_ROOT / "archive" / "json_pre_normalization"
+LEGACY_GRAPHS_DIR = PROJECT_ROOT / "archive" / "legacy_graphs"
+
+# Метка версии для копий из archive/json_pre_normalization
+ARCHIVE_VERSION = "pre-normalization"
+
+# Заголовок объекта: сигнатура, кодек, вид, размер содержимого, хэш базы дельты
+_HEADER = struct.Struct("<4sBBQ32s")
+_MAGIC = b"PDVO"
+
+CODEC_ZSTD = 1
+CODEC_ZLIB = 2
+
+KIND_FULL = 0
+KIND_DELTA = 1
+
+MAX_DELTA_CHAIN = 8
+ZSTD_LEVEL = 19
+ZLIB_LEVEL = 9
+
+# zlib использует не более 32 KB словаря
+_ZLIB_WINDOW = 32 * 1024
+
+
+class VersionStoreError(Exception):
+    """Объект отсутствует или повреждён"""
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+# ==========================================
+# КОДЕКИ
+# ==========================================
+
+def _compress(content: bytes, base: Optional[bytes], codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if base is None:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+        dictionary = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary).compress(content)
+
+    if base is None:
+        compressor = zlib.compressobj(ZLIB_LEVEL)
+    else:
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=base[-_ZLIB_WINDOW:])
+    return compressor.compress(content) + compressor.flush()
+
+
+def _decompress(payload: bytes, size: int, base: Optional[bytes], codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise VersionStoreError("Для чтения zstd-объектов нужен пакет zstandard")
+        if base is None:
+            return zstandard.ZstdDecompressor().decompress(payload, max_output_size=size)
+        dictionary = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload, max_output_size=size)
+
+    if codec == CODEC_ZLIB:
+        if base is None:
+            return zlib.decompress(payload)
+        decompressor = zlib.decompressobj(zdict=base[-_ZLIB_WINDOW:])
+        return decompressor.decompress(payload) + decompressor.flush()
+
+    raise VersionStoreError(f"Неизвестный кодек объекта: {codec}")
+
+
+# ==========================================
+# ХРАНИЛИЩЕ
+# ==========================================
+
+class VersionStore:
+    """Хранилище объектов и ссылок на версии"""
+
+    def __init__(self, root: Optional[Path] = None, cache_size: int = 32):
+        self.root = Path(root or DEFAULT_STORE_PATH)
+        self.objects_dir = self.root / "objects"
+        self.refs_dir = self.root / "refs"
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_size = cache_size
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        return self.object_path(digest).exists()
+
+    # ==========================================
+    # ОБЪЕКТЫ
+    # ==========================================
+
+    def _read_header(self, digest: str) -> Tuple[int, int, int, Optional[str], bytes]:
+        path = self.object_path(digest)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            raise VersionStoreError(f"Объект не найден: {digest}")
+        magic, codec, kind, size, base = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise VersionStoreError(f"Повреждён объект: {digest}")
+        base_hash = base.hex() if kind == KIND_DELTA else None
+        return codec, kind, size, base_hash, data[_HEADER.size:]
+
+    def chain_depth(self, digest: str) -> int:
+        """Количество дельт до полного объекта"""
+        depth = 0
+        while True:
+            _, kind, _, base_hash, _ = self._read_header(digest)
+            if kind == KIND_FULL:
+                return depth
+            depth += 1
+            digest = base_hash
+
+    def put(self, content: bytes, base_hash: Optional[str] = None) -> Tuple[str, Dict]:
+        """
+        Сохранение содержимого
+
+        Args:
+            content: Байты версии
+            base_hash: Хэш предыдущей версии (кандидат в базу дельты)
+
+        Returns:
+            (sha256, сведения о записи: kind, stored_bytes, deduplicated)
+        """
+        digest = content_hash(content)
+        if self.has(digest):
+            return digest, {"kind": None, "stored_bytes": 0, "deduplicated": True}
+
+        payload = _compress(content, None, self.codec)
+        kind, base_raw = KIND_FULL, bytes(32)
+
+        if base_hash and base_hash != digest and self.has(base_hash) \
+                and self.chain_depth(base_hash) < MAX_DELTA_CHAIN:
+            delta = _compress(content, self.get(base_hash), self.codec)
+            if len(delta) < len(payload):
+                payload, kind, base_raw = delta, KIND_DELTA, bytes.fromhex(base_hash)
+
+        path = self.object_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.codec, kind, len(content), base_raw))
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        return digest, {
+            "kind": "delta" if kind == KIND_DELTA else "full",
+            "stored_bytes": _HEADER.size + len(payload),
+            "deduplicated": False
+        }
+
+    def get(self, digest: str) -> bytes:
+        """Восстановление содержимого по хэшу (с проверкой SHA-256)"""
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self._cache.move_to_end(digest)
+            return cached
+
+        # Цепочка до полного объекта разворачивается итеративно
+        chain = []
+        current = digest
+        while current not in self._cache:
+            codec, kind, size, base_hash, payload = self._read_header(current)
+            chain.append((current, codec, size, payload))
+            if kind == KIND_FULL:
+                break
+            current = base_hash
+
+        base = self._cache.get(current) if chain[-1][0] != current else None
+        for object_hash, codec, size, payload in reversed(chain):
+            content = _decompress(payload, size, base, codec)
+            if content_hash(content) != object_hash:
+                raise VersionStoreError(f"Контрольная сумма не совпадает: {object_hash}")
+            self._remember(object_hash, content)
+            base = content
+        return base
+
+    def _remember(self, digest: str, content: bytes):
+        self._cache[digest] = content
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    # ==========================================
+    # ВЕРСИИ МАТЕРИАЛОВ
+    # ==========================================
+
+    def _refs_path(self, material_id: str) -> Path:
+        return self.refs_dir / f"{material_id}.json"
+
+    def versions(self, material_id: str) -> List[Dict]:
+        """Версии материала в порядке фиксации"""
+        try:
+            with open(self._refs_path(material_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except OSError:
+            return []
+
+    def commit(
+        self,
+        material_id: str,
+        content: bytes,
+        version: str,
+        description: Optional[str] = None,
+        created_by: str = "system",
+        db_manager=None
+    ) -> Dict:
+        """
+        Фиксация версии материала
+
+        Дельта строится от последней зафиксированной версии. Если передан
+        db_manager, версия записывается в material_versions.
+        """
+        history = self.versions(material_id)
+        base_hash = history[-1]["hash"] if history else None
+        digest, stored = self.put(content, base_hash)
+
+        entry = {
+            "version": version,
+            "hash": digest,
+            "size": len(content),
+            "created_at": datetime.now().isoformat(),
+            "description": description,
+            "created_by": created_by
+        }
+        history = [v for v in history if v["version"] != version] + [entry]
+        self.refs_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._refs_path(material_id).with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._refs_path(material_id))
+
+        if db_manager is not None:
+            snapshot_path = self.object_path(digest).resolve()
+            try:
+                snapshot_path = snapshot_path.relative_to(PROJECT_ROOT.resolve())
+            except ValueError:
+                pass
+            db_manager.record_material_version(
+                material_id, version, str(snapshot_path), digest, description, created_by
+            )
+
+        return dict(entry, **stored)
+
+    def resolve(self, material_id: str, version: Optional[str] = None) -> Optional[str]:
+        """Хэш версии (None — последняя)"""
+        history = self.versions(material_id)
+        if not history:
+            return None
+        if version is None:
+            return history[-1]["hash"]
+        for entry in history:
+            if entry["version"] == version:
+                return entry["hash"]
+        return None
+
+    def checkout(self, material_id: str, version: Optional[str] = None) -> bytes:
+        digest = self.resolve(material_id, version)
+        if digest is None:
+            raise VersionStoreError(f"Версия не найдена: {material_id} {version or '(последняя)'}")
+        return self.get(digest)
+
+    def stats(self) -> Dict:
+        """Размер хранилища"""
+        objects = list(self.objects_dir.glob("*/*")) if self.objects_dir.exists() else []
+        return {
+            "objects": len(objects),
+            "stored_bytes": sum(p.stat().st_size for p in objects),
+            "materials": len(list(self.refs_dir.glob("*.json"))) if self.refs_dir.exists() else 0
+        }
+
+
+# ==========================================
+# ИМПОРТ АРХИВА
+# ==========================================
+
+def _material_ids_by_filename() -> Dict[str, str]:
+    with open(GOLD_INDEX_PATH, "r", encoding="utf-8") as f:
+        gold_index = json.load(f)
+    return {Path(path).name: mid for mid, path in gold_index.get("id_to_path", {}).items()}
+
+
+def import_archive(store: VersionStore, current_version: str = "1.0.0", db_manager=None) -> Dict:
+    """
+    Импорт исторических копий в хранилище
+
+    - archive/json_pre_normalization/* → версия pre-normalization узла,
+      затем текущий файл из data/nodes → current_version
+    - archive/legacy_graphs/*_vN.json → версии vN графа, текущий граф → v14
+    """
+    by_filename = _material_ids_by_filename()
+    raw_bytes = 0
+    stored_bytes = 0
+    committed = 0
+
+    def commit(material_id: str, path: Path, version: str, description: str):
+        nonlocal raw_bytes, stored_bytes, committed
+        content = path.read_bytes()
+        result = store.commit(material_id, content, version, description, db_manager=db_manager)
+        raw_bytes += len(content)
+        stored_bytes += result["stored_bytes"]
+        committed += 1
+
+    for archived in sorted(ARCHIVE_DIR.glob("*.json")):
+        material_id = by_filename.get(archived.name)
+        if material_id is None:
+            logger.warning(f"Нет материала для {archived.name}")
+            continue
+        commit(material_id, archived, ARCHIVE_VERSION, "Копия до нормализации ID")
+        current = PROJECT_ROOT / "data" / "nodes" / archived.name
+        if current.exists():
+            commit(material_id, current, current_version, "Нормализованная версия")
+
+    graph_id = "GRAPH-V14"
+    legacy = sorted(
+        LEGACY_GRAPHS_DIR.glob("*_v*.json"),
+        key=lambda p: int(p.stem.rsplit("_v", 1)[1])
+    )
+    for graph in legacy:
+        version = "v" + graph.stem.rsplit("_v", 1)[1]
+        commit(graph_id, graph, version, f"Knowledge Graph {version}")
+    graph_path = PROJECT_ROOT / "data" / "graph" / "psb_knowledge_graph_integration_v14.json"
+    if graph_path.exists():
+        commit(graph_id, graph_path, "v14", "Knowledge Graph v14")
+
+    return {"versions": committed, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
+
+
+def _db_manager(enabled: bool):
+    if not enabled:
+        return None
+    from database.operations import DatabaseManager
+    return DatabaseManager()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Точка входа CLI"""
+    parser = argparse.ArgumentParser(description="Хранилище версий материалов")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_PATH, help="Каталог хранилища")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p_import = commands.add_parser("import-archive", help="Импорт archive/ и текущих файлов")
+    p_import.add_argument("--version", default="1.0.0", help="Версия текущих файлов узлов")
+    p_import.add_argument("--db", action="store_true", help="Записывать версии в material_versions")
+
+    p_commit = commands.add_parser("commit", help="Зафиксировать версию файла")
+    p_commit.add_argument("path", type=Path)
+    p_commit.add_argument("--material-id", required=True)
+    p_commit.add_argument("--version", required=True)
+    p_commit.add_argument("--description")
+    p_commit.add_argument("--db", action="store_true", help="Записывать версию в material_versions")
+
+    p_checkout = commands.add_parser("checkout", help="Восстановить версию")
+    p_checkout.add_argument("material_id")
+    p_checkout.add_argument("version", nargs="?")
+    p_checkout.add_argument("-o", "--output", type=Path, help="Файл (по умолчанию stdout)")
+
+    p_log = commands.add_parser("log", help="История версий материала")
+    p_log.add_argument("material_id")
+
+    args = parser.parse_args(argv)
+    store = VersionStore(args.store)
+
+    try:
+        if args.command == "import-archive":
+            result = import_archive(store, args.version, _db_manager(args.db))
+            ratio = result["stored_bytes"] / result["raw_bytes"] if result["raw_bytes"] else 0
+            print(f"✅ Импортировано версий: {result['versions']}")
+            print(f"   • Исходный объём: {result['raw_bytes'] / 1024:.1f} KB")
+            print(f"   • В хранилище: {result['stored_bytes'] / 1024:.1f} KB ({ratio:.1%})")
+        elif args.command == "commit":
+            result = store.commit(
+                args.material_id, args.path.read_bytes(), args.version,
+                args.description, db_manager=_db_manager(args.db)
+            )
+            state = "без изменений" if result["deduplicated"] else f"{result['kind']}, {result['stored_bytes']} байт"
+            print(f"✅ {args.material_id} {args.version}: {result['hash'][:12]} ({state})")
+        elif args.command == "checkout":
+            content = store.checkout(args.material_id, args.version)
+            if args.output:
+                args.output.write_bytes(content)
+                print(f"✅ {args.material_id} {args.version or '(последняя)'} → {args.output}")
+            else:
+                sys.stdout.buffer.write(content)
+        elif args.command == "log":
+            for entry in reversed(store.versions(args.material_id)):
+                print(f"{entry['version']:20} {entry['hash'][:12]}  {entry['created_at'][:19]}  "
+                      f"{entry.get('description') or ''}")
+    except VersionStoreError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Запуск Knowledge Gate Agent CLI
+
+Пакетный режим (JSONL, без интерактивного ввода):
+    python run_agent.py --batch queries.jsonl [--workers 8] [--unordered]
 """
 import sys
 from pathlib import Path
@@ -13,8 +16,11 @@ sys.path.insert(0, str(PROJECT_ROOT))
 from dotenv import load_dotenv
 load_dotenv(PROJECT_ROOT / ".env")
 
-# Запуск CLI
-from agent.cli import main
-
 if __name__ == "__main__":
+    if "--batch" in sys.argv[1:]:
+        from agent.batch import main as batch_main
+        sys.exit(batch_main(sys.argv[1:]))
+
+    # Запуск CLI
+    from agent.cli import main
     main()